@@ -0,0 +1,259 @@
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from cryptography.fernet import Fernet, InvalidToken
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from browser_profile import record_origin
+from crawler import get_host
+from driver_pool import get_driver_pool
+from page_cache import DEFAULT_CACHE_DIR
+from readiness import wait_until_ready
+from telemetry import logger, metrics, span
+
+_READ_LOCAL_STORAGE_JS = """
+var items = {};
+for (var i = 0; i < window.localStorage.length; i++) {
+    var key = window.localStorage.key(i);
+    items[key] = window.localStorage.getItem(key);
+}
+return items;
+"""
+
+_WRITE_LOCAL_STORAGE_JS = """
+var items = arguments[0];
+for (var key in items) { window.localStorage.setItem(key, items[key]); }
+"""
+
+def perform_login(driver, login_url, username, password, readiness=None):
+    """Fill in and submit the login form at `login_url`, waiting until the page after login settles"""
+    # Open the website URL
+    record_origin(driver, login_url)
+    with span("navigation"):
+        driver.get(login_url)
+    # Wait until the login form (password field) is present
+    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//input[@type='password']")))
+
+    # Locate the username field (try multiple selectors for flexibility)
+    try:
+        user_field = driver.find_element(By.XPATH, "//input[@name='username'] | //input[@id='username']")
+    except Exception:
+        # Fallback to a generic text input field
+        user_field = driver.find_element(By.XPATH, "//input[@type='text']")
+
+    # Locate the password field
+    password_field = driver.find_element(By.XPATH, "//input[@type='password']")
+
+    # Enter the username and password
+    user_field.send_keys(username)
+    password_field.send_keys(password)
+
+    # Locate and click the submit button (try multiple selectors for flexibility)
+    submit_btn = driver.find_element(By.XPATH, "//button[@type='submit'] | //input[@type='submit']")
+    submit_btn.click()
+
+    # Wait until the login form disappears (indicating successful login)
+    started = time.monotonic()
+    WebDriverWait(driver, 10).until_not(EC.presence_of_element_located((By.XPATH, "//input[@type='password']")))
+    # Wait until the page after login has settled
+    wait_until_ready(driver, readiness, timeout=10, url=login_url, started=started)
+
+class SessionStore:
+    """Encrypted file of saved sessions (cookies and local storage), keyed by site and username.
+
+    The file is encrypted with Fernet. The key comes from SCRAPER_SESSION_KEY
+    or is generated once into a key file next to the store that only the
+    current user can read.
+    """
+
+    def __init__(self, path=None, key=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "sessions.enc")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fernet = Fernet(key or os.environ.get("SCRAPER_SESSION_KEY") or self._load_key())
+        self._lock = threading.Lock()
+
+    def _load_key(self):
+        key_path = os.path.join(os.path.dirname(self.path) or ".", "session.key")
+        if not os.path.exists(key_path):
+            key = Fernet.generate_key()
+            descriptor = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(key)
+        with open(key_path, "rb") as f:
+            return f.read().strip()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "rb") as f:
+            token = f.read()
+        try:
+            return json.loads(self._fernet.decrypt(token))
+        except (InvalidToken, ValueError):
+            logger.warning("Saved sessions could not be decrypted and were ignored")
+            return {}
+
+    def _write(self, sessions):
+        tmp_path = self.path + ".tmp"
+        descriptor = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(self._fernet.encrypt(json.dumps(sessions).encode("utf-8")))
+        os.replace(tmp_path, self.path)
+
+    def load(self, name):
+        with self._lock:
+            return self._read().get(name)
+
+    def save(self, name, state):
+        with self._lock:
+            sessions = self._read()
+            sessions[name] = state
+            self._write(sessions)
+
+    def delete(self, name):
+        with self._lock:
+            sessions = self._read()
+            if sessions.pop(name, None) is not None:
+                self._write(sessions)
+
+def _cookie_matches(cookie, url):
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    domain = (cookie.get("domain") or host).lower().lstrip(".")
+    if host != domain and not host.endswith("." + domain):
+        return False
+    if cookie.get("secure") and parsed.scheme != "https":
+        return False
+    if cookie.get("expiry") and cookie["expiry"] < time.time():
+        return False
+    return (parsed.path or "/").startswith(cookie.get("path") or "/")
+
+class AuthSession:
+    """A logged-in session that is created once and reused by browsers and the HTTP tier.
+
+    The first `ensure()` restores the saved cookies and local storage for
+    this site and username, or logs in and saves them, on the caller's
+    browser if it holds one and a pooled browser otherwise.
+    `inject(driver)` copies the session into a borrowed browser,
+    `http_headers(url)` gives the Cookie header for plain HTTP fetches, and
+    `relogin()` is used when a fetched page shows the login form again.
+    `version` increases with every login, so callers can tell whether what
+    they injected is still current.
+    """
+
+    def __init__(self, login_url, username, password, pool=None, readiness=None, store=None):
+        self.login_url = login_url
+        self.username = username
+        self._password = password
+        self.pool = pool or get_driver_pool()
+        self.readiness = readiness
+        self.store = store or SessionStore()
+        self.name = f"{get_host(login_url)}|{username}"
+        parsed = urlparse(login_url)
+        self.origin = f"{parsed.scheme}://{parsed.netloc}/"
+        self.state = None
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def ensure(self, driver=None):
+        """Load the saved session or log in; returns the session state.
+
+        A login happens on `driver` when the caller holds one, otherwise on a
+        browser borrowed from the pool before taking the session lock, so a
+        thread holding the lock never waits for a browser another thread holds.
+        """
+        with self._lock:
+            if self.state is None:
+                self.state = self.store.load(self.name)
+                if self.state is not None:
+                    self.version += 1
+                    logger.info("Reusing saved session for %s", self.name)
+            if self.state is not None:
+                return self.state
+            if driver is not None:
+                self._login(driver)
+                return self.state
+        with self.pool.driver() as borrowed:
+            return self.ensure(borrowed)
+
+    def relogin(self, seen_version=None, driver=None):
+        """Log in again after the session expired, on `driver` if the caller holds one.
+
+        When several workers notice the expiry at once, only the first logs in;
+        the others pass the `version` they saw and reuse the new session.
+        """
+        if driver is None:
+            with self._lock:
+                if seen_version is not None and seen_version != self.version:
+                    return self.state
+            with self.pool.driver() as borrowed:
+                return self.relogin(seen_version, borrowed)
+        with self._lock:
+            if seen_version is None or seen_version == self.version:
+                self._login(driver)
+            return self.state
+
+    def _login(self, driver):
+        logger.info("Logging in to %s as %s", self.login_url, self.username)
+        metrics.inc("logins")
+        with span("login"):
+            perform_login(driver, self.login_url, self.username, self._password, self.readiness)
+            self.state = {
+                "cookies": driver.get_cookies(),
+                "local_storage": driver.execute_script(_READ_LOCAL_STORAGE_JS) or {},
+                "saved_at": time.time(),
+            }
+        self.version += 1
+        # The browser that logged in already carries the session
+        driver.injected_session = (self.name, self.version)
+        self.store.save(self.name, self.state)
+
+    def inject(self, driver):
+        """Copy the session's cookies and local storage into a browser, once per login"""
+        state = self.ensure(driver)
+        if getattr(driver, "injected_session", None) == (self.name, self.version):
+            return
+        # Cookies and storage can only be set for the site the browser is on
+        record_origin(driver, self.origin)
+        with span("navigation"):
+            driver.get(self.origin)
+        for cookie in state["cookies"]:
+            cookie = {key: value for key, value in cookie.items()
+                      if key in ("name", "value", "domain", "path", "secure", "httpOnly", "expiry")}
+            try:
+                driver.add_cookie(cookie)
+            except Exception as e:
+                logger.debug("Could not restore cookie %s: %s", cookie.get("name"), e)
+        if state["local_storage"]:
+            driver.execute_script(_WRITE_LOCAL_STORAGE_JS, state["local_storage"])
+        driver.injected_session = (self.name, self.version)
+
+    def http_headers(self, url):
+        """Request headers carrying the session's cookies for `url`"""
+        state = self.ensure()
+        cookies = [cookie for cookie in state["cookies"] if _cookie_matches(cookie, url)]
+        if not cookies:
+            return {}
+        return {"Cookie": "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)}
+
+    def forget(self):
+        """Drop the saved session so the next use logs in again"""
+        with self._lock:
+            self.state = None
+            self.store.delete(self.name)
+
+# Sessions shared by every scrape in the process, keyed by site and username
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_auth_session(login_url, username, password, pool=None, readiness=None):
+    """Return the process-wide session for this site and username, creating it on first use"""
+    name = f"{get_host(login_url)}|{username}"
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None or session._password != password:
+            session = _sessions[name] = AuthSession(login_url, username, password, pool, readiness)
+        return session
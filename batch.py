@@ -0,0 +1,351 @@
+"""Headless batch scraping and extraction with resumable checkpoints.
+
+Reads tasks from a file (or stdin with `-`), one per line: a URL, a URL and
+a description separated by a tab, or a JSON object with `url` and optional
+`description` and `pages`. Each task runs the full pipeline (fetch, clean,
+chunk and Gemini extraction, or scraping only when there is no
+description) and every finished page is appended to the output as a JSON
+line. Progress is journaled next to the output, so running the same
+command again after a crash or Ctrl-C carries on where it stopped.
+
+    python batch.py --input urls.txt --description "product names and prices" --pages 5 \\
+        --output results.jsonl [--export csv]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from chunker import iter_chunks
+from dedup import PageDeduplicator
+from llm_cache import get_response_cache
+from llm_dispatch import ExtractionDispatcher, StubModel, estimate_tokens
+from main import iter_pages
+from records import SchemaError, load_schema
+from relevance import RelevanceFilter
+from telemetry import configure_logging, logger, metrics, profile_run
+
+def read_tasks(lines, description=None, pages=1):
+    """Parse task lines into dicts with `id`, `url`, `description` and `pages`; duplicates are dropped"""
+    tasks = {}
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                task = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number}: invalid JSON ({e})")
+            if not task.get("url"):
+                raise ValueError(f"Line {number}: missing url")
+        else:
+            url, _, line_description = line.partition("\t")
+            task = {"url": url.strip(), "description": line_description.strip() or None}
+        task = {
+            "url": task["url"],
+            "description": task.get("description") or description,
+            "pages": int(task.get("pages") or pages),
+        }
+        # The same URL, description and page count is the same work, in this run or a resumed one
+        key = json.dumps([task["url"], task["description"], task["pages"]])
+        task["id"] = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        tasks.setdefault(task["id"], task)
+    return list(tasks.values())
+
+class Checkpoint:
+    """The output file plus a journal of finished pages and tasks, for resuming interrupted runs.
+
+    Each page is appended to the output and synced, then journaled together
+    with the output's size after it. On resume the output is cut back to
+    the last journaled size, so a page written just before a crash (but not
+    journaled) is dropped rather than duplicated when it is redone.
+    """
+
+    def __init__(self, output_path, state_path=None, restart=False):
+        self.output_path = output_path
+        self.state_path = state_path or output_path + ".checkpoint"
+        self._lock = threading.Lock()
+        # task id -> {"pages": pages written, "next_url": where to carry on, "done": bool}
+        self.tasks = {}
+        offset = journal_size = 0
+        if restart:
+            for path in (self.output_path, self.state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        elif os.path.exists(self.state_path):
+            with open(self.state_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line) if line.endswith(b"\n") else None
+                    except ValueError:
+                        entry = None
+                    if entry is None:
+                        # A line cut short by a crash; everything before it is intact
+                        break
+                    journal_size += len(line)
+                    progress = self.tasks.setdefault(entry["task"], {"pages": 0, "next_url": None, "done": False})
+                    if entry["event"] == "page":
+                        progress["pages"] = entry["page_number"]
+                        progress["next_url"] = entry["next_url"]
+                        offset = entry["offset"]
+                    elif entry["event"] == "done":
+                        progress["done"] = True
+        elif os.path.exists(self.output_path) and os.path.getsize(self.output_path):
+            # Without a journal nothing in the output is known to be ours, so it is not cut back to empty
+            raise FileExistsError(f"{self.output_path} already exists and has no checkpoint; "
+                                  "pass --restart to overwrite it or choose another --output")
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        # Both files are opened for appending and cut back to their last complete entry
+        self._output = open(self.output_path, "ab")
+        self._output.truncate(offset)
+        self._state = open(self.state_path, "ab")
+        self._state.truncate(journal_size)
+
+    def progress(self, task_id):
+        with self._lock:
+            return dict(self.tasks.get(task_id, {"pages": 0, "next_url": None, "done": False}))
+
+    def _journal(self, entry):
+        self._state.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._state.flush()
+        os.fsync(self._state.fileno())
+
+    def write_page(self, task_id, record, next_url):
+        with self._lock:
+            self._output.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._output.flush()
+            os.fsync(self._output.fileno())
+            self._journal({"event": "page", "task": task_id, "page_number": record["page_number"],
+                           "next_url": next_url, "offset": self._output.tell()})
+            self.tasks[task_id] = {"pages": record["page_number"], "next_url": next_url, "done": False}
+
+    def finish(self, task_id):
+        with self._lock:
+            self._journal({"event": "done", "task": task_id})
+            self.tasks.setdefault(task_id, {"pages": 0, "next_url": None})["done"] = True
+
+    def close(self):
+        with self._lock:
+            self._output.close()
+            self._state.close()
+
+def run_task(task, checkpoint, dispatcher, options, stop, stats):
+    """Scrape (and extract from) one task's pages, carrying on from its checkpoint"""
+    progress = checkpoint.progress(task["id"])
+    if progress["done"]:
+        stats.add("tasks_skipped")
+        return
+    start_url = task["url"]
+    if progress["pages"]:
+        if not progress["next_url"]:
+            checkpoint.finish(task["id"])
+            return
+        start_url = progress["next_url"]
+        stats.add("tasks_resumed")
+        logger.info("Resuming %s after page %d", task["url"], progress["pages"])
+    remaining = task["pages"] - progress["pages"]
+    deduplicator = PageDeduplicator() if options.dedup else None
+    scraped, next_url = 0, start_url
+    for page in iter_pages(start_url, remaining, refresh=options.refresh, dedup=options.dedup,
+                           deduplicator=deduplicator):
+        if stop.is_set():
+            return
+        record = {
+            "task": task["id"],
+            "url": task["url"],
+            "page_number": progress["pages"] + page["page_number"],
+            "page_url": page["url"],
+            "tier": page["tier"],
+        }
+        if "duplicate_of" in page:
+            record["duplicate_of"] = page["duplicate_of"]
+        if task["description"]:
+            chunks = list(iter_chunks(page["content"], max_tokens=options.chunk_tokens))
+            results, errors = dispatcher.extract(chunks, task["description"], schema=options.schema)
+            if errors:
+                # Not checkpointed, so a rerun retries this page; its finished chunks come from the response cache
+                first = min(errors)
+                raise RuntimeError(f"Extraction failed for {len(errors)} of {len(chunks)} chunks on "
+                                   f"{page['url']} (chunk {first + 1}: {errors[first]})")
+            record["description"] = task["description"]
+            if options.schema is not None:
+                record["records"] = [item for records in results for item in records]
+            else:
+                record["result"] = "\n\n".join(results)
+            stats.add("chunks", len(chunks))
+            stats.add("prompt_tokens", sum(estimate_tokens(chunk) for chunk in chunks))
+        else:
+            record["content"] = page["content"]
+        checkpoint.write_page(task["id"], record, page["next_url"])
+        stats.add("pages")
+        stats.add("bytes", len(page["content"].encode("utf-8")))
+        scraped, next_url = scraped + 1, page["next_url"]
+    if scraped < remaining and next_url:
+        # iter_pages logs fetch errors and stops; leave the task open so a rerun carries on from here
+        raise RuntimeError(f"Stopped after {progress['pages'] + scraped} of {task['pages']} pages; "
+                           f"could not scrape {next_url}")
+    checkpoint.finish(task["id"])
+    stats.add("tasks_done")
+
+class Stats:
+    """Thread-safe counters for the end-of-run summary"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def get(self, name):
+        with self._lock:
+            return self.counts.get(name, 0)
+
+def build_model(name, api_key):
+    if name == "stub":
+        # Offline stand-in for Gemini
+        return StubModel()
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(name)
+
+def iter_output_results(path):
+    """Extraction results (or scraped text) from a batch output file, one page at a time"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if "records" in record:
+                yield "\n".join(json.dumps(item, ensure_ascii=False) for item in record["records"])
+            else:
+                yield record.get("result", record.get("content", ""))
+
+def format_summary(stats, dispatcher, elapsed):
+    pages = stats.get("pages")
+    lines = [
+        f"Tasks: {stats.get('tasks_done')} done, {stats.get('tasks_failed')} failed, "
+        f"{stats.get('tasks_skipped')} already done, {stats.get('tasks_resumed')} resumed",
+        f"Pages: {pages} in {elapsed:.1f}s ({pages / elapsed if elapsed else 0:.2f} pages/s, "
+        f"{stats.get('bytes') / 1e3 / elapsed if elapsed else 0:.1f} KB/s of cleaned text)",
+    ]
+    if dispatcher is not None:
+        chunks = stats.get("chunks")
+        lines.append(f"Extraction: {chunks} chunks ({chunks / elapsed if elapsed else 0:.2f} chunks/s, "
+                     f"{dispatcher.metrics['chunks_skipped']} skipped as unrelated), "
+                     f"~{stats.get('prompt_tokens')} prompt tokens, {dispatcher.metrics['requests']} Gemini requests, "
+                     f"{dispatcher.metrics['retries']} retries")
+    for stage, summary in sorted(metrics.stage_summary().items()):
+        lines.append(f"  {stage:<14} n={summary['count']:<6} mean={summary['mean']:.3f}s p95={summary['p95']:.3f}s")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", "-i", default="-", help="task file, or - for stdin (default)")
+    parser.add_argument("--output", "-o", default="batch_results.jsonl", help="JSON lines output file")
+    parser.add_argument("--description", "-d", help="what to extract, for tasks that do not give one")
+    parser.add_argument("--pages", type=int, default=1, help="pages to follow per task unless the task says otherwise")
+    parser.add_argument("--workers", type=int, default=2, help="tasks run at once")
+    parser.add_argument("--model", default="gemini-1.5-pro", help="Gemini model, or 'stub' to run offline")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY"),
+                        help="Gemini API key (default: GEMINI_API_KEY or GOOGLE_API_KEY)")
+    parser.add_argument("--chunk-tokens", type=int, default=1250)
+    parser.add_argument("--batch-tokens", type=int, default=30_000, help="prompt tokens per request (0: one chunk each)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Gemini requests in flight")
+    parser.add_argument("--requests-per-minute", type=int, default=60)
+    parser.add_argument("--tokens-per-minute", type=int, default=1_000_000)
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false",
+                        help="keep boilerplate lines and near-duplicate pages")
+    parser.add_argument("--schema", help="JSON schema file for one record; pages then carry validated `records`")
+    parser.add_argument("--no-prefilter", dest="prefilter", action="store_false",
+                        help="send every chunk to Gemini instead of only those that match the description")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached pages")
+    parser.add_argument("--state", help="checkpoint file (default: the output path + .checkpoint)")
+    parser.add_argument("--restart", action="store_true",
+                        help="discard the checkpoint and output (or an output without one) and start over")
+    parser.add_argument("--export", choices=["csv", "text", "jsonl", "parquet", "pdf"],
+                        help="also write the results in this format next to the output")
+    options = parser.parse_args(argv)
+    configure_logging()
+
+    if options.input == "-":
+        tasks = read_tasks(sys.stdin, options.description, options.pages)
+    else:
+        with open(options.input, encoding="utf-8") as f:
+            tasks = read_tasks(f, options.description, options.pages)
+    if not tasks:
+        parser.error("no tasks in the input")
+    if options.schema:
+        try:
+            with open(options.schema, encoding="utf-8") as f:
+                options.schema = load_schema(f.read())
+        except (OSError, SchemaError) as e:
+            parser.error(f"cannot use schema {options.schema}: {e}")
+    dispatcher = None
+    if any(task["description"] for task in tasks):
+        if options.model != "stub" and not options.api_key:
+            parser.error("extraction needs a Gemini API key (--api-key or GEMINI_API_KEY)")
+        dispatcher = ExtractionDispatcher(build_model(options.model, options.api_key),
+                                          concurrency=options.concurrency,
+                                          requests_per_minute=options.requests_per_minute,
+                                          tokens_per_minute=options.tokens_per_minute,
+                                          cache=get_response_cache(), batch_tokens=options.batch_tokens,
+                                          prefilter=RelevanceFilter() if options.prefilter else None)
+
+    try:
+        checkpoint = Checkpoint(options.output, options.state, options.restart)
+    except FileExistsError as e:
+        parser.error(str(e))
+    stats = Stats()
+    stop = threading.Event()
+    started = time.perf_counter()
+    logger.info("Running %d tasks with %d workers", len(tasks), options.workers)
+
+    def run(task):
+        try:
+            run_task(task, checkpoint, dispatcher, options, stop, stats)
+        except Exception as e:
+            stats.add("tasks_failed")
+            logger.error("Task %s (%s) failed: %s", task["id"], task["url"], e)
+
+    executor = ThreadPoolExecutor(max_workers=options.workers)
+    interrupted = False
+    try:
+        # SCRAPER_PROFILE=cprofile|pyinstrument profiles the run; SCRAPER_PROFILE_OUTPUT saves the report
+        with profile_run(output=os.environ.get("SCRAPER_PROFILE_OUTPUT")):
+            futures = [executor.submit(run, task) for task in tasks]
+            for future in futures:
+                future.result()
+    except KeyboardInterrupt:
+        interrupted = True
+        stop.set()
+        logger.warning("Interrupted; finishing the pages in progress (press Ctrl-C again to quit now)")
+    try:
+        executor.shutdown(wait=True, cancel_futures=True)
+    except KeyboardInterrupt:
+        # Safe at any point: a page counts as done only once it is journaled, after its output is synced
+        logger.warning("Stopped; run the same command again to resume")
+        os._exit(130)
+    checkpoint.close()
+    if interrupted:
+        logger.warning("Run the same command again to resume")
+
+    print(format_summary(stats, dispatcher, time.perf_counter() - started))
+    metrics_file = os.environ.get("SCRAPER_METRICS_FILE")
+    if metrics_file:
+        metrics.export(metrics_file)
+    if options.export and not interrupted:
+        from exporters import FORMATS, export
+        export_path = os.path.splitext(options.output)[0] + "." + FORMATS[options.export][0]
+        export(iter_output_results(options.output), options.export, export_path)
+        print(f"Results exported to {export_path}")
+    if interrupted:
+        sys.exit(130)
+    if stats.get("tasks_failed"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
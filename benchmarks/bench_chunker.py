@@ -0,0 +1,71 @@
+"""Measure chunking throughput and boundary quality on multi-megabyte documents.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_chunker [--sizes 1000000 5000000] [--max-tokens 1250]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from chunker import iter_chunks
+from document import process_document
+from benchmarks.fixtures import make_large_page
+
+def fixed_width_split(text, max_length=5000):
+    """The old split_dom_content: a cut every max_length characters"""
+    return [text[i : i + max_length] for i in range(0, len(text), max_length)]
+
+def broken_lines(chunks, lines):
+    """Count chunk edges that cut through the middle of a line"""
+    broken = 0
+    for chunk in chunks:
+        first = chunk[:chunk.find("\n")] if "\n" in chunk else chunk
+        last = chunk[chunk.rfind("\n") + 1:]
+        broken += (first not in lines) + (last not in lines)
+    return broken
+
+def measure(label, make_chunks, text, lines):
+    started = time.perf_counter()
+    count = 0
+    chunks = []
+    for chunk in make_chunks(text):
+        count += 1
+        if len(chunks) < 2000:
+            chunks.append(chunk)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    for _ in make_chunks(text):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "chunker": label,
+        "text_bytes": len(text),
+        "chunks": count,
+        "seconds": seconds,
+        "mb_per_second": len(text) / seconds / 1e6,
+        "peak_bytes": peak,
+        "broken_line_edges": broken_lines(chunks, lines),
+    }
+
+def run(sizes, max_tokens, overlap_tokens):
+    results = []
+    for size in sizes:
+        text = process_document(make_large_page(size))["text"]
+        lines = set(text.split("\n"))
+        results.append(measure("fixed_width", lambda t: fixed_width_split(t, max_tokens * 4), text, lines))
+        results.append(measure("iter_chunks", lambda t: iter_chunks(t, max_tokens, overlap_tokens), text, lines))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--max-tokens", type=int, default=1250)
+    parser.add_argument("--overlap-tokens", type=int, default=0)
+    args = parser.parse_args()
+    for result in run(args.sizes, args.max_tokens, args.overlap_tokens):
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure how much near-duplicate and boilerplate suppression saves on a paginated crawl.
+
+Crawls the fixture catalog (heavy site chrome on every page, and a
+pagination that wraps around to repeat earlier pages) with and without
+`dedup`, and reports the tokens and chunks left for extraction and how
+many distinct products survive. Run from the repository root:
+
+    python -m benchmarks.bench_dedup [--pages 5] [--chunk-tokens 1250]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from benchmarks.server import FixtureServer
+
+def run_crawl(url, num_pages, dedup, workdir, chunk_tokens):
+    from chunker import iter_chunks
+    from dedup import BoilerplateFilter, PageDeduplicator
+    from llm_dispatch import estimate_tokens
+    from main import iter_pages
+    from page_cache import PageCache
+    # A fresh filter each run, so nothing learned by an earlier run is reused
+    deduplicator = PageDeduplicator(BoilerplateFilter(os.path.join(workdir, f"boilerplate-{dedup}.json")))
+    cache = PageCache(os.path.join(workdir, "pages"))
+    started = time.perf_counter()
+    tokens = chunks = duplicates = 0
+    products = set()
+    pages = 0
+    for page in iter_pages(url, num_pages, cache=cache, dedup=dedup, deduplicator=deduplicator):
+        pages += 1
+        duplicates += "duplicate_of" in page
+        tokens += estimate_tokens(page["content"])
+        chunks += sum(1 for _ in iter_chunks(page["content"], max_tokens=chunk_tokens))
+        products.update(line for line in page["content"].splitlines() if " model " in line)
+    return {
+        "dedup": dedup,
+        "pages": pages,
+        "near_duplicate_pages": duplicates,
+        "tokens": tokens,
+        "chunks": chunks,
+        "distinct_products": len(products),
+        "seconds": time.perf_counter() - started,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=5, help="distinct catalog pages (the crawl visits twice as many)")
+    parser.add_argument("--chunk-tokens", type=int, default=1250)
+    args = parser.parse_args()
+    from benchmarks.server import build_corpus
+    from crawler import host_limiter
+    from telemetry import configure_logging
+    configure_logging("WARNING")
+    host_limiter.delay = 0
+    with tempfile.TemporaryDirectory() as workdir, FixtureServer(build_corpus(pages=args.pages)) as server:
+        os.environ["SCRAPER_CACHE_DIR"] = os.path.join(workdir, "cache")
+        url = server.url("catalog") + "?page=1"
+        baseline = run_crawl(url, args.pages * 2, False, workdir, args.chunk_tokens)
+        deduped = run_crawl(url, args.pages * 2, True, workdir, args.chunk_tokens)
+    for result in (baseline, deduped):
+        print(json.dumps(result))
+    print(json.dumps({
+        "token_reduction": 1 - deduped["tokens"] / baseline["tokens"],
+        "call_reduction": 1 - deduped["chunks"] / baseline["chunks"],
+        "products_kept": deduped["distinct_products"] / baseline["distinct_products"],
+    }))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Measure the streaming exporters on large extraction results against the old in-memory downloads.
+
+Extraction results are generated on the fly, so the streaming exporters
+never see the whole text at once; the legacy cases build the full string
+first, as the app used to. Every case runs in a fresh process so its peak
+RSS is its own. Run from the repository root:
+
+    python -m benchmarks.bench_export [--formats csv pdf] [--size-mb 100] [--legacy-size-mb 10]
+
+One JSON line is printed per case.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from io import BytesIO
+from benchmarks.bench_suite import _peak_rss_bytes
+from benchmarks.fixtures import iter_extraction_results
+
+def legacy_export(text, export_format, path):
+    """The pre-streaming download code from the app, writing its buffer to `path`"""
+    if export_format == "csv":
+        import pandas as pd
+        buffer = BytesIO()
+        pd.DataFrame([line.split(",") for line in text.split("\n")]).to_csv(buffer, index=False, header=False)
+        data = buffer.getvalue()
+    elif export_format == "text":
+        data = BytesIO(text.encode("utf-8")).getvalue()
+    elif export_format == "pdf":
+        from fpdf import FPDF
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.set_font("Arial", size=12)
+        for line in text.split("\n"):
+            pdf.multi_cell(0, 10, line.encode("latin-1", "ignore").decode("latin-1"))
+        data = pdf.output(dest="S").encode("latin-1")
+    else:
+        raise ValueError(f"No legacy exporter for {export_format}")
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _run_case(export_format, legacy, size_bytes, results):
+    """Child process body: export `size_bytes` of results once and report one result dict"""
+    from exporters import FORMATS, export
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_export_"), f"out.{FORMATS[export_format][0]}")
+    started = time.perf_counter()
+    if legacy:
+        legacy_export("\n\n".join(iter_extraction_results(size_bytes)), export_format, path)
+    else:
+        export(iter_extraction_results(size_bytes), export_format, path)
+    seconds = time.perf_counter() - started
+    output_bytes = os.path.getsize(path)
+    os.remove(path)
+    results.put({
+        "case": f"{'legacy' if legacy else 'streaming'}_{export_format}",
+        "input_mb": size_bytes / 1e6,
+        "output_mb": output_bytes / 1e6,
+        "seconds": seconds,
+        "input_mb_per_second": size_bytes / 1e6 / seconds,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    })
+
+def run_case(export_format, legacy, size_bytes):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(export_format, legacy, size_bytes, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {"case": f"{'legacy' if legacy else 'streaming'}_{export_format}",
+                "error": f"exited with status {process.exitcode}"}
+    return results.get()
+
+def main():
+    from exporters import FORMATS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=list(FORMATS))
+    parser.add_argument("--size-mb", type=float, default=100, help="extraction results exported per streaming case")
+    parser.add_argument("--legacy-size-mb", type=float, default=10,
+                        help="results exported per legacy case (0 skips them; the legacy PDF is very slow)")
+    args = parser.parse_args()
+    for export_format in args.formats:
+        if args.legacy_size_mb and export_format in ("csv", "text", "pdf"):
+            print(json.dumps(run_case(export_format, True, int(args.legacy_size_mb * 1e6))), flush=True)
+        print(json.dumps(run_case(export_format, False, int(args.size_mb * 1e6))), flush=True)
+
+if __name__ == "__main__":
+    main()
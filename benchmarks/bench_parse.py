@@ -0,0 +1,70 @@
+"""Compare the old three-pass html.parser pipeline with the single-pass document stage.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parse [--sizes 100000 1000000 5000000] [--repeat 3]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from document import PARSER, process_document
+from benchmarks.fixtures import make_large_page
+
+def legacy_pipeline(html_content):
+    """The pre-refactor multi-page loop: three html.parser passes per page"""
+    soup = BeautifulSoup(html_content, "html.parser")
+    soup.find("a", rel="next")
+    body_soup = BeautifulSoup(html_content, "html.parser")
+    body_content = str(body_soup.body) if body_soup.body else ""
+    clean_soup = BeautifulSoup(body_content, "html.parser")
+    for script_or_style in clean_soup(["script", "style"]):
+        script_or_style.extract()
+    text = clean_soup.get_text(separator="\n")
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+def single_pass_pipeline(html_content):
+    return process_document(html_content)["text"]
+
+def measure(function, html_content, repeat):
+    """Return the best wall time and the peak traced allocation of `function`"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(html_content)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    function(html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        html_content = make_large_page(size)
+        legacy_seconds, legacy_peak = measure(legacy_pipeline, html_content, repeat)
+        single_seconds, single_peak = measure(single_pass_pipeline, html_content, repeat)
+        results.append({
+            "html_bytes": len(html_content),
+            "parser": PARSER,
+            "legacy_seconds": legacy_seconds,
+            "single_pass_seconds": single_seconds,
+            "speedup": legacy_seconds / single_seconds,
+            "legacy_peak_bytes": legacy_peak,
+            "single_pass_peak_bytes": single_peak,
+            "memory_ratio": single_peak / legacy_peak,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for result in run(args.sizes, args.repeat):
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
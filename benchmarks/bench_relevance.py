@@ -0,0 +1,91 @@
+"""Measure how many Gemini calls the relevance pre-filter saves, and what it costs in recall.
+
+Each fixture page is cleaned and chunked, then extracted with the stub
+model (one chunk per request) with and without `relevance.RelevanceFilter`,
+both from a plain description and into records of a JSON schema. The stub
+answers with every product on the chunk, so recall is the share of the
+page's products that still come back when unrelated chunks are skipped.
+Run from the repository root:
+
+    python -m benchmarks.bench_relevance [--chunk-tokens 1250 500]
+
+One JSON line is printed per fixture, chunk size and mode.
+"""
+import argparse
+import json
+import re
+import time
+from benchmarks.fixtures import make_catalog_page, make_listing_page, make_product_page
+
+DESCRIPTION = "product names and prices"
+SCHEMA = {
+    "type": "object",
+    "properties": {"name": {"type": "string"}, "price": {"type": "number"}},
+    "required": ["name", "price"],
+}
+# A product name line ("Laptops model 123" or "Product 1-2") followed by its price line
+_PRODUCT_RE = re.compile(r"^(\w+ model \d+|Product \d+-\d+)\n(\$[\d.]+)$", re.M)
+
+def respond(prompt):
+    """Stub answer: every product and price in the prompt's chunk, as JSON records or plain lines"""
+    chunk = prompt.split("text content: ", 1)[-1].rsplit(". Please follow these instructions carefully:", 1)[0]
+    products = _PRODUCT_RE.findall(chunk)
+    if "JSON schema" in prompt:
+        return json.dumps([{"name": name, "price": price} for name, price in products])
+    return "\n".join(f"{name}: {price}" for name, price in products)
+
+def run_case(text, chunk_tokens, prefilter, schema):
+    from chunker import iter_chunks
+    from llm_dispatch import ExtractionDispatcher, StubModel
+    from relevance import RelevanceFilter
+    chunks = list(iter_chunks(text, max_tokens=chunk_tokens))
+    dispatcher = ExtractionDispatcher(StubModel(respond=respond), concurrency=4, requests_per_minute=1_000_000,
+                                      prefilter=RelevanceFilter() if prefilter else None)
+    started = time.perf_counter()
+    results, errors = dispatcher.extract(chunks, DESCRIPTION, schema=schema)
+    seconds = time.perf_counter() - started
+    if schema is not None:
+        found = {record["name"] for records in results for record in records}
+        typed = all(isinstance(record["price"], float) for records in results for record in records)
+    else:
+        found = {line.split(":", 1)[0] for result in results for line in result.splitlines()}
+        typed = None
+    return {"chunks": len(chunks), "requests": dispatcher.metrics["requests"], "found": found,
+            "errors": len(errors), "typed": typed, "seconds": seconds}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-tokens", type=int, nargs="+", default=[1250, 500])
+    args = parser.parse_args()
+    from document import process_document
+    from telemetry import configure_logging
+    configure_logging("WARNING")
+    fixtures = {
+        "product_page": make_product_page(),
+        "listing_page": make_listing_page(items=200),
+        "catalog_page": make_catalog_page(),
+    }
+    for name, html in fixtures.items():
+        text = process_document(html)["text"]
+        products = {product for product, _ in _PRODUCT_RE.findall(text)}
+        for chunk_tokens in args.chunk_tokens:
+            for schema in (None, SCHEMA):
+                baseline = run_case(text, chunk_tokens, False, schema)
+                filtered = run_case(text, chunk_tokens, True, schema)
+                print(json.dumps({
+                    "fixture": name,
+                    "chunk_tokens": chunk_tokens,
+                    "mode": "schema" if schema else "description",
+                    "chunks": baseline["chunks"],
+                    "requests": baseline["requests"],
+                    "filtered_requests": filtered["requests"],
+                    "calls_saved": 1 - filtered["requests"] / baseline["requests"],
+                    "recall": len(filtered["found"] & products) / len(products),
+                    "baseline_recall": len(baseline["found"] & products) / len(products),
+                    "typed_records": filtered["typed"],
+                    "errors": filtered["errors"],
+                    "seconds": filtered["seconds"],
+                }), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Offline end-to-end benchmark suite for scraping, cleaning, chunking and extraction.
+
+Serves the fixture corpus (small, huge, JavaScript-paginated and
+login-gated pages) from a local HTTP server, replays rendered pages in
+place of Chrome and uses the stub model in place of Gemini. Every case
+runs in a fresh process so its peak RSS is its own. Run from the
+repository root:
+
+    python -m benchmarks.bench_suite [--cases scrape_small clean_huge] [--repeat 5]
+        [--output results.json] [--baseline previous.json --tolerance 0.25]
+
+One JSON line is printed per case. With `--baseline`, cases whose p50
+latency or peak RSS grew by more than `--tolerance` are reported and the
+exit status is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then left out
+    resource = None
+
+from benchmarks.server import FixtureServer
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _replay_pool():
+    from driver_pool import DriverPool
+    from benchmarks.replay_driver import ReplayDriver
+    return DriverPool(size=1, driver_factory=ReplayDriver)
+
+# Each case takes (urls, options) and returns a function that performs one
+# timed operation and returns how many units (bytes, pages or chunks) it processed.
+
+def case_scrape_small(urls, options):
+    from main import scrape_website
+    pool = _replay_pool()
+    return lambda: len(scrape_website(urls["small"], pool=pool))
+
+def case_scrape_huge(urls, options):
+    from main import scrape_website
+    pool = _replay_pool()
+    return lambda: len(scrape_website(urls["huge"], pool=pool))
+
+def case_scrape_js(urls, options):
+    from main import scrape_website
+    pool = _replay_pool()
+    return lambda: len(scrape_website(urls["app"], pool=pool))
+
+def case_scrape_login(urls, options):
+    from main import detect_login_required, scrape_website
+    pool = _replay_pool()
+
+    def run():
+        html_content = scrape_website(urls["login"], pool=pool)
+        if not detect_login_required(html_content):
+            raise AssertionError("Login form was not detected")
+        return len(html_content)
+    return run
+
+def _multi_page(url, options):
+    from main import scrape_multiple_pages
+    from page_cache import PageCache
+    pool = _replay_pool()
+    cache = PageCache(os.path.join(options["workdir"], "pages"))
+
+    def run():
+        # refresh skips cache reads so every repeat fetches and cleans each page again
+        pages = scrape_multiple_pages(url, options["pages"], pool=pool, cache=cache, refresh=True)
+        if len(pages) != options["pages"]:
+            raise AssertionError(f"Expected {options['pages']} pages, got {len(pages)}")
+        return len(pages)
+    return run
+
+def case_multi_page_small(urls, options):
+    return _multi_page(urls["small"] + "?page=1", options)
+
+def case_multi_page_js(urls, options):
+    return _multi_page(urls["app"] + "?page=1", options)
+
+def case_crawl_huge(urls, options):
+    from main import crawl_websites
+    from page_cache import PageCache
+    pool = _replay_pool()
+    cache = PageCache(os.path.join(options["workdir"], "crawl"))
+    # The server ignores the query string, so these are distinct URLs for the same 5 MB page
+    targets = [f"{urls['huge']}?copy={i}" for i in range(options["pages"])]
+
+    def run():
+        # Several fetch threads on one host; large pages are parsed in the parse pool
+        pages = list(crawl_websites(targets, workers=4, per_host_concurrency=4, per_host_delay=0,
+                                    pool=pool, cache=cache, refresh=True))
+        if len(pages) != len(targets) or any(page["error"] for page in pages):
+            raise AssertionError("Not every page was crawled")
+        return len(pages)
+    return run
+
+def case_clean_huge(urls, options):
+    from main import clean_body_content, extract_body_content, scrape_website
+    html_content = scrape_website(urls["huge"], pool=_replay_pool())
+    return lambda: len(clean_body_content(extract_body_content(html_content)))
+
+def case_split_huge(urls, options):
+    from main import clean_body_content, extract_body_content, scrape_website, split_dom_content
+    text = clean_body_content(extract_body_content(scrape_website(urls["huge"], pool=_replay_pool())))
+    return lambda: len(split_dom_content(text))
+
+def case_extract_stub(urls, options, batch_tokens=0):
+    from chunker import iter_chunks
+    from llm_dispatch import ExtractionDispatcher, StubModel
+    from main import clean_body_content, extract_body_content, scrape_website
+    text = clean_body_content(extract_body_content(scrape_website(urls["huge"], pool=_replay_pool())))
+    chunks = list(iter_chunks(text))[:options["chunks"]]
+    dispatcher = ExtractionDispatcher(StubModel(latency=options["model_latency"]),
+                                      concurrency=options["llm_concurrency"],
+                                      requests_per_minute=1_000_000, tokens_per_minute=10 ** 12,
+                                      batch_tokens=batch_tokens)
+
+    def run():
+        results, errors = dispatcher.extract(chunks, "product names and prices")
+        if errors:
+            raise AssertionError(f"{len(errors)} chunks failed")
+        return len(results)
+    return run
+
+def case_extract_stub_batched(urls, options):
+    return case_extract_stub(urls, options, batch_tokens=options["batch_tokens"])
+
+CASES = {
+    "scrape_small": (case_scrape_small, "bytes"),
+    "scrape_huge": (case_scrape_huge, "bytes"),
+    "scrape_js": (case_scrape_js, "bytes"),
+    "scrape_login": (case_scrape_login, "bytes"),
+    "multi_page_small": (case_multi_page_small, "pages"),
+    "multi_page_js": (case_multi_page_js, "pages"),
+    "crawl_huge": (case_crawl_huge, "pages"),
+    "clean_huge": (case_clean_huge, "bytes"),
+    "split_huge": (case_split_huge, "chunks"),
+    "extract_stub": (case_extract_stub, "chunks"),
+    "extract_stub_batched": (case_extract_stub_batched, "chunks"),
+}
+
+def _run_case(name, urls, options, results):
+    """Child process body: set up the case, time `repeat` runs and report one result dict"""
+    os.environ["SCRAPER_CACHE_DIR"] = os.path.join(options["workdir"], "cache")
+    if options["parse_workers"] is not None:
+        os.environ["SCRAPER_PARSE_WORKERS"] = str(options["parse_workers"])
+    from crawler import host_limiter
+    from telemetry import configure_logging
+    configure_logging("WARNING")
+    # The fixture server is local; per-domain politeness delays would only measure sleeping
+    host_limiter.delay = 0
+    setup, unit = CASES[name]
+    operation = setup(urls, options)
+    operation()  # warm-up: imports, connection pool, browser start
+    latencies = []
+    units = 0
+    for _ in range(options["repeat"]):
+        started = time.perf_counter()
+        units += operation()
+        latencies.append(time.perf_counter() - started)
+    total = sum(latencies)
+    results.put({
+        "case": name,
+        "repeat": options["repeat"],
+        "unit": unit,
+        "units_per_second": units / total if total else 0.0,
+        "ops_per_second": len(latencies) / total if total else 0.0,
+        "p50_seconds": _percentile(latencies, 0.5),
+        "p95_seconds": _percentile(latencies, 0.95),
+        "max_seconds": max(latencies),
+        "peak_rss_bytes": _peak_rss_bytes(),
+    })
+
+def run_case(name, urls, options):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(name, urls, options, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {"case": name, "error": f"exited with status {process.exitcode}"}
+    return results.get()
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    from document import PARSER
+    return {
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parser": PARSER,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(results, baseline, tolerance):
+    """Return a description of every case that got slower or bigger than the baseline allows"""
+    previous = {result["case"]: result for result in baseline["results"] if "error" not in result}
+    regressions = []
+    for result in results:
+        before = previous.get(result["case"])
+        if before is None or "error" in result:
+            continue
+        for metric in ("p50_seconds", "peak_rss_bytes"):
+            if before.get(metric) and result.get(metric) and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{result['case']}: {metric} {before[metric]:.4g} -> {result[metric]:.4g}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=5, help="pages followed by the multi-page cases")
+    parser.add_argument("--chunks", type=int, default=40, help="chunks sent to the stub model")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="seconds per stub model call")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=30_000, help="request budget for the batched case")
+    parser.add_argument("--parse-workers", type=int,
+                        help="parse worker processes (0 parses inline; default: SCRAPER_PARSE_WORKERS or CPUs - 1)")
+    parser.add_argument("--output", help="write all results with environment details to this JSON file")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, FixtureServer() as server:
+        urls = {name: server.url(name) for name in ("small", "huge", "login", "app")}
+        options = {
+            "workdir": workdir,
+            "repeat": args.repeat,
+            "pages": args.pages,
+            "chunks": args.chunks,
+            "model_latency": args.model_latency,
+            "llm_concurrency": args.llm_concurrency,
+            "batch_tokens": args.batch_tokens,
+            "parse_workers": args.parse_workers,
+        }
+        results = []
+        for name in args.cases:
+            result = run_case(name, urls, options)
+            print(json.dumps(result), flush=True)
+            results.append(result)
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    failed = [result["case"] for result in results if "error" in result]
+    if failed:
+        print(f"Failed cases: {', '.join(failed)}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
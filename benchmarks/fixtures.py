@@ -0,0 +1,158 @@
+import random
+
+# Seeded so every benchmark run works on identical documents
+SEED = 1234
+
+_WORDS = ("price stock review shipping product listing rating color size brand seller "
+          "discount warranty model release update category store delivery order item").split()
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+def make_listing_page(items=200, page=1, total_pages=5, seed=SEED):
+    """Build a product listing page with navigation, scripts and a pagination bar"""
+    rng = random.Random(seed + page)
+    parts = ["<!DOCTYPE html><html><head><title>Listing page {}</title>".format(page),
+             "<style>.item{margin:4px}</style><script>window.analytics = {};</script></head><body>",
+             "<header><nav><a href='/'>Home</a> <a href='/deals'>Deals</a> <a href='/help'>Help</a></nav></header>",
+             "<main><h1>Products - page {}</h1><ul class='items'>".format(page)]
+    for i in range(items):
+        parts.append(
+            "<li class='item'><h2>Product {page}-{i}</h2><span class='price'>${price}</span>"
+            "<p>{desc}</p><script>track({i});</script></li>".format(
+                page=page, i=i, price=rng.randint(5, 500), desc=_sentence(rng, 20)))
+    parts.append("</ul></main><div class='pagination'>")
+    if page > 1:
+        parts.append("<a class='prev' href='?page={}'>Prev</a>".format(page - 1))
+    if page < total_pages:
+        parts.append("<a class='next' rel='next' href='?page={}'>Next</a>".format(page + 1))
+    parts.append("</div><footer><p>Copyright Example Store</p><a href='/privacy'>Privacy</a></footer>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+_CATEGORIES = ("Laptops Tablets Phones Cameras Headphones Speakers Monitors Keyboards Mice Printers Routers "
+               "Storage Memory Cables Chargers Watches Drones Consoles Games Software Furniture Lighting "
+               "Kitchen Garden Tools Sports Outdoor Toys Books Music").split()
+
+def make_catalog_page(page=1, total_pages=10, unique_pages=5, items=20, seed=SEED):
+    """A listing page with heavy site chrome (mega menu, sidebar, footer) on every page.
+
+    Pages past `unique_pages` repeat the items of an earlier page with only
+    the page counter changed, like a pagination that wraps around.
+    """
+    rng = random.Random(seed + (page - 1) % unique_pages + 1)
+    menu = "".join(f"<li><a href='/c/{name.lower()}'>{name}</a></li>" for name in _CATEGORIES)
+    sidebar = "".join(f"<li><a href='/brand/{i}'>Brand {i}</a></li>" for i in range(1, 25))
+    footer = "".join(f"<li><a href='/info/{i}'>{title}</a></li>" for i, title in enumerate(
+        ["About us", "Careers", "Press", "Contact", "Shipping policy", "Returns", "Warranty", "Gift cards",
+         "Store locator", "Accessibility", "Terms of service", "Privacy policy", "Cookie settings", "Sitemap"]))
+    parts = [f"<!DOCTYPE html><html><head><title>Catalog page {page}</title></head><body>",
+             f"<header><a href='/'>Example Store</a><p>Free shipping on orders over $50</p><ul class='menu'>{menu}</ul></header>",
+             f"<aside><h3>Shop by brand</h3><ul>{sidebar}</ul></aside>",
+             f"<main><h1>All products</h1><p>Page {page} of {total_pages}</p><ul class='items'>"]
+    for i in range(items):
+        parts.append(f"<li class='item'><h2>{rng.choice(_CATEGORIES)} model {rng.randint(100, 999)}</h2>"
+                     f"<span class='price'>${rng.randint(5, 500)}</span><p>{_sentence(rng, 20)}</p></li>")
+    parts.append("</ul></main><div class='pagination'>")
+    if page < total_pages:
+        parts.append(f"<a rel='next' href='?page={page + 1}'>Next</a>")
+    parts.append(f"</div><footer><ul>{footer}</ul><p>Copyright Example Store. All rights reserved.</p></footer>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+_REVIEW_WORDS = ("great works battery lasted months recommend friend gift easy setup quality sturdy disappointed "
+                 "returned support helpful screen sound light heavy daily use travel cable box manual").split()
+_ARTICLE_WORDS = ("company founded team community mission story history people city year growth partner event "
+                  "award sustainability energy packaging local craft design culture volunteer workshop").split()
+
+def _prose(rng, words, count):
+    return " ".join(rng.choice(words) for _ in range(count)).capitalize() + "."
+
+def make_product_page(products=24, reviews=120, articles=40, seed=SEED):
+    """A long store page where only a small part lists products and prices.
+
+    A featured strip and a product grid sit among customer reviews, a Q&A
+    section, the shipping policy and a blog feed, so most of the page holds
+    nothing a "product names and prices" extraction wants. Reviews and
+    answers still mention prices and products now and then. Product names
+    are "<Category> model <number>", each followed by its price.
+    """
+    rng = random.Random(seed)
+
+    def product(i):
+        return (f"<li class='item'><h3>{rng.choice(_CATEGORIES)} model {100 + i}</h3>"
+                f"<span class='price'>${rng.randint(5, 500)}.{rng.randint(0, 99):02d}</span>"
+                f"<p>{_sentence(rng, 10)}</p></li>")
+
+    def review():
+        text = _prose(rng, _REVIEW_WORDS, rng.randint(15, 30))
+        if rng.random() < 0.2:
+            text += " Good product for the price."
+        return f"<div class='review'><b>{rng.choice(_REVIEW_WORDS).capitalize()} buyer</b><p>{text}</p></div>"
+
+    featured = products // 4
+    parts = ["<!DOCTYPE html><html><head><title>Example Store</title></head><body>",
+             "<header><nav><a href='/'>Home</a> <a href='/deals'>Deals</a> <a href='/help'>Help</a></nav></header>",
+             "<main><section class='about'><h2>Our story</h2>"]
+    parts.extend(f"<p>{_prose(rng, _ARTICLE_WORDS, 60)}</p>" for _ in range(articles // 4))
+    parts.append("</section><section class='featured'><h2>Featured products</h2><ul>")
+    parts.extend(product(i) for i in range(featured))
+    parts.append("</ul></section><section class='reviews'><h2>What customers say</h2>")
+    parts.extend(review() for _ in range(reviews // 2))
+    parts.append("</section><section class='grid'><h2>All products</h2><ul>")
+    parts.extend(product(i) for i in range(featured, products))
+    parts.append("</ul></section><section class='faq'><h2>Questions and answers</h2>")
+    for _ in range(10):
+        parts.append(f"<h4>{_prose(rng, _REVIEW_WORDS, 8)[:-1]}?</h4><p>{_prose(rng, _REVIEW_WORDS, 25)}</p>")
+    parts.append("<h4>Do you match prices?</h4><p>We match the price of any product sold by a major retailer.</p>")
+    parts.append("</section><section class='reviews'>")
+    parts.extend(review() for _ in range(reviews - reviews // 2))
+    parts.append("</section><section class='policy'><h2>Shipping and returns</h2>")
+    parts.extend(f"<p>{_prose(rng, _ARTICLE_WORDS + _REVIEW_WORDS, 50)}</p>" for _ in range(8))
+    parts.append("</section><section class='blog'><h2>From the blog</h2>")
+    parts.extend(f"<article><h3>{_prose(rng, _ARTICLE_WORDS, 6)[:-1]}</h3><p>{_prose(rng, _ARTICLE_WORDS, 80)}</p>"
+                 f"</article>" for _ in range(articles - articles // 4))
+    parts.append("</section></main><footer><p>Copyright Example Store</p></footer></body></html>")
+    return "".join(parts)
+
+def make_large_page(size_bytes=5_000_000, seed=SEED):
+    """Build a listing page of roughly `size_bytes` bytes"""
+    # Each listing item is roughly 250 bytes
+    return make_listing_page(items=max(size_bytes // 250, 1), seed=seed)
+
+def make_app_shell(page=1, total_pages=5):
+    """A single-page-app shell that only has content once JavaScript renders it"""
+    return ("<!DOCTYPE html><html><head><title>App page {page}</title></head><body>"
+            "<div id='root'></div>"
+            "<script>fetch('/api/items?page={page}').then(r => r.json()).then(render);</script>"
+            "</body></html>").format(page=page)
+
+def make_app_rendered(page=1, total_pages=5, items=50, seed=SEED):
+    """The DOM of the app shell after JavaScript has rendered it, as a browser would return it"""
+    return make_listing_page(items=items, page=page, total_pages=total_pages, seed=seed)
+
+def make_login_page():
+    """A login-gated page: a short notice and a username/password form"""
+    return ("<!DOCTYPE html><html><head><title>Sign in</title></head><body>"
+            "<main><h1>Sign in to continue</h1>"
+            "<p>You need an account to see the product catalogue and current prices. "
+            "Members get access to every listing, saved searches and order history.</p>"
+            "<form method='post' action='/login'><input type='text' name='username'>"
+            "<input type='password' name='password'><button type='submit'>Sign in</button></form>"
+            "</main></body></html>")
+
+def iter_extraction_results(size_bytes=100_000_000, rows_per_result=200, seed=SEED):
+    """Yield extraction results (comma-separated rows, some non-ASCII) totalling about `size_bytes`"""
+    rng = random.Random(seed)
+    names = ("Café crème", "Jalapeño salsa", "Smørrebrød", "Crêpe Suzette", "Łódź tour", "Größe L", "Ramen 拉面")
+    produced = 0
+    row = 0
+    while produced < size_bytes:
+        lines = []
+        for _ in range(rows_per_result):
+            row += 1
+            lines.append(f"{row},{rng.choice(names)},{rng.randint(1, 999)}.{rng.randint(0, 99):02d} €,"
+                         f"{_sentence(rng, 8)}")
+        result = "\n".join(lines)
+        produced += len(result.encode("utf-8")) + 2
+        yield result
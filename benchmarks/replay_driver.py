@@ -0,0 +1,41 @@
+"""A stand-in for Chrome that replays the rendered DOM recorded for each fixture.
+
+It implements the part of the Selenium driver API the scraper uses, so the
+driver pool, readiness polling and browser tier run unchanged without a
+real browser, and browser-tier timings measure the scraper, not Chrome.
+"""
+import urllib.request
+from benchmarks.server import RENDERED_HEADER
+
+class ReplayDriver:
+    def __init__(self):
+        self.current_url = "about:blank"
+        self.page_source = "<html><head></head><body></body></html>"
+
+    def get(self, url):
+        self.current_url = url
+        if url.startswith("about:"):
+            self.page_source = "<html><head></head><body></body></html>"
+            return
+        request = urllib.request.Request(url, headers={RENDERED_HEADER: "1"})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            self.page_source = response.read().decode("utf-8")
+
+    def execute_script(self, script, *args):
+        if "readyState" in script:
+            return True
+        if "__scraperMutationProbe" in script:
+            # Milliseconds since the last DOM mutation: the replayed DOM never changes
+            return 60_000
+        if "__scraperNetworkProbe" in script:
+            return [0, 0]
+        return 1
+
+    def find_elements(self, by, value):
+        return []
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        pass
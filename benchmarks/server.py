@@ -0,0 +1,97 @@
+"""Local HTTP server for the benchmark fixture corpus.
+
+Fixtures are generated once from fixed seeds, so every run serves the
+same bytes. Static pages and the JavaScript app are served on separate
+ports so the fetcher's per-domain "needs JavaScript" decision for one does
+not affect the other.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from benchmarks.fixtures import (
+    make_app_rendered,
+    make_app_shell,
+    make_catalog_page,
+    make_large_page,
+    make_listing_page,
+    make_login_page,
+)
+
+# Header a replay driver sends to get the rendered DOM of an app page
+RENDERED_HEADER = "X-Benchmark-Rendered"
+
+def build_corpus(pages=5, small_items=20, huge_bytes=5_000_000):
+    """Map of path -> HTML (or a function of the page number for paginated paths)"""
+    small = {page: make_listing_page(items=small_items, page=page, total_pages=pages) for page in range(1, pages + 1)}
+    shells = {page: make_app_shell(page, pages) for page in range(1, pages + 1)}
+    rendered = {page: make_app_rendered(page, pages) for page in range(1, pages + 1)}
+    return {
+        "/small": small,
+        "/huge": make_large_page(huge_bytes),
+        "/login": make_login_page(),
+        "/catalog": {page: make_catalog_page(page, pages * 2, pages) for page in range(1, pages * 2 + 1)},
+        "/app": shells,
+        # Fragments never reach the server, so this key cannot collide with a real request path
+        "/app#rendered": rendered,
+    }
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs add ~40ms per keep-alive request
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        if self.headers.get(RENDERED_HEADER) and path == "/app":
+            path = "/app#rendered"
+        body = self.server.corpus.get(path)
+        if isinstance(body, dict):
+            try:
+                page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+            except ValueError:
+                page = 0
+            body = body.get(page)
+        if body is None:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class FixtureServer:
+    """Serve the fixture corpus on two local ports until `close()`"""
+
+    def __init__(self, corpus=None, host="127.0.0.1"):
+        corpus = corpus or build_corpus()
+        self._servers = []
+        for _ in range(2):
+            server = ThreadingHTTPServer((host, 0), _Handler)
+            server.daemon_threads = True
+            server.corpus = corpus
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        self.static_base = "http://{}:{}".format(host, self._servers[0].server_address[1])
+        self.app_base = "http://{}:{}".format(host, self._servers[1].server_address[1])
+
+    def url(self, name):
+        """URL of a named fixture: small, huge, login, app, catalog (append ?page=N to paginate)"""
+        base = self.app_base if name == "app" else self.static_base
+        return "{}/{}".format(base, name)
+
+    def close(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,153 @@
+import json
+import os
+from urllib.parse import urlparse
+from selenium import webdriver
+from crawler import get_host
+
+# URL patterns (Network.setBlockedURLs wildcards) for each blockable resource type
+RESOURCE_PATTERNS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "media": ["*.mp4", "*.webm", "*.ogg", "*.ogv", "*.mp3", "*.m4a", "*.wav", "*.mov", "*.m3u8"],
+    "stylesheets": ["*.css"],
+}
+
+# Ad, analytics and tracking hosts that never carry page text
+TRACKER_PATTERNS = [
+    "*doubleclick.net*", "*googlesyndication.com*", "*google-analytics.com*", "*googletagmanager.com*",
+    "*googleadservices.com*", "*adservice.google.*", "*facebook.net*", "*connect.facebook.com*",
+    "*hotjar.com*", "*segment.io*", "*cdn.segment.com*", "*mixpanel.com*", "*amazon-adsystem.com*",
+    "*scorecardresearch.com*", "*criteo.com*", "*taboola.com*", "*outbrain.com*", "*newrelic.com*",
+    "*nr-data.net*", "*clarity.ms*", "*adnxs.com*", "*quantserve.com*",
+]
+
+DEFAULT_BLOCKED_TYPES = ("images", "fonts", "media")
+
+CHROME_ARGUMENTS = [
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-dev-shm-usage",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-notifications",
+    "--mute-audio",
+    "--no-first-run",
+    "--window-size=1366,768",
+]
+
+class ScrapingProfile:
+    """Chrome settings for scraping: headless, no GPU or extensions, and blocked resources.
+
+    Requests for the `blocked_types` resource types (matched by file
+    extension) and for known ad and tracker hosts are dropped in the browser
+    through the DevTools `Network.setBlockedURLs` command, so they cost no
+    bandwidth or CPU. `site_overrides` maps a host (or a parent domain) to
+    a dict that may set `blocked_types`, add `blocked_urls` patterns or lift
+    patterns with `unblocked_urls`, for sites that need images, fonts or a
+    particular script to render their text.
+    """
+
+    def __init__(self, headless=True, blocked_types=DEFAULT_BLOCKED_TYPES, block_trackers=True,
+                 blocked_urls=None, site_overrides=None, extra_arguments=None):
+        unknown = set(blocked_types) - set(RESOURCE_PATTERNS)
+        if unknown:
+            raise ValueError(f"Unknown resource types: {', '.join(sorted(unknown))}")
+        self.headless = headless
+        self.blocked_types = tuple(blocked_types)
+        self.block_trackers = block_trackers
+        self.blocked_urls = list(blocked_urls or [])
+        self.site_overrides = {host.lower(): override for host, override in (site_overrides or {}).items()}
+        self.extra_arguments = list(extra_arguments or [])
+
+    def chrome_options(self):
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless=new")
+        for argument in CHROME_ARGUMENTS + self.extra_arguments:
+            options.add_argument(argument)
+        # Never prompt for or keep downloads, notifications and similar permissions
+        options.add_experimental_option("prefs", {
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.default_content_setting_values.geolocation": 2,
+            "download_restrictions": 3,
+        })
+        return options
+
+    def override_for(self, host):
+        """The override for a host, matching the host itself or its closest parent domain"""
+        host = host.lower().split(":")[0]
+        while host:
+            if host in self.site_overrides:
+                return self.site_overrides[host]
+            _, _, host = host.partition(".")
+        return {}
+
+    def blocked_patterns(self, url=None):
+        """URL patterns to block while loading `url` (or any page, when no URL is given)"""
+        override = self.override_for(get_host(url)) if url else {}
+        patterns = []
+        for resource_type in override.get("blocked_types", self.blocked_types):
+            patterns.extend(RESOURCE_PATTERNS[resource_type])
+        if self.block_trackers:
+            patterns.extend(TRACKER_PATTERNS)
+        patterns.extend(self.blocked_urls)
+        patterns.extend(override.get("blocked_urls", []))
+        unblocked = set(override.get("unblocked_urls", []))
+        return [pattern for pattern in dict.fromkeys(patterns) if pattern not in unblocked]
+
+def apply_blocking(driver, patterns):
+    """Install the blocked URL patterns in a Chromium driver; returns False if unsupported"""
+    if getattr(driver, "blocked_patterns", None) == patterns:
+        return True
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception:
+        # Not a Chromium driver (or the session is gone); load everything
+        return False
+    driver.blocked_patterns = patterns
+    return True
+
+def url_origin(url):
+    """The scheme://host[:port] origin of an http(s) URL, or None for other URLs"""
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    return f"{parsed.scheme}://{parsed.netloc.lower()}"
+
+def record_origin(driver, url):
+    """Remember that a driver is about to visit `url`, so its storage can be cleared when it goes back to the pool"""
+    origin = url_origin(url)
+    if origin is not None:
+        if getattr(driver, "visited_origins", None) is None:
+            driver.visited_origins = set()
+        driver.visited_origins.add(origin)
+
+def prepare_navigation(driver, url):
+    """Switch a pooled driver to the blocking rules for `url` before navigating to it"""
+    record_origin(driver, url)
+    profile = getattr(driver, "scraping_profile", None)
+    if profile is not None and profile.site_overrides:
+        apply_blocking(driver, profile.blocked_patterns(url))
+
+def load_profile():
+    """Build the scraping profile from the environment.
+
+    SCRAPER_HEADLESS=0 shows the browser window, SCRAPER_BLOCK_RESOURCES is
+    a comma-separated list of resource types to block (empty blocks none),
+    SCRAPER_BLOCK_TRACKERS=0 lets ad and tracker requests through, and
+    SCRAPER_SITE_OVERRIDES names a JSON file of per-site overrides.
+    """
+    blocked_types = os.environ.get("SCRAPER_BLOCK_RESOURCES", ",".join(DEFAULT_BLOCKED_TYPES))
+    site_overrides = {}
+    overrides_path = os.environ.get("SCRAPER_SITE_OVERRIDES")
+    if overrides_path:
+        with open(overrides_path, encoding="utf-8") as f:
+            site_overrides = json.load(f)
+    return ScrapingProfile(
+        headless=os.environ.get("SCRAPER_HEADLESS", "1") != "0",
+        blocked_types=[name.strip() for name in blocked_types.split(",") if name.strip()],
+        block_trackers=os.environ.get("SCRAPER_BLOCK_TRACKERS", "1") != "0",
+        site_overrides=site_overrides,
+    )
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from page_cache import DEFAULT_CACHE_DIR, url_key
+from chunker import iter_lines
+from llm_dispatch import estimate_tokens
+
+def _line_hash(line):
+    return int.from_bytes(hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest(), "big")
+
+def iter_stable_chunks(text, target_tokens=400, min_tokens=100, max_tokens=1250, count_tokens=estimate_tokens):
+    """Split text into content-defined chunks whose boundaries survive edits elsewhere.
+
+    A chunk ends after a line whose hash falls on a boundary (about one in
+    every `target_tokens` worth of lines), so inserting or removing a line
+    only changes the chunk it lands in instead of shifting every chunk after
+    it the way fixed-size packing does.
+    """
+    current = []
+    current_tokens = 0
+    for line in iter_lines(text):
+        line_tokens = count_tokens(line)
+        if current and current_tokens + line_tokens > max_tokens:
+            yield "\n".join(current)
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+        # Average line size decides how often boundaries fall so chunks average target_tokens
+        divisor = max(1, target_tokens // max(line_tokens, 1))
+        if current_tokens >= min_tokens and _line_hash(line) % divisor == 0:
+            yield "\n".join(current)
+            current, current_tokens = [], 0
+    if current:
+        yield "\n".join(current)
+
+def fingerprint(chunk):
+    """Exact fingerprint of a chunk, ignoring whitespace differences"""
+    normalized = " ".join(chunk.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+def simhash(chunk, bits=64):
+    """64-bit SimHash over word shingles; similar chunks differ in few bits"""
+    words = chunk.lower().split()
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))]
+    weights = [0] * bits
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class ChangeTracker:
+    """Remembers per-URL chunk fingerprints to find what changed between scrapes.
+
+    `diff()` labels each chunk "unchanged" (same fingerprint as last time),
+    "changed" (SimHash within `max_distance` bits of a previous chunk, i.e.
+    an edit) or "new". It stores nothing: the summary carries the current
+    fingerprints under `pending`, and `commit()` makes them the baseline of
+    the next run once the emitted chunks have been used, so a failed
+    extraction sees the same changes again next time.
+    """
+
+    def __init__(self, path=None, max_distance=6):
+        path = path or os.path.join(DEFAULT_CACHE_DIR, "changes.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_distance = max_distance
+        self.summaries = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                url_key TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                simhash TEXT NOT NULL,
+                seen REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS fingerprints_url ON fingerprints (url_key)")
+
+    def diff(self, url, chunks):
+        """Compare chunks with the previous scrape of `url`.
+
+        Returns a dict with `new` and `changed` lists of chunk texts,
+        `emitted` (the new and changed chunks in document order), the
+        `unchanged` and `removed` counts, `statuses` (one per chunk) and
+        `pending`, the fingerprints to pass to `commit()`.
+        """
+        key = url_key(url)
+        with self._lock:
+            previous = self._db.execute("SELECT digest, simhash FROM fingerprints WHERE url_key = ?",
+                                        (key,)).fetchall()
+        previous_digests = {digest for digest, _ in previous}
+        previous_hashes = [int(value, 16) for _, value in previous]
+        matched = set()
+        pending = []
+        summary = {"url": url, "new": [], "changed": [], "emitted": [], "unchanged": 0, "removed": 0,
+                   "statuses": []}
+        for chunk in chunks:
+            digest = fingerprint(chunk)
+            chunk_hash = simhash(chunk)
+            pending.append((digest, format(chunk_hash, "x")))
+            if digest in previous_digests:
+                status = "unchanged"
+                matched.add(digest)
+                summary["unchanged"] += 1
+            elif any(hamming_distance(chunk_hash, old) <= self.max_distance for old in previous_hashes):
+                status = "changed"
+                summary["changed"].append(chunk)
+            else:
+                status = "new"
+                summary["new"].append(chunk)
+            if status != "unchanged":
+                summary["emitted"].append(chunk)
+            summary["statuses"].append(status)
+        summary["removed"] = max(len(previous_digests - matched) - len(summary["changed"]), 0)
+        summary["pending"] = pending
+        self.summaries.append({
+            "url": url,
+            "new": len(summary["new"]),
+            "changed": len(summary["changed"]),
+            "unchanged": summary["unchanged"],
+            "removed": summary["removed"],
+        })
+        return summary
+
+    def commit(self, url, pending):
+        """Store the `pending` fingerprints of a `diff()` as the baseline for the next scrape of `url`"""
+        key = url_key(url)
+        seen = time.time()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM fingerprints WHERE url_key = ?", (key,))
+            self._db.executemany("INSERT INTO fingerprints VALUES (?, ?, ?, ?)",
+                                 [(key, digest, chunk_hash, seen) for digest, chunk_hash in pending])
+
+    def forget(self, url):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM fingerprints WHERE url_key = ?", (url_key(url),))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def describe_changes(summary):
+    """One-line description of a diff summary"""
+    return (f"{len(summary['new'])} new, {len(summary['changed'])} changed, "
+            f"{summary['unchanged']} unchanged, {summary['removed']} removed chunks")
+
+# Shared tracker used by incremental scrapes when none is passed in
+_default_tracker = None
+_default_tracker_lock = threading.Lock()
+
+def get_change_tracker():
+    """Return the process-wide change tracker, creating it on first use"""
+    global _default_tracker
+    with _default_tracker_lock:
+        if _default_tracker is None:
+            _default_tracker = ChangeTracker()
+        return _default_tracker
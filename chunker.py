@@ -0,0 +1,158 @@
+import re
+from bs4 import NavigableString
+from document import parse_html
+from llm_dispatch import estimate_tokens
+
+# Tags whose contents form one logical block (a record, paragraph, row, ...)
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "dd", "details", "div", "dl", "dt",
+              "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5",
+              "h6", "header", "li", "main", "nav", "ol", "p", "pre", "section", "table", "tbody",
+              "td", "th", "thead", "tr", "ul"}
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def iter_lines(text):
+    """Yield the non-empty lines of a string without building a list of them"""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find("\n", start)
+        if end == -1:
+            end = length
+        line = text[start:end].strip()
+        if line:
+            yield line
+        start = end + 1
+
+def _node_text(node):
+    return "\n".join(line.strip() for line in node.get_text("\n").splitlines() if line.strip())
+
+def iter_dom_blocks(node, max_tokens=1250, count_tokens=estimate_tokens):
+    """Yield the text of the largest block elements under a parsed node that fit the budget.
+
+    A block element whose text fits in `max_tokens` is yielded whole, so a
+    record such as an <li> with a title, price and description stays in one
+    piece; larger blocks are broken down into their child blocks. Loose text
+    and inline elements between child blocks are grouped together.
+    """
+    pending = []
+    for child in node.children:
+        name = getattr(child, "name", None)
+        if name in ("script", "style"):
+            continue
+        if name is None:
+            text = str(child).strip()
+            # Skip comments, doctypes and other special strings
+            if text and type(child) is NavigableString:
+                pending.append(text)
+            continue
+        text = _node_text(child)
+        if not text:
+            continue
+        if name not in BLOCK_TAGS:
+            # Inline element: keep its text with the surrounding block
+            pending.append(text)
+            continue
+        if pending:
+            yield "\n".join(pending)
+            pending = []
+        if count_tokens(text) <= max_tokens:
+            yield text
+        else:
+            yield from iter_dom_blocks(child, max_tokens, count_tokens)
+    if pending:
+        yield "\n".join(pending)
+
+def html_blocks(html_content, max_tokens=1250, count_tokens=estimate_tokens):
+    """Return the blocks of a page's <body> for `iter_chunks`, without scripts and styles"""
+    soup = parse_html(html_content)
+    if soup.body is None:
+        return []
+    for script_or_style in soup.body(["script", "style"]):
+        script_or_style.extract()
+    return list(iter_dom_blocks(soup.body, max_tokens, count_tokens))
+
+def _hard_split(word, max_tokens, count_tokens):
+    """Cut a single word (a URL, base64 data, ...) that alone exceeds the budget into pieces that fit"""
+    if count_tokens(word) <= max_tokens:
+        return [word]
+    pieces = []
+    start = 0
+    while start < len(word):
+        # Longest piece within the budget: double until past it, then bisect, so only about a
+        # piece's worth of text is measured at a time; at least one character so it always progresses
+        low, high = 1, 2
+        while start + high < len(word) and count_tokens(word[start:start + high]) <= max_tokens:
+            low, high = high, high * 2
+        high = min(high, len(word) - start)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(word[start:start + middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        pieces.append(word[start:start + low])
+        start += low
+    return pieces
+
+def _split_oversized(block, max_tokens, count_tokens):
+    """Split a unit that exceeds the budget at sentence, then word boundaries; words still too big are cut"""
+    pieces = []
+    current = []
+    current_tokens = 0
+    for sentence in _SENTENCE_END_RE.split(block):
+        sentence_tokens = count_tokens(sentence)
+        if sentence_tokens > max_tokens:
+            # Fall back to word boundaries for run-on text
+            parts = [(piece, count_tokens(piece)) for word in sentence.split(" ") if word
+                     for piece in _hard_split(word, max_tokens, count_tokens)]
+        else:
+            parts = [(sentence, sentence_tokens)]
+        for part, part_tokens in parts:
+            if current and current_tokens + part_tokens > max_tokens:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def iter_chunks(content, max_tokens=1250, overlap_tokens=0, count_tokens=estimate_tokens):
+    """Lazily pack content into chunks of at most `max_tokens` tokens.
+
+    `content` is either cleaned text (each line is a unit that is never split
+    unless it alone exceeds the budget) or an iterable of blocks such as
+    `iter_dom_blocks(soup.body)`. Oversized units are split at sentence and
+    then word boundaries, and a single word longer than the budget is cut
+    into pieces. With `overlap_tokens`, each chunk starts with the
+    trailing units of the previous chunk, up to that many tokens.
+    """
+    units = iter_lines(content) if isinstance(content, str) else content
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = count_tokens(unit)
+        pieces = [unit] if unit_tokens <= max_tokens else _split_oversized(unit, max_tokens, count_tokens)
+        for piece in pieces:
+            piece_tokens = unit_tokens if len(pieces) == 1 else count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                yield "\n".join(text for text, _ in current)
+                current, current_tokens = _overlap_tail(current, overlap_tokens, max_tokens - piece_tokens)
+            current.append((piece, piece_tokens))
+            current_tokens += piece_tokens
+    if current:
+        yield "\n".join(text for text, _ in current)
+
+def _overlap_tail(units, overlap_tokens, room):
+    """Trailing units of the previous chunk to repeat at the start of the next one"""
+    budget = min(overlap_tokens, room)
+    tail = []
+    total = 0
+    for text, tokens in reversed(units):
+        if total + tokens > budget:
+            break
+        tail.append((text, tokens))
+        total += tokens
+    tail.reverse()
+    return tail, total
@@ -0,0 +1,230 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Seconds between two requests to the same host (matches the old fixed sleep)
+DEFAULT_HOST_DELAY = 3.0
+
+def normalize_url(url):
+    """Normalize a URL so trivially different spellings deduplicate"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    # Drop default ports
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parsed.path or "/"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, path, parsed.params, query, ""))
+
+def get_host(url):
+    return urlparse(url).netloc.lower()
+
+class HostLimiter:
+    """Blocking per-host rate limiter for sequential callers.
+
+    `wait(url)` sleeps only as long as needed to keep `delay` seconds between
+    two requests to the same host, so slow page loads eat into the delay
+    instead of adding to it.
+    """
+
+    def __init__(self, delay=DEFAULT_HOST_DELAY, overrides=None):
+        self.delay = delay
+        self.overrides = overrides or {}
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def delay_for(self, host):
+        return self.overrides.get(host, self.delay)
+
+    def wait(self, url):
+        host = get_host(url)
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = start + self.delay_for(host)
+        pause = start - now
+        if pause > 0:
+            time.sleep(pause)
+        return pause
+
+# Shared limiter so independent scrapes of the same site stay polite
+host_limiter = HostLimiter()
+
+class Frontier:
+    """Priority URL frontier with deduplication and per-host politeness.
+
+    URLs are queued per host. `pop()` hands out the best-priority URL whose
+    host is below its concurrency limit and past its delay, so a slow or
+    rate-limited host never blocks workers that could be fetching elsewhere.
+    Lower priority values are fetched first.
+    """
+
+    def __init__(self, per_host_concurrency=1, per_host_delay=DEFAULT_HOST_DELAY, host_overrides=None):
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        # host -> {"delay": seconds, "concurrency": n}
+        self.host_overrides = host_overrides or {}
+        self._queues = {}
+        self._active = {}
+        self._next_allowed = {}
+        self._seen = set()
+        self._pending = 0
+        self._in_flight = 0
+        self._closed = False
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def _limits(self, host):
+        override = self.host_overrides.get(host, {})
+        return (override.get("concurrency", self.per_host_concurrency),
+                override.get("delay", self.per_host_delay))
+
+    def push(self, url, priority=0, depth=0):
+        """Queue a URL unless it has been seen before; returns True if queued"""
+        key = normalize_url(url)
+        with self._cond:
+            if key in self._seen or self._closed:
+                return False
+            self._seen.add(key)
+            host = get_host(key)
+            heapq.heappush(self._queues.setdefault(host, []), (priority, next(self._counter), url, depth))
+            self._pending += 1
+            self._cond.notify()
+            return True
+
+    def pop(self):
+        """Block until a URL may be fetched; returns None once the crawl is drained"""
+        with self._cond:
+            while True:
+                if self._closed or (self._pending == 0 and self._in_flight == 0):
+                    return None
+                now = time.monotonic()
+                best = None
+                wake_at = None
+                for host, queue in self._queues.items():
+                    if not queue:
+                        continue
+                    concurrency, _ = self._limits(host)
+                    if self._active.get(host, 0) >= concurrency:
+                        continue
+                    ready_at = self._next_allowed.get(host, now)
+                    if ready_at > now:
+                        wake_at = ready_at if wake_at is None else min(wake_at, ready_at)
+                        continue
+                    if best is None or queue[0] < self._queues[best][0]:
+                        best = host
+                if best is not None:
+                    priority, _, url, depth = heapq.heappop(self._queues[best])
+                    if not self._queues[best]:
+                        del self._queues[best]
+                    _, delay = self._limits(best)
+                    self._active[best] = self._active.get(best, 0) + 1
+                    self._next_allowed[best] = now + delay
+                    self._pending -= 1
+                    self._in_flight += 1
+                    return url, priority, depth
+                # Nothing is ready: sleep until the next host delay expires or a slot frees up
+                self._cond.wait(None if wake_at is None else max(wake_at - now, 0.001))
+
+    def task_done(self, url):
+        host = get_host(normalize_url(url))
+        with self._cond:
+            self._active[host] -= 1
+            if not self._active[host]:
+                del self._active[host]
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return self._pending
+
+def iter_crawl(seed_urls, fetch, workers=4, per_host_concurrency=1,
+               per_host_delay=DEFAULT_HOST_DELAY, host_overrides=None, max_pages=None):
+    """Fetch many URLs in parallel and yield one result dict per URL as it finishes.
+
+    `seed_urls` may contain plain URLs or `(url, priority)` tuples. `fetch(url)`
+    is called from worker threads and should return the page content; it may
+    also return `(content, links)` where `links` are URLs (or `(url, priority)`
+    tuples) to add to the frontier. Each result has `url`, `content`, `error`,
+    `depth` and `elapsed` keys.
+    """
+    frontier = Frontier(per_host_concurrency, per_host_delay, host_overrides)
+    for seed in seed_urls:
+        if isinstance(seed, tuple):
+            frontier.push(seed[0], priority=seed[1])
+        else:
+            frontier.push(seed)
+
+    results = []
+    results_cond = threading.Condition()
+    dispatched = itertools.count()
+    finished_workers = [0]
+
+    def worker():
+        try:
+            while True:
+                item = frontier.pop()
+                if item is None:
+                    return
+                url, _, depth = item
+                if max_pages is not None and next(dispatched) >= max_pages:
+                    frontier.task_done(url)
+                    frontier.close()
+                    return
+                started = time.monotonic()
+                result = {"url": url, "content": None, "error": None, "depth": depth}
+                try:
+                    fetched = fetch(url)
+                    if isinstance(fetched, tuple):
+                        fetched, links = fetched
+                        for link in links or []:
+                            if isinstance(link, tuple):
+                                frontier.push(link[0], priority=link[1], depth=depth + 1)
+                            else:
+                                frontier.push(link, depth=depth + 1)
+                    result["content"] = fetched
+                except Exception as e:
+                    result["error"] = str(e)
+                finally:
+                    frontier.task_done(url)
+                result["elapsed"] = time.monotonic() - started
+                with results_cond:
+                    results.append(result)
+                    results_cond.notify()
+        finally:
+            with results_cond:
+                finished_workers[0] += 1
+                results_cond.notify()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(workers):
+            executor.submit(worker)
+        try:
+            while True:
+                with results_cond:
+                    while not results and finished_workers[0] < workers:
+                        results_cond.wait()
+                    batch = results[:]
+                    del results[:]
+                    done = finished_workers[0] >= workers
+                for result in batch:
+                    yield result
+                if done and not batch:
+                    break
+        finally:
+            # Stop handing out work if the consumer stops iterating early
+            frontier.close()
+
+def crawl(seed_urls, fetch, **options):
+    """Fetch many URLs in parallel and return all result dicts"""
+    return list(iter_crawl(seed_urls, fetch, **options))
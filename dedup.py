@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from crawler import get_host, normalize_url
+from page_cache import DEFAULT_CACHE_DIR
+
+_EMPTY = 1 << 64
+_DIGIT_RE = re.compile(r"\d")
+
+def _hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+def minhash(text, num_perm=128, shingle_words=4):
+    """MinHash signature of the text's word shingles, using one-permutation hashing.
+
+    Each shingle is hashed once and falls into one of `num_perm` bins by its
+    hash; the bin keeps the smallest hash it sees. Signatures of two texts
+    agree in roughly the Jaccard similarity of their shingle sets, at the
+    cost of one hash per shingle instead of one per shingle and permutation.
+    """
+    words = text.lower().split()
+    signature = [_EMPTY] * num_perm
+    for i in range(max(len(words) - shingle_words + 1, 1)):
+        value = _hash(" ".join(words[i:i + shingle_words]))
+        # Low bits pick the bin, the rest is compared within it
+        bin_index, rest = value % num_perm, value // num_perm
+        if rest < signature[bin_index]:
+            signature[bin_index] = rest
+    return signature
+
+def estimate_similarity(a, b):
+    """Estimated Jaccard similarity of two signatures (bins empty in both are ignored)"""
+    compared = matches = 0
+    for x, y in zip(a, b):
+        if x == _EMPTY and y == _EMPTY:
+            continue
+        compared += 1
+        matches += x == y
+    return matches / compared if compared else 1.0
+
+class NearDuplicateIndex:
+    """Finds pages that are near-duplicates of a page seen earlier, with MinHash and LSH.
+
+    Signatures are split into `bands`; pages sharing any band become
+    candidates, and a candidate counts as a duplicate when its estimated
+    similarity is at least `threshold`. Lookups cost one signature and a
+    few dict probes however many pages have been indexed.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.signatures = {}
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature):
+        return [tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def find(self, text):
+        """Return the key of an indexed near-duplicate of `text` and the similarity, or (None, 0.0)"""
+        signature = minhash(text, self.num_perm)
+        with self._lock:
+            return self._find(signature)
+
+    def _find(self, signature):
+        best, best_similarity = None, 0.0
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+        for candidate in candidates:
+            similarity = estimate_similarity(signature, self.signatures[candidate])
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        return best, best_similarity
+
+    def _remove(self, key):
+        signature = self.signatures.pop(key, None)
+        if signature is not None:
+            for band, band_key in enumerate(self._band_keys(signature)):
+                self._buckets[band][band_key].remove(key)
+
+    def reindex(self, key, text):
+        """Replace the indexed text of a page without checking it for duplicates"""
+        signature = minhash(text, self.num_perm)
+        with self._lock:
+            self._remove(key)
+            self.signatures[key] = signature
+            for band, band_key in enumerate(self._band_keys(signature)):
+                self._buckets[band][band_key].append(key)
+
+    def add(self, key, text):
+        """Index a page unless it is a near-duplicate; returns the earlier page's key and the similarity if it is"""
+        signature = minhash(text, self.num_perm)
+        with self._lock:
+            duplicate, similarity = self._find(signature)
+            if duplicate is not None:
+                return duplicate, similarity
+            self.signatures[key] = signature
+            for band, band_key in enumerate(self._band_keys(signature)):
+                self._buckets[band][band_key].append(key)
+        return None, 0.0
+
+class BoilerplateFilter:
+    """Strips the lines a site repeats on every page (navigation, headers, footers).
+
+    The lines are learned by crawls (see `BoilerplateCounter`). Crawls of at
+    least `min_saved_pages` pages save them, so later crawls of the site
+    strip them from the first page on; smaller crawls only use them
+    themselves. Only the learned lines are shared between crawls; the
+    evidence behind them is counted per crawl.
+
+    Lines shorter than `min_line_length` characters or containing a digit
+    are never learned: short labels ("Shop") and values (prices, counts,
+    dates) repeat across pages without being chrome.
+    """
+
+    def __init__(self, path=None, min_pages=5, min_ratio=0.8, max_repeats=2, max_tracked_lines=50_000,
+                 min_saved_pages=10, min_line_length=8):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "boilerplate.json")
+        self.min_pages = min_pages
+        self.min_ratio = min_ratio
+        self.max_repeats = max_repeats
+        self.max_tracked_lines = max_tracked_lines
+        self.min_saved_pages = min_saved_pages
+        self.min_line_length = min_line_length
+        self._lock = threading.Lock()
+        # host -> set of boilerplate line hashes
+        self.learned = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.learned = {host: {int(value, 16) for value in lines} for host, lines in json.load(f).items()}
+            except (OSError, ValueError):
+                self.learned = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({host: sorted(f"{value:x}" for value in lines) for host, lines in self.learned.items()}, f)
+        os.replace(tmp_path, self.path)
+
+    def learn(self, host, lines):
+        """Replace the host's boilerplate with the given line hashes; returns whether it changed"""
+        with self._lock:
+            if lines == self.learned.get(host):
+                return False
+            self.learned[host] = lines
+            self._save()
+            return True
+
+    def can_learn(self, line):
+        """Whether a line may be learned as boilerplate at all"""
+        line = line.strip()
+        return len(line) >= self.min_line_length and not _DIGIT_RE.search(line)
+
+    def strip(self, url, text, extra=None):
+        """Return the text without the site's boilerplate lines (and `extra` line hashes), and how many were removed"""
+        learned = self.learned.get(get_host(url), set())
+        if extra:
+            learned = learned | extra
+        if not learned:
+            return text, 0
+        kept = [line for line in text.splitlines() if _hash(line) not in learned]
+        return "\n".join(kept), text.count("\n") + 1 - len(kept)
+
+class BoilerplateCounter:
+    """Counts, for one crawl, on how many distinct pages of each site every line appears.
+
+    A page is counted once: revisiting a URL, or another URL serving the
+    same text, adds nothing. Once `min_pages` distinct pages of a host have
+    been seen, lines found on at least `min_ratio` of them are boilerplate
+    for the rest of the crawl (`learned`), and are saved once the crawl has
+    seen `min_saved_pages` pages of the host. Lines repeated more than
+    `max_repeats` times within one page are left alone, since those are
+    usually per-item labels ("Add to cart", "In stock") rather than page
+    chrome.
+    """
+
+    def __init__(self, boilerplate):
+        self.boilerplate = boilerplate
+        # host -> set of boilerplate line hashes learned by this crawl
+        self.learned = {}
+        # host -> {"pages": count, "lines": Counter of line hash -> pages seen on,
+        #          "values": hashes of counted lines that may not be learned}
+        self._counts = {}
+        # (normalized URL or None, text signature) of every page counted
+        self._seen_urls = set()
+        self._seen_texts = set()
+
+    def observe(self, url, text):
+        """Count a page's lines toward its site's boilerplate; returns whether the learned lines changed"""
+        url_key = normalize_url(url)
+        signature = _hash(text)
+        if url_key in self._seen_urls or signature in self._seen_texts:
+            return False
+        self._seen_urls.add(url_key)
+        self._seen_texts.add(signature)
+        host = get_host(url)
+        repeats, values = Counter(), set()
+        for line in text.splitlines():
+            value = _hash(line)
+            repeats[value] += 1
+            if not self.boilerplate.can_learn(line):
+                values.add(value)
+        counts = self._counts.setdefault(host, {"pages": 0, "lines": Counter(), "values": set()})
+        counts["pages"] += 1
+        counted = [value for value, count in repeats.items() if count <= self.boilerplate.max_repeats]
+        counts["lines"].update(counted)
+        counts["values"].update(values.intersection(counted))
+        if len(counts["lines"]) > self.boilerplate.max_tracked_lines:
+            # Keep memory bounded on long crawls: lines seen on a single page cannot be boilerplate yet
+            counts["lines"] = Counter({value: count for value, count in counts["lines"].items() if count > 1})
+            counts["values"] &= counts["lines"].keys()
+        if counts["pages"] < self.boilerplate.min_pages:
+            return False
+        learned = self.common_lines(host) - counts["values"]
+        if counts["pages"] >= self.boilerplate.min_saved_pages:
+            self.boilerplate.learn(host, learned)
+        if learned == self.learned.get(host):
+            return False
+        self.learned[host] = learned
+        return True
+
+    def pages(self, host):
+        """Number of distinct pages of the host counted so far"""
+        return self._counts.get(host, {}).get("pages", 0)
+
+    def common_lines(self, host):
+        """Hashes of the lines found on at least `min_ratio` of the host's counted pages"""
+        counts = self._counts.get(host)
+        if not counts:
+            return set()
+        needed = counts["pages"] * self.boilerplate.min_ratio
+        return {value for value, count in counts["lines"].items() if count >= needed}
+
+class PageDeduplicator:
+    """Crawl-wide deduplication stage run on each page's cleaned text before extraction.
+
+    `process(url, text)` strips the site's known boilerplate lines, then
+    checks the remaining text against every earlier page of the crawl.
+    It returns the text to extract from (empty for a duplicate), the URL of
+    the page it duplicates (or None) and the number of boilerplate lines
+    removed.
+
+    Pages are only compared once `min_pages` distinct pages of their site
+    have been counted: until then the site's layout is unknown, and pages
+    sharing a large menu would look alike whatever their content. From then
+    on the lines common to the site's pages are left out of the comparison,
+    and the early pages are re-indexed the same way. Only exact repeats of
+    an earlier page's text are dropped before that. Pages that are not
+    duplicates count toward learning the site's boilerplate.
+    """
+
+    def __init__(self, boilerplate=None, index=None, max_unstripped_hosts=64):
+        self.boilerplate = boilerplate or get_boilerplate_filter()
+        self.index = index or NearDuplicateIndex()
+        self.counter = BoilerplateCounter(self.boilerplate)
+        self.max_unstripped_hosts = max_unstripped_hosts
+        # host -> [(url, text)] of pages seen before the host's layout was known
+        self._unstripped = {}
+        # host -> hashes of the lines left out when comparing its pages
+        self._layout = {}
+        # signature of a page's stripped text -> URL of the first page with that text
+        self._texts = {}
+
+    def _strip(self, url, text):
+        return self.boilerplate.strip(url, text, self.counter.learned.get(get_host(url)))
+
+    def _comparable(self, url, text):
+        stripped = self._strip(url, text)[0]
+        layout = self._layout.get(get_host(url))
+        if not layout:
+            return stripped
+        return "\n".join(line for line in stripped.splitlines() if _hash(line) not in layout)
+
+    def process(self, url, text):
+        host = get_host(url)
+        stripped, removed = self._strip(url, text)
+        signature = _hash(stripped)
+        if signature in self._texts:
+            return "", self._texts[signature], removed
+        if host in self._layout:
+            duplicate_of, _ = self.index.add(url, self._comparable(url, text))
+            if duplicate_of is not None:
+                return "", duplicate_of, removed
+        self._texts[signature] = url
+        if self.counter.observe(url, text):
+            # This page completed (or changed) what is known about the site
+            stripped, removed = self._strip(url, text)
+            if host in self._layout:
+                self.index.reindex(url, self._comparable(url, text))
+        if host not in self._layout:
+            self._settle(host, url, text)
+        return stripped, None, removed
+
+    def _settle(self, host, url, text):
+        early = self._unstripped.setdefault(host, [])
+        if len(early) < self.boilerplate.min_pages:
+            early.append((url, text))
+        if self.counter.pages(host) >= self.boilerplate.min_pages:
+            self._layout[host] = self.counter.common_lines(host)
+            for early_url, early_text in self._unstripped.pop(host) + [(url, text)]:
+                self.index.reindex(early_url, self._comparable(early_url, early_text))
+        # Batch crawls touch many hosts once; only keep the most recent few
+        while len(self._unstripped) > self.max_unstripped_hosts:
+            del self._unstripped[next(iter(self._unstripped))]
+
+# Boilerplate learned on one crawl helps the next
+_default_filter = None
+_default_filter_lock = threading.Lock()
+
+def get_boilerplate_filter():
+    """Return the process-wide boilerplate filter, creating it on first use"""
+    global _default_filter
+    with _default_filter_lock:
+        if _default_filter is None:
+            _default_filter = BoilerplateFilter()
+        return _default_filter
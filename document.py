@@ -0,0 +1,57 @@
+from bs4 import BeautifulSoup
+from pagination import find_next_candidates, first_candidate, get_pagination_engine
+from telemetry import span
+
+# Use the C-based lxml parser when it is installed; it is several times faster than html.parser
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+def parse_html(html_content):
+    """Parse HTML with the fastest available parser"""
+    return BeautifulSoup(html_content, PARSER)
+
+def soup_to_text(node):
+    """Remove scripts and styles from a parsed node and return its cleaned text"""
+    for script_or_style in node(["script", "style"]):
+        script_or_style.extract()
+    text = node.get_text(separator="\n")
+    # Remove empty lines and strip extra spaces
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+def analyze_document(html_content):
+    """Parse and clean a page without consulting the pagination engine.
+
+    Returns a dict with the parsed `soup`, the cleaned body `text`,
+    `login_required` and `next_candidates` (the href each next-link rule
+    matched, for `PaginationEngine.choose_next`). Everything but the soup is
+    plain data, so it can be computed in a worker process.
+    """
+    with span("parse"):
+        soup = parse_html(html_content)
+        login_required = bool(soup.find("input", {"type": "password"}))
+        next_candidates = find_next_candidates(soup)
+    with span("clean"):
+        body = soup.body
+        text = soup_to_text(body) if body else ""
+    return {
+        "soup": soup,
+        "text": text,
+        "next_candidates": next_candidates,
+        "login_required": login_required,
+    }
+
+def process_document(html_content, url=None):
+    """Parse a page once and derive everything the scraper needs from that tree.
+
+    Returns a dict with the cleaned body `text`, the `next_link` href (or
+    None), `login_required`, and the parsed `soup` for further lookups.
+    When the page `url` is given, the next link is absolute and found with
+    the pagination engine's per-site rules.
+    """
+    page = analyze_document(html_content)
+    candidates = page.pop("next_candidates")
+    page["next_link"] = get_pagination_engine().choose_next(candidates, url) if url else first_candidate(candidates)
+    return page
@@ -0,0 +1,278 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue, Empty
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from browser_profile import apply_blocking, load_profile, url_origin
+from telemetry import span
+
+# Resolve the chromedriver binary once per process instead of once per scrape
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def get_driver_path():
+    """Install (or locate) chromedriver once and reuse the path"""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+# Function to launch a new Chrome browser
+def create_driver(profile=None):
+    """Launch Chrome with the scraping profile (headless, with images, fonts, media and trackers blocked)"""
+    profile = profile or load_profile()
+    service = Service(get_driver_path())
+    driver = webdriver.Chrome(service=service, options=profile.chrome_options())
+    driver.scraping_profile = profile
+    apply_blocking(driver, profile.blocked_patterns())
+    return driver
+
+class PooledDriver:
+    """A Chrome driver together with the bookkeeping the pool needs"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+        self.created_at = time.time()
+
+class DriverPool:
+    """A bounded pool of reusable Chrome drivers.
+
+    Drivers are created lazily up to `size`, health-checked when borrowed,
+    wiped of every site's cookies and storage when returned, and recycled
+    after serving `max_pages` pages.
+    """
+
+    def __init__(self, size=2, max_pages=50, borrow_timeout=120, driver_factory=create_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.borrow_timeout = borrow_timeout
+        self.driver_factory = driver_factory
+        self._idle = Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.metrics = {
+            "borrows": 0,
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "recycles": 0,
+            "health_failures": 0,
+            "created": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    def _new_driver(self):
+        with span("driver_startup"):
+            pooled = PooledDriver(self.driver_factory())
+        self._count("created")
+        return pooled
+
+    def warm_up(self, count=None):
+        """Start browsers ahead of time so the first scrapes don't pay for startup"""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self._created >= count:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._new_driver())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _is_healthy(self, pooled):
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except Exception:
+            self._count("health_failures")
+            return False
+
+    def _destroy(self, pooled):
+        with self._lock:
+            self._created -= 1
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    def _reset(self, pooled):
+        """Remove the cookies and storage of every site the browser visited so the next borrower starts clean.
+
+        Sites are recorded by `browser_profile.record_origin` as they are
+        visited, plus wherever the browser ended up. Raises if some site's
+        storage cannot be cleared, so `release` retires the browser instead.
+        """
+        driver = pooled.driver
+        # Any logged-in session copied into this browser is gone with its cookies
+        driver.injected_session = None
+        origins = set(getattr(driver, "visited_origins", None) or ())
+        driver.visited_origins = set()
+        try:
+            current = url_origin(driver.current_url)
+        except Exception:
+            current = None
+        if current is not None:
+            origins.add(current)
+        try:
+            # Through DevTools, so every site's cookies go, not just the current page's
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            devtools = True
+        except Exception:
+            # Not a Chromium driver; WebDriver only reaches the current site's cookies
+            driver.delete_all_cookies()
+            devtools = False
+        try:
+            # Session storage belongs to the tab, and only the current site's can be cleared
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception:
+            # Storage is not accessible on some pages (e.g. data: or about: URLs)
+            pass
+        if devtools:
+            # Local storage, IndexedDB, caches and service workers, one concrete origin at a time
+            for origin in sorted(origins):
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        elif origins - {current}:
+            raise RuntimeError("Cannot clear other sites' cookies and storage without DevTools")
+        driver.get("about:blank")
+
+    def acquire(self):
+        """Borrow a healthy driver, starting a new one if the pool has room"""
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+        self._count("borrows")
+        deadline = time.monotonic() + self.borrow_timeout
+        waited = False
+        wait_started = time.monotonic()
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except Empty:
+                pooled = None
+
+            if pooled is not None:
+                if self._is_healthy(pooled):
+                    self._count("misses" if waited else "hits")
+                    break
+                self._destroy(pooled)
+                continue
+
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    pooled = self._new_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                self._count("misses")
+                break
+
+            # Pool is exhausted; wait for another scrape to return a driver
+            if not waited:
+                waited = True
+                self._count("waits")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Timed out waiting for a free browser in the driver pool")
+            try:
+                pooled = self._idle.get(timeout=min(remaining, 1.0))
+            except Empty:
+                continue
+            if self._is_healthy(pooled):
+                self._count("misses")
+                break
+            self._destroy(pooled)
+
+        if waited:
+            self._count("wait_seconds", time.monotonic() - wait_started)
+        return pooled
+
+    def release(self, pooled, pages=1, broken=False):
+        """Return a driver to the pool, recycling it if it is worn out or broken"""
+        pooled.pages_served += pages
+        if self._closed or broken or pooled.pages_served >= self.max_pages:
+            if not broken and not self._closed:
+                self._count("recycles")
+            self._destroy(pooled)
+            return
+        try:
+            self._reset(pooled)
+        except Exception:
+            self._destroy(pooled)
+            return
+        self._idle.put(pooled)
+
+    @contextmanager
+    def driver(self):
+        """Context manager that borrows a driver and always gives it back"""
+        pooled = self.acquire()
+        broken = False
+        try:
+            yield pooled.driver
+        except Exception:
+            # Let the health check decide whether the browser survived the error
+            broken = not self._is_healthy(pooled)
+            raise
+        finally:
+            self.release(pooled, broken=broken)
+
+    def stats(self):
+        """Return a snapshot of the pool metrics"""
+        with self._lock:
+            snapshot = dict(self.metrics)
+            snapshot["size"] = self.size
+            snapshot["live_drivers"] = self._created
+        snapshot["idle_drivers"] = self._idle.qsize()
+        return snapshot
+
+    def close(self):
+        """Quit every idle driver; borrowed drivers are quit when returned"""
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except Empty:
+                break
+            self._destroy(pooled)
+
+# Shared pool used by the scraping functions when no pool is passed in
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_driver_pool(size=None, max_pages=None):
+    """Return the process-wide driver pool, creating it on first use.
+
+    The size and recycle limit default to the SCRAPER_POOL_SIZE and
+    SCRAPER_POOL_MAX_PAGES environment variables.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            if size is None:
+                size = int(os.environ.get("SCRAPER_POOL_SIZE", 2))
+            if max_pages is None:
+                max_pages = int(os.environ.get("SCRAPER_POOL_MAX_PAGES", 50))
+            _default_pool = DriverPool(size=size, max_pages=max_pages)
+        return _default_pool
+
+@atexit.register
+def _close_default_pool():
+    if _default_pool is not None:
+        _default_pool.close()
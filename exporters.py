@@ -0,0 +1,406 @@
+import csv
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+# Unicode TTF fonts tried in order when no font is configured
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf",
+    "/usr/share/fonts/noto/NotoSans-Regular.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+
+def find_unicode_font():
+    """Path of a Unicode TTF font from SCRAPER_PDF_FONT or the usual system locations, or None"""
+    configured = os.environ.get("SCRAPER_PDF_FONT")
+    if configured:
+        return configured
+    return next((path for path in FONT_CANDIDATES if os.path.exists(path)), None)
+
+def iter_result_lines(results):
+    """Non-empty lines from a stream of extraction results (strings), one at a time"""
+    if isinstance(results, str):
+        results = [results]
+    for result in results:
+        for line in result.splitlines():
+            if line.strip():
+                yield line
+
+def write_text(lines, f):
+    """Write lines to a text file object; returns the number of lines"""
+    count = 0
+    for line in lines:
+        f.write(line + "\n")
+        count += 1
+    return count
+
+def write_csv(lines, f):
+    """Write each line as a CSV row of its comma-separated fields; returns the number of rows"""
+    writer = csv.writer(f)
+    count = 0
+    for line in lines:
+        writer.writerow(line.split(","))
+        count += 1
+    return count
+
+def write_jsonl(lines, f):
+    """Write one JSON object per line with its row number, text and comma-separated fields"""
+    count = 0
+    for count, line in enumerate(lines, 1):
+        f.write(json.dumps({"row": count, "text": line, "fields": line.split(",")}, ensure_ascii=False) + "\n")
+    return count
+
+def write_parquet(lines, path, rows_per_group=10_000):
+    """Write rows to a Parquet file one row group at a time (requires pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    schema = pa.schema([("row", pa.int64()), ("text", pa.string()), ("fields", pa.list_(pa.string()))])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        batch = []
+        for line in lines:
+            count += 1
+            batch.append(line)
+            if len(batch) >= rows_per_group:
+                writer.write_table(_parquet_table(pa, schema, batch, count - len(batch) + 1))
+                batch = []
+        if batch or count == 0:
+            writer.write_table(_parquet_table(pa, schema, batch, count - len(batch) + 1))
+    return count
+
+def _parquet_table(pa, schema, batch, first_row):
+    return pa.table({
+        "row": list(range(first_row, first_row + len(batch))),
+        "text": batch,
+        "fields": [line.split(",") for line in batch],
+    }, schema=schema)
+
+class TrueTypeFont:
+    """The parts of a TrueType font needed to lay out text and embed it in a PDF"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.name = "".join(c for c in os.path.splitext(os.path.basename(path))[0] if c.isalnum()) or "Font"
+        tables = {}
+        num_tables = struct.unpack(">H", self.data[4:6])[0]
+        for i in range(num_tables):
+            tag, _, offset, length = struct.unpack(">4sIII", self.data[12 + 16 * i:28 + 16 * i])
+            tables[tag.decode("latin-1")] = (offset, length)
+        head = tables["head"][0]
+        self.units_per_em = struct.unpack(">H", self.data[head + 18:head + 20])[0]
+        self.bbox = struct.unpack(">hhhh", self.data[head + 36:head + 44])
+        hhea = tables["hhea"][0]
+        self.ascent, self.descent = struct.unpack(">hh", self.data[hhea + 4:hhea + 8])
+        metric_count = struct.unpack(">H", self.data[hhea + 34:hhea + 36])[0]
+        hmtx = tables["hmtx"][0]
+        self.advances = [struct.unpack(">H", self.data[hmtx + 4 * i:hmtx + 4 * i + 2])[0] for i in range(metric_count)]
+        self.cap_height = self.ascent
+        if "OS/2" in tables:
+            os2, length = tables["OS/2"]
+            version = struct.unpack(">H", self.data[os2:os2 + 2])[0]
+            if version >= 2 and length >= 90:
+                self.cap_height = struct.unpack(">h", self.data[os2 + 88:os2 + 90])[0]
+        self.cmap = self._read_cmap(tables["cmap"][0])
+
+    def _read_cmap(self, cmap):
+        count = struct.unpack(">H", self.data[cmap + 2:cmap + 4])[0]
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack(">HHI", self.data[cmap + 4 + 8 * i:cmap + 12 + 8 * i])
+            subtables[(platform, encoding)] = cmap + offset
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3), (0, 1), (0, 0)):
+            if key in subtables:
+                offset = subtables[key]
+                table_format = struct.unpack(">H", self.data[offset:offset + 2])[0]
+                if table_format == 12:
+                    return self._read_cmap12(offset)
+                if table_format == 4:
+                    return self._read_cmap4(offset)
+        raise ValueError("The font has no Unicode character map")
+
+    def _read_cmap4(self, offset):
+        data = self.data
+        segments = struct.unpack(">H", data[offset + 6:offset + 8])[0] // 2
+        ends = struct.unpack(f">{segments}H", data[offset + 14:offset + 14 + 2 * segments])
+        starts_at = offset + 16 + 2 * segments
+        starts = struct.unpack(f">{segments}H", data[starts_at:starts_at + 2 * segments])
+        deltas = struct.unpack(f">{segments}h", data[starts_at + 2 * segments:starts_at + 4 * segments])
+        range_offsets_at = starts_at + 4 * segments
+        range_offsets = struct.unpack(f">{segments}H", data[range_offsets_at:range_offsets_at + 2 * segments])
+        mapping = {}
+        for i in range(segments):
+            for code in range(starts[i], ends[i] + 1):
+                if code == 0xFFFF:
+                    continue
+                if range_offsets[i] == 0:
+                    glyph = (code + deltas[i]) & 0xFFFF
+                else:
+                    at = range_offsets_at + 2 * i + range_offsets[i] + 2 * (code - starts[i])
+                    glyph = struct.unpack(">H", data[at:at + 2])[0]
+                    if glyph:
+                        glyph = (glyph + deltas[i]) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def _read_cmap12(self, offset):
+        groups = struct.unpack(">I", self.data[offset + 12:offset + 16])[0]
+        mapping = {}
+        for i in range(groups):
+            start, end, glyph = struct.unpack(">III", self.data[offset + 16 + 12 * i:offset + 28 + 12 * i])
+            for code in range(start, end + 1):
+                mapping[code] = glyph + code - start
+        return mapping
+
+    def advance(self, glyph):
+        """Advance width of a glyph in 1/1000 em"""
+        width = self.advances[glyph] if glyph < len(self.advances) else self.advances[-1]
+        return width * 1000 / self.units_per_em
+
+    def scaled(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+# Helvetica advance widths (1/1000 em) for ASCII 32-126, used when no TTF font is available
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278, 556, 556, 556, 556,
+    556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778,
+    722, 278, 500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278,
+    278, 278, 469, 556, 333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 262, 334, 584,
+]
+
+class StreamingPdfWriter:
+    """Write text to a PDF one page at a time, so memory stays flat however long the text is.
+
+    Each page's content stream is compressed and written to the file as
+    soon as the page is full; only the page object numbers (and the set of
+    glyphs used) are kept until `close()` writes the fonts, page tree and
+    cross-reference table. With a TrueType font every Unicode character
+    the font covers is kept, the font is embedded, and a ToUnicode map keeps
+    the text searchable. There is no fallback font: characters the font
+    lacks (CJK with DejaVu Sans, for instance) show as empty .notdef boxes
+    and are missing from copied text. Without a TrueType font the built-in
+    Helvetica is used and characters outside Windows-1252 are replaced.
+    """
+
+    def __init__(self, f, font_path=None, font_size=10, page_width=595.28, page_height=841.89, margin=42.5):
+        self.f = f
+        self.font = TrueTypeFont(font_path) if font_path else None
+        self.font_size = font_size
+        self.leading = font_size * 1.25
+        self.page_width = page_width
+        self.page_height = page_height
+        self.margin = margin
+        self.max_width = (page_width - 2 * margin) * 1000 / font_size
+        self.lines_per_page = max(1, int((page_height - 2 * margin) // self.leading))
+        self._offsets = {}
+        self._next_id = 1
+        self._page_ids = []
+        self._lines = []
+        self._glyphs = {}
+        self._used_glyphs = {}
+        self._pages_id = self._reserve()
+        self._font_id = self._reserve()
+        self._position = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _reserve(self):
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _write(self, data):
+        self.f.write(data)
+        self._position += len(data)
+
+    def _object(self, object_id, body, stream=None):
+        self._offsets[object_id] = self._position
+        if stream is None:
+            self._write(f"{object_id} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+            return
+        self._write(f"{object_id} 0 obj\n{body[:-2].rstrip()} /Length {len(stream)} >>\nstream\n".encode("latin-1"))
+        self._write(stream)
+        self._write(b"\nendstream\nendobj\n")
+
+    def _glyph(self, char):
+        """Hex code and width (1/1000 em) of a character in the font's encoding"""
+        cached = self._glyphs.get(char)
+        if cached is None:
+            if self.font is None:
+                code = char.encode("cp1252", errors="replace")[0]
+                cached = (f"{code:02x}", _HELVETICA_WIDTHS[code - 32] if 32 <= code <= 126 else 556)
+            else:
+                glyph = self.font.cmap.get(ord(char), 0)
+                self._used_glyphs.setdefault(glyph, char)
+                cached = (f"{glyph:04x}", self.font.advance(glyph))
+            cached = self._glyphs[char] = cached
+        return cached
+
+    def _wrap(self, line):
+        """Break a line into pieces that fit the page width, preferring to break at spaces"""
+        line = line.replace("\t", "    ")
+        start = 0
+        total = 0
+        last_space = -1
+        encoded = []
+        for i, char in enumerate(line):
+            code, width = self._glyph(char)
+            total += width
+            if total > self.max_width and i > start:
+                cut = last_space + 1 if last_space >= start else i
+                yield "".join(encoded[start:cut] if line[cut - 1] != " " else encoded[start:cut - 1])
+                start = cut
+                total = sum(self._glyph(c)[1] for c in line[start:i + 1])
+                last_space = -1
+            if char == " ":
+                last_space = i
+            encoded.append(code)
+        yield "".join(encoded[start:])
+
+    def add_line(self, line):
+        """Add a line of text, wrapped to the page width, starting a new page when this one is full"""
+        for encoded in self._wrap(line):
+            self._lines.append(encoded)
+            if len(self._lines) >= self.lines_per_page:
+                self._flush_page()
+
+    def _flush_page(self):
+        top = self.page_height - self.margin - self.font_size
+        parts = [f"BT /F1 {self.font_size} Tf {self.leading:.2f} TL {self.margin:.2f} {top:.2f} Td"]
+        parts.extend(f"<{encoded}> Tj T*" for encoded in self._lines)
+        parts.append("ET")
+        content_id = self._reserve()
+        self._object(content_id, "<< /Filter /FlateDecode >>", zlib.compress("\n".join(parts).encode("latin-1")))
+        page_id = self._reserve()
+        self._object(page_id, (f"<< /Type /Page /Parent {self._pages_id} 0 R "
+                               f"/MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}] "
+                               f"/Resources << /Font << /F1 {self._font_id} 0 R >> >> /Contents {content_id} 0 R >>"))
+        self._page_ids.append(page_id)
+        self._lines = []
+
+    def _write_font(self):
+        if self.font is None:
+            self._object(self._font_id, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+            return
+        font = self.font
+        file_id, descriptor_id, cid_font_id, to_unicode_id = (self._reserve() for _ in range(4))
+        self._object(file_id, f"<< /Filter /FlateDecode /Length1 {len(font.data)} >>", zlib.compress(font.data))
+        bbox = " ".join(str(font.scaled(value)) for value in font.bbox)
+        self._object(descriptor_id, (f"<< /Type /FontDescriptor /FontName /{font.name} /Flags 32 /FontBBox [{bbox}] "
+                                     f"/ItalicAngle 0 /Ascent {font.scaled(font.ascent)} /Descent {font.scaled(font.descent)} "
+                                     f"/CapHeight {font.scaled(font.cap_height)} /StemV 80 /FontFile2 {file_id} 0 R >>"))
+        widths = " ".join(f"{glyph} [{round(font.advance(glyph))}]" for glyph in sorted(self._used_glyphs))
+        self._object(cid_font_id, (f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{font.name} "
+                                   "/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                                   f"/FontDescriptor {descriptor_id} 0 R /CIDToGIDMap /Identity /W [{widths}] >>"))
+        self._object(to_unicode_id, "<< >>", self._to_unicode_cmap().encode("latin-1"))
+        self._object(self._font_id, (f"<< /Type /Font /Subtype /Type0 /BaseFont /{font.name} /Encoding /Identity-H "
+                                     f"/DescendantFonts [{cid_font_id} 0 R] /ToUnicode {to_unicode_id} 0 R >>"))
+
+    def _to_unicode_cmap(self):
+        entries = [(glyph, char) for glyph, char in sorted(self._used_glyphs.items()) if glyph]
+        parts = ["/CIDInit /ProcSet findresource begin 12 dict begin begincmap",
+                 "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+                 "/CMapName /Adobe-Identity-UCS def /CMapType 2 def",
+                 "1 begincodespacerange <0000> <FFFF> endcodespacerange"]
+        for start in range(0, len(entries), 100):
+            block = entries[start:start + 100]
+            parts.append(f"{len(block)} beginbfchar")
+            parts.extend(f"<{glyph:04x}> <{char.encode('utf-16-be').hex()}>" for glyph, char in block)
+            parts.append("endbfchar")
+        parts.append("endcmap CMapName currentdict /CMap defineresource pop end end")
+        return "\n".join(parts)
+
+    def close(self):
+        """Write the last page and everything a PDF reader needs to open the file"""
+        if self._lines or not self._page_ids:
+            self._flush_page()
+        self._write_font()
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._object(self._pages_id, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        catalog_id = self._reserve()
+        self._object(catalog_id, f"<< /Type /Catalog /Pages {self._pages_id} 0 R >>")
+        xref_position = self._position
+        lines = [f"xref\n0 {self._next_id}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[object_id]:010d} 00000 n \n" for object_id in range(1, self._next_id))
+        lines.append(f"trailer\n<< /Size {self._next_id} /Root {catalog_id} 0 R >>\nstartxref\n{xref_position}\n%%EOF\n")
+        self._write("".join(lines).encode("latin-1"))
+        return len(self._page_ids)
+
+def write_pdf(lines, f, font_path=None):
+    """Write lines to a binary file object as a paged PDF; returns the number of pages"""
+    writer = StreamingPdfWriter(f, font_path=font_path or find_unicode_font())
+    for line in lines:
+        writer.add_line(line)
+    return writer.close()
+
+# Export formats: (file extension, MIME type, whether the writer takes a binary file)
+FORMATS = {
+    "csv": ("csv", "text/csv", False),
+    "text": ("txt", "text/plain", False),
+    "jsonl": ("jsonl", "application/x-ndjson", False),
+    "parquet": ("parquet", "application/vnd.apache.parquet", True),
+    "pdf": ("pdf", "application/pdf", True),
+}
+
+def export(results, export_format, path):
+    """Stream extraction results into a file in the given format; returns the row (or page) count.
+
+    The file is written to a unique temporary name next to `path` and
+    renamed when complete, so a partial export is never mistaken for a
+    finished one and concurrent exports to the same path do not collide.
+    """
+    writers = {"csv": write_csv, "text": write_text, "jsonl": write_jsonl}
+    if export_format not in writers and export_format not in ("parquet", "pdf"):
+        raise ValueError(f"Unknown export format: {export_format}")
+    lines = iter_result_lines(results)
+    directory, name = os.path.split(os.path.abspath(path))
+    descriptor, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        if export_format == "parquet":
+            os.close(descriptor)
+            count = write_parquet(lines, tmp_path)
+        elif export_format == "pdf":
+            with os.fdopen(descriptor, "wb") as f:
+                count = write_pdf(lines, f)
+        else:
+            with os.fdopen(descriptor, "w", encoding="utf-8", newline="") as f:
+                count = writers[export_format](lines, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+def export_cached(text, export_format, directory=None, keep=20):
+    """Path of an export of `text`, written once per distinct text and format.
+
+    Exports live in the cache directory and only the `keep` most recent are
+    kept, so repeated downloads of the same results are not regenerated.
+    """
+    from page_cache import DEFAULT_CACHE_DIR
+    directory = directory or os.path.join(DEFAULT_CACHE_DIR, "exports")
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    path = os.path.join(directory, f"{digest}.{FORMATS[export_format][0]}")
+    if not os.path.exists(path):
+        export(text, export_format, path)
+        exports = sorted((entry for entry in os.scandir(directory) if not entry.name.endswith(".tmp")),
+                         key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in exports[keep:]:
+            os.remove(entry.path)
+    return path
@@ -0,0 +1,177 @@
+import asyncio
+import atexit
+import re
+import threading
+import time
+from collections import deque
+import aiohttp
+from crawler import get_host
+from telemetry import logger, span
+
+# Browser-like headers so servers return the same HTML they would send Chrome
+DEFAULT_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+_SCRIPT_STYLE_RE = re.compile(r"<(script|style|noscript|template)\b.*?</\1\s*>", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+_EMPTY_MOUNT_RE = re.compile(
+    r"<div[^>]+id=[\"'](root|app|__next|__nuxt|main-app)[\"'][^>]*>\s*</div>", re.I)
+_NOSCRIPT_WARNING_RE = re.compile(r"<noscript\b[^>]*>[^<]*(enable|requires?)\s+javascript", re.I)
+_PASSWORD_INPUT_RE = re.compile(r"<input[^>]+type=[\"']?password", re.I)
+
+def visible_text_length(html_content):
+    """Cheap estimate of the amount of text a browser would show"""
+    text = _TAG_RE.sub(" ", _SCRIPT_STYLE_RE.sub(" ", html_content))
+    return len(" ".join(text.split()))
+
+def needs_js_rendering(html_content, min_text=200):
+    """Guess whether static HTML is missing content that JavaScript would render"""
+    if not html_content or "<body" not in html_content.lower():
+        return True
+    # A login form is complete as served; the browser would not show more without credentials
+    if _PASSWORD_INPUT_RE.search(html_content):
+        return False
+    text_length = visible_text_length(html_content)
+    if text_length < min_text:
+        return True
+    # An empty single-page-app mount point means the content is built client side
+    if _EMPTY_MOUNT_RE.search(html_content) and text_length < 2000:
+        return True
+    if _NOSCRIPT_WARNING_RE.search(html_content) and text_length < 1000:
+        return True
+    return False
+
+class TieredFetcher:
+    """Fetch pages over plain HTTP and fall back to the browser only when needed.
+
+    HTTP requests share one keep-alive connection pool driven by an asyncio
+    loop on a background thread, so both sync callers (any thread) and async
+    callers reuse the same connections. Whether a domain needs JavaScript
+    rendering is decided from the first page fetched and cached per domain.
+    """
+
+    def __init__(self, max_connections=100, max_per_host=8, timeout=15, headers=None):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        # host -> True if the host needs the browser tier
+        self.js_domains = {}
+        self.tier_log = deque(maxlen=1000)
+        self.metrics = {"http": 0, "browser": 0, "escalations": 0}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._thread = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="http-fetch", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host,
+                                             keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def fetch_http_async(self, url, headers=None):
+        """Fetch a URL over HTTP; returns a dict with status, url, html and headers"""
+        session = await self._get_session()
+        async with session.get(url, headers=headers, allow_redirects=True) as response:
+            body = await response.read()
+            encoding = response.get_encoding() if body else "utf-8"
+            return {
+                "status": response.status,
+                "url": str(response.url),
+                "html": body.decode(encoding or "utf-8", errors="replace"),
+                "headers": dict(response.headers),
+            }
+
+    def _run(self, coroutine):
+        loop = self._ensure_loop()
+        # The background loop owns the session, so run every request there
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def fetch_http(self, url, headers=None):
+        """Blocking wrapper around `fetch_http_async` that is safe to call from any thread"""
+        return self._run(self.fetch_http_async(url, headers))
+
+    def _record(self, url, tier, started):
+        with self._lock:
+            self.metrics[tier] += 1
+        self.tier_log.append({"url": url, "tier": tier, "seconds": time.monotonic() - started})
+
+    def fetch_response(self, url, browser_fetch, headers=None, http_response=None):
+        """Return a dict with `html`, `tier` ("http" or "browser") and the HTTP `headers`.
+
+        `browser_fetch(url)` is only called when the domain is known to need
+        JavaScript, the HTTP request fails, or the static HTML looks unrendered.
+        `headers` are sent with the HTTP request (e.g. a session's cookies).
+        `http_response` is a `fetch_http` result already in hand for the URL
+        (such as a cache revalidation that got the page back), used instead
+        of requesting it again.
+        """
+        started = time.monotonic()
+        host = get_host(url)
+        if not self.js_domains.get(host):
+            result = http_response
+            if result is None:
+                try:
+                    with span("http_fetch"):
+                        result = self.fetch_http(url, headers)
+                except Exception as e:
+                    logger.warning("HTTP fetch failed for %s: %s", url, e)
+            if result and result["status"] == 200:
+                if not needs_js_rendering(result["html"]):
+                    self.js_domains.setdefault(host, False)
+                    self._record(url, "http", started)
+                    return {"html": result["html"], "tier": "http", "headers": result["headers"]}
+                # Remember that this domain renders client side
+                self.js_domains[host] = True
+            with self._lock:
+                self.metrics["escalations"] += 1
+        html_content = browser_fetch(url)
+        self._record(url, "browser", started)
+        return {"html": html_content, "tier": "browser", "headers": {}}
+
+    def fetch(self, url, browser_fetch):
+        """Return `(html, tier)` for a URL, where tier is "http" or "browser" """
+        response = self.fetch_response(url, browser_fetch)
+        return response["html"], response["tier"]
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            self._run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+        self._session = None
+
+# Shared fetcher used by the scraping functions when none is passed in
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+def get_fetcher():
+    """Return the process-wide tiered fetcher, creating it on first use"""
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = TieredFetcher()
+        return _default_fetcher
+
+@atexit.register
+def _close_default_fetcher():
+    if _default_fetcher is not None:
+        _default_fetcher.close()
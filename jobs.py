@@ -0,0 +1,386 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from page_cache import DEFAULT_CACHE_DIR
+from telemetry import configure_logging, logger
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL,
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        error TEXT,
+        created REAL NOT NULL,
+        started REAL,
+        finished REAL
+    )
+"""
+
+def _connect(path):
+    db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(_SCHEMA)
+    return db
+
+def _update(db, job_id, **fields):
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with db:
+        db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+# Job handlers run inside worker processes. Each takes (params, secrets, progress)
+# and returns a JSON-serializable result; progress(fraction, message) reports progress.
+
+def _readiness(params):
+    from readiness import build_strategy
+    if not params.get("readiness"):
+        return None
+    return build_strategy(params["readiness"], params.get("readiness_selector"), params.get("quiet_time", 0.5))
+
+def _session(params, secrets):
+    if not params.get("login_url"):
+        return None
+    from auth_session import get_auth_session
+    from driver_pool import get_driver_pool
+    return get_auth_session(params["login_url"], params["username"], secrets["password"],
+                            pool=get_driver_pool(), readiness=_readiness(params))
+
+def _dispatcher(params, secrets):
+    from llm_cache import get_response_cache
+    from llm_dispatch import ExtractionDispatcher, StubModel
+    from relevance import RelevanceFilter
+    if params.get("model") == "stub":
+        # Offline stand-in for Gemini
+        model = StubModel()
+    else:
+        import google.generativeai as genai
+        genai.configure(api_key=secrets["api_key"])
+        model = genai.GenerativeModel(params.get("model", "gemini-1.5-pro"))
+    return ExtractionDispatcher(model, concurrency=params.get("concurrency", 4),
+                                requests_per_minute=params.get("requests_per_minute", 60),
+                                tokens_per_minute=params.get("tokens_per_minute", 1_000_000),
+                                cache=get_response_cache(), batch_tokens=params.get("batch_tokens", 0),
+                                prefilter=RelevanceFilter() if params.get("prefilter") else None)
+
+def _extracted_text(results, errors, schema):
+    if schema is None:
+        return "\n\n".join(text for i, text in enumerate(results) if i not in errors)
+    return "\n".join(json.dumps(record, ensure_ascii=False) for records in results for record in records)
+
+def run_scrape_job(params, secrets, progress):
+    """Scrape one page; the result has the cleaned `text`, `tier` and `login_required`.
+
+    `blocks` holds the page's DOM blocks that fit in `chunk_tokens`, for an
+    extract job to chunk without splitting a record. In incremental mode
+    `text` holds only the new and changed chunks instead (and there are no
+    blocks), and `pending_changes` the fingerprints an extract job commits
+    once it has processed them.
+    """
+    from chunker import html_blocks
+    from main import scrape_page
+    from change_tracker import describe_changes, get_change_tracker, iter_stable_chunks
+    progress(0.1, "Retrieving page content...")
+    page = scrape_page(params["url"], readiness=_readiness(params), refresh=params.get("refresh", False))
+    if not page:
+        raise RuntimeError("Failed to retrieve website content.")
+    result = {"url": params["url"], "tier": page["tier"], "login_required": page["login_required"],
+              "text": page["text"]}
+    if params.get("incremental") and not page["login_required"]:
+        progress(0.8, "Comparing with the last scrape...")
+        changes = get_change_tracker().diff(params["url"], iter_stable_chunks(page["text"]))
+        result["text"] = "\n".join(changes["emitted"])
+        result["changes"] = describe_changes(changes)
+        result["pending_changes"] = changes["pending"]
+    elif not page["login_required"]:
+        progress(0.8, "Splitting the page into blocks...")
+        result["blocks"] = html_blocks(page["html"], max_tokens=params.get("chunk_tokens", 1250))
+    return result
+
+def run_extract_job(params, secrets, progress):
+    """Run Gemini extraction over `content`; the result has the joined `text` and per-chunk `errors`.
+
+    `content` is cleaned text, or a list of blocks from a scrape job, which
+    are packed into chunks whole.
+
+    With a `schema`, the result also has the validated `records`, and `text`
+    holds them as JSON lines. With `prefilter`, only chunks that score as
+    relevant to the description are sent; `skipped` counts the others.
+    `commit_changes` lists the `url` and `fingerprints` of incremental
+    scrapes the content came from; they are committed to the change tracker
+    only if every chunk was extracted.
+    """
+    from chunker import iter_chunks
+    from records import load_schema
+    chunks = list(iter_chunks(params["content"], max_tokens=params.get("chunk_tokens", 1250),
+                              overlap_tokens=params.get("chunk_overlap", 0)))
+    dispatcher = _dispatcher(params, secrets)
+    schema = load_schema(params["schema"]) if params.get("schema") else None
+    progress(0.0, f"Processing {len(chunks)} chunks...")
+    results, errors = dispatcher.extract(
+        chunks, params["description"],
+        progress=lambda done, total: progress(done / total, f"Processed {done} of {total} chunks..."),
+        schema=schema)
+    if params.get("commit_changes") and not errors:
+        from change_tracker import get_change_tracker
+        tracker = get_change_tracker()
+        for change in params["commit_changes"]:
+            tracker.commit(change["url"], change["fingerprints"])
+    result = {
+        "errors": {str(i + 1): str(error) for i, error in sorted(errors.items())},
+        "skipped": dispatcher.metrics["chunks_skipped"],
+    }
+    if schema is not None:
+        result["records"] = [record for chunk_records in results for record in chunk_records]
+    result["text"] = _extracted_text(results, errors, schema)
+    return result
+
+def run_multi_page_job(params, secrets, progress):
+    """Follow next-page links from `url`; the result lists each page under `pages`.
+
+    Each page has its number, URL, tier and `content`, plus `duplicate_of`,
+    `boilerplate_lines` and `changes` when they apply. With a `description`,
+    each page is extracted as it arrives and gets `extracted` and `errors`;
+    its changes are committed once it has been extracted without errors.
+    Otherwise `pending_changes` lists the fingerprints for an extract job
+    to commit. `login_url` and `username` (with the password in the
+    secrets) scrape behind a login.
+    """
+    from chunker import iter_chunks
+    from change_tracker import get_change_tracker
+    from driver_pool import get_driver_pool
+    from main import iter_pages
+    from records import load_schema
+    dispatcher = _dispatcher(params, secrets) if params.get("description") else None
+    schema = load_schema(params["schema"]) if params.get("schema") else None
+    num_pages = params["num_pages"]
+    pages = []
+    pending_changes = []
+    for page in iter_pages(params["url"], num_pages, pool=get_driver_pool(), readiness=_readiness(params),
+                           refresh=params.get("refresh", False), incremental=params.get("incremental", False),
+                           prefetch=params.get("prefetch", 0), session=_session(params, secrets),
+                           dedup=params.get("dedup", False), commit_changes=False):
+        summary = {name: page[name] for name in ("page_number", "url", "tier", "content", "duplicate_of",
+                                                 "boilerplate_lines", "changes") if name in page}
+        if dispatcher is not None:
+            results, errors = dispatcher.extract(
+                iter_chunks(page["content"], max_tokens=params.get("chunk_tokens", 1250),
+                            overlap_tokens=params.get("chunk_overlap", 0)),
+                params["description"], schema=schema)
+            summary["extracted"] = _extracted_text(results, errors, schema)
+            summary["errors"] = {str(i + 1): str(error) for i, error in sorted(errors.items())}
+            if "pending_changes" in page and not errors:
+                get_change_tracker().commit(page["url"], page["pending_changes"])
+        elif "pending_changes" in page:
+            pending_changes.append({"url": page["url"], "fingerprints": page["pending_changes"]})
+        pages.append(summary)
+        progress(len(pages) / num_pages, f"Scraped page {page['page_number']} ({page['tier']} tier)")
+    return {"pages": pages, "pending_changes": pending_changes}
+
+def run_crawl_job(params, secrets, progress):
+    """Crawl the `urls` in parallel; the result lists each page's `url`, `content`, `error` and `duplicate_of`"""
+    from driver_pool import get_driver_pool
+    from main import crawl_websites
+    urls = params["urls"]
+    pages = []
+    for result in crawl_websites(urls, workers=params.get("workers", 4), per_host_delay=params["per_host_delay"],
+                                 pool=get_driver_pool(), readiness=_readiness(params),
+                                 refresh=params.get("refresh", False), dedup=params.get("dedup", False)):
+        pages.append({name: result.get(name) for name in ("url", "content", "error", "duplicate_of")})
+        progress(len(pages) / len(urls), f"Crawled {len(pages)} of {len(urls)} URLs")
+    return {"pages": pages}
+
+def run_login_job(params, secrets, progress):
+    """Log in at `url` and scrape it; the result has the cleaned `text` and its `blocks`, as a scrape job"""
+    from chunker import html_blocks
+    from document import process_document
+    from driver_pool import get_driver_pool
+    from main import login_and_scrape
+    progress(0.1, "Logging in...")
+    html_content = login_and_scrape(params["url"], params["username"], secrets["password"],
+                                    pool=get_driver_pool(), readiness=_readiness(params))
+    if not html_content:
+        raise RuntimeError("Login or scraping failed.")
+    progress(0.8, "Processing content...")
+    return {"url": params["url"], "text": process_document(html_content)["text"],
+            "blocks": html_blocks(html_content, max_tokens=params.get("chunk_tokens", 1250))}
+
+JOB_HANDLERS = {
+    "scrape": run_scrape_job,
+    "multi_page": run_multi_page_job,
+    "crawl": run_crawl_job,
+    "login": run_login_job,
+    "extract": run_extract_job,
+}
+
+def _init_worker():
+    # Each worker runs one job at a time, so one browser and one parse process per worker are enough
+    os.environ.setdefault("SCRAPER_POOL_SIZE", "1")
+    os.environ.setdefault("SCRAPER_PARSE_WORKERS", "1")
+    configure_logging(os.environ.get("SCRAPER_LOG_LEVEL", "WARNING"))
+
+def _run_job(path, job_id, kind, params, secrets):
+    """Worker process entry point: run one job and record its outcome"""
+    db = _connect(path)
+    try:
+        row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] != QUEUED:
+            return
+        _update(db, job_id, status=RUNNING, started=time.time(), message="Starting...")
+
+        def progress(fraction, message=None):
+            _update(db, job_id, progress=min(max(fraction, 0.0), 1.0), message=message)
+
+        try:
+            result = JOB_HANDLERS[kind](params, secrets or {}, progress)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, kind)
+            _update(db, job_id, status=FAILED, error=str(e) or type(e).__name__, finished=time.time())
+            return
+        _update(db, job_id, status=DONE, progress=1.0, message=None, result=json.dumps(result),
+                finished=time.time())
+    finally:
+        db.close()
+
+class JobQueue:
+    """Runs scrape, crawl, login and extraction jobs in a bounded pool of worker processes.
+
+    Jobs get an ID on `submit()`, and their status, progress and result are
+    kept in SQLite so any session (and any later rerun) can look them up with
+    `get()`. At most `workers` jobs run at once server-wide; the rest wait in
+    the queue. `secrets` (API keys, passwords) are passed to the worker but
+    never written to disk. Jobs a previous server left queued or running are
+    marked failed when the queue starts, since they cannot be resumed
+    without their secrets.
+    """
+
+    def __init__(self, path=None, workers=2, retention=7 * 24 * 3600):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._db = _connect(self.path)
+        self._futures = {}
+        # Create the shared caches up front so workers starting together do not race to set them up
+        from page_cache import get_page_cache
+        from llm_cache import get_response_cache
+        from change_tracker import get_change_tracker
+        get_page_cache(), get_response_cache(), get_change_tracker()
+        # Spawned workers do not inherit the server's threads or open connections
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker)
+        self._recover(retention)
+
+    def _recover(self, retention):
+        """Drop old finished jobs and deal with jobs a previous server left unfinished"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (now - retention,))
+            self._db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE status IN (?, ?)",
+                             (FAILED, "Interrupted by a server restart", now, RUNNING, QUEUED))
+
+    def submit(self, kind, params, secrets=None):
+        """Queue a job and return its ID"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            with self._db:
+                self._db.execute("INSERT INTO jobs (id, kind, params, status, message, created) VALUES (?, ?, ?, ?, ?, ?)",
+                                 (job_id, kind, json.dumps(params), QUEUED, "Waiting for a free worker...",
+                                  time.time()))
+            future = self._executor.submit(_run_job, self.path, job_id, kind, params, secrets)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda done: self._finished(job_id, done))
+        return job_id
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                # The worker could not record the outcome itself (e.g. it crashed)
+                with self._db:
+                    self._db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND status IN (?, ?)",
+                                     (FAILED, str(error) or type(error).__name__, time.time(), job_id, QUEUED, RUNNING))
+
+    def get(self, job_id):
+        """Return the job as a dict (with the decoded `result` once done), or None"""
+        with self._lock:
+            self._db.row_factory = sqlite3.Row
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._db.row_factory = None
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def list(self, limit=50):
+        with self._lock:
+            rows = self._db.execute("SELECT id, kind, status, progress, message, created, finished FROM jobs "
+                                    "ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(zip(("id", "kind", "status", "progress", "message", "created", "finished"), row))
+                for row in rows]
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet; returns True if it was cancelled"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        # Cancelling runs the done callback right away, which takes the lock itself
+        if future is None or not future.cancel():
+            return False
+        with self._lock:
+            with self._db:
+                self._db.execute("UPDATE jobs SET status = ?, message = NULL, finished = ? WHERE id = ?",
+                                 (CANCELLED, time.time(), job_id))
+        return True
+
+    def wait(self, job_id, timeout=None, poll_interval=0.2):
+        """Block until the job has finished and return it"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} is still {job['status']}")
+            time.sleep(poll_interval)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, **counts}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._db.close()
+
+# Job queue shared by every session of the app
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Return the process-wide job queue, creating it on first use.
+
+    SCRAPER_JOB_WORKERS sets how many jobs run at once (default 2).
+    """
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(workers=int(os.environ.get("SCRAPER_JOB_WORKERS", 2)))
+        return _default_queue
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from page_cache import DEFAULT_CACHE_DIR
+
+def response_key(model_name, prompt_template, parse_description, chunk):
+    """Hash of everything that determines a model response"""
+    digest = hashlib.sha256()
+    for part in (model_name, prompt_template, parse_description, chunk):
+        data = part.encode("utf-8")
+        # Length-prefix each part so different splits of the same text never collide
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+class ResponseCache:
+    """Persistent memo of model responses keyed by model, prompt, description and chunk.
+
+    Entries older than `ttl` seconds are ignored and removed; the least
+    recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_entries=100_000):
+        path = path or os.path.join(DEFAULT_CACHE_DIR, "llm.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+
+    def get(self, key):
+        """Return the cached response text, or None"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                with self._db:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.metrics["misses"] += 1
+                return None
+            with self._db:
+                self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.metrics["hits"] += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+            count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._db.execute("DELETE FROM responses WHERE key IN "
+                                 "(SELECT key FROM responses ORDER BY last_access LIMIT ?)", (excess,))
+                self.metrics["evictions"] += excess
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self.metrics)
+            snapshot["entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Shared cache used by the extraction flow when none is passed in
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Return the process-wide response cache, creating it on first use.
+
+    SCRAPER_LLM_CACHE_TTL (seconds) and SCRAPER_LLM_CACHE_MAX_ENTRIES
+    configure it.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(
+                ttl=float(os.environ.get("SCRAPER_LLM_CACHE_TTL", 7 * 24 * 3600)),
+                max_entries=int(os.environ.get("SCRAPER_LLM_CACHE_MAX_ENTRIES", 100_000)),
+            )
+        return _default_cache
@@ -0,0 +1,350 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_cache import response_key
+from records import SCHEMA_INSTRUCTIONS, SchemaError, parse_records, schema_description
+from telemetry import metrics, span
+
+# Prompt sent to Gemini for every chunk
+EXTRACTION_PROMPT = (
+    "You are tasked with extracting specific information from the following text content: {dom_content}. "
+    "Please follow these instructions carefully: \n\n"
+    "1. **Extract Information:** Only extract the information that directly matches the provided description: {parse_description}. "
+    "2. **No Extra Content:** Do not include any additional text, comments, or explanations in your response. "
+    "3. **Empty Response:** If no information matches the description, return an empty string (''). "
+    "4. **Direct Data Only:** Your output should contain only the data that is explicitly requested, with no other text."
+)
+
+# Prompt for several chunks at once; the instructions and description are sent only once
+BATCH_EXTRACTION_PROMPT = (
+    "You are tasked with extracting specific information from each of the {count} numbered text sections below. "
+    "Please follow these instructions carefully: \n\n"
+    "1. **Extract Information:** From each section, only extract the information that directly matches the provided description: {parse_description}. "
+    "2. **No Extra Content:** Do not include any additional text, comments, or explanations in your response. "
+    "3. **Empty Response:** If nothing in a section matches the description, leave its result empty. "
+    "4. **Direct Data Only:** Each result should contain only the data that is explicitly requested, with no other text. "
+    "5. **Output Format:** For every section N, in order, answer with <<<RESULT N>>> on its own line, then the "
+    "extracted data, then <<<END RESULT N>>> on its own line. Never merge sections or skip one.\n\n"
+    "{sections}"
+)
+
+_BATCH_SECTION = "<<<SECTION {number}>>>\n{chunk}\n<<<END SECTION {number}>>>\n"
+_BATCH_RESULT_RE = re.compile(r"<<<RESULT (\d+)>>>\s*(.*?)\s*<<<END RESULT \1>>>", re.S)
+_BATCH_SECTION_RE = re.compile(r"<<<SECTION (\d+)>>>\n(.*?)\n<<<END SECTION \1>>>", re.S)
+# Tokens a section adds besides its chunk (markers and newlines)
+_SECTION_OVERHEAD_TOKENS = 12
+
+# HTTP status codes worth retrying: rate limited or a server-side failure
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+                    "InternalServerError", "DeadlineExceeded", "BadGateway", "GatewayTimeout"}
+
+def build_prompt(chunk, parse_description):
+    return EXTRACTION_PROMPT.format(dom_content=chunk, parse_description=parse_description)
+
+def build_batch_prompt(chunks, parse_description):
+    sections = "".join(_BATCH_SECTION.format(number=number, chunk=chunk) for number, chunk in enumerate(chunks, 1))
+    return BATCH_EXTRACTION_PROMPT.format(count=len(chunks), parse_description=parse_description,
+                                          sections=sections)
+
+def plan_batches(chunk_tokens, budget_tokens, max_chunks=50, overhead_tokens=0):
+    """Group chunk indexes into batches whose prompts fit in `budget_tokens`.
+
+    `chunk_tokens` is a list of (index, token count) in document order.
+    Chunks are packed greedily in order; a chunk too big to share a request
+    gets a batch of its own.
+    """
+    batches = []
+    current, used = [], overhead_tokens
+    for index, tokens in chunk_tokens:
+        tokens += _SECTION_OVERHEAD_TOKENS
+        if current and (used + tokens > budget_tokens or len(current) >= max_chunks):
+            batches.append(current)
+            current, used = [], overhead_tokens
+        current.append(index)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_batch_response(text, count):
+    """Split a batched response into per-section results.
+
+    Returns a dict mapping section position (0-based) to its text for every
+    section that came back well-formed; sections that are missing or
+    repeated are left out so the caller can retry them one by one.
+    """
+    found = {}
+    repeated = set()
+    for match in _BATCH_RESULT_RE.finditer(text or ""):
+        position = int(match.group(1)) - 1
+        if not 0 <= position < count:
+            continue
+        if position in found:
+            repeated.add(position)
+        result = match.group(2).strip()
+        # The single-chunk prompt asks for '' when nothing matches; accept that here too
+        found[position] = "" if result in ("''", '""') else result
+    for position in repeated:
+        del found[position]
+    return found
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+def is_retryable(error):
+    """True for rate-limit (429) and 5xx errors from the Gemini client"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return "429" in str(error)
+
+def response_text(response):
+    """Text of a Gemini response, or "" when the response has no text (e.g. it was blocked)"""
+    try:
+        return response.text or ""
+    except ValueError:
+        return ""
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available and take them"""
+        # Requests larger than the bucket would never fit, so cap them at its size
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+class ExtractionDispatcher:
+    """Send chunk prompts to a Gemini model concurrently under rate limits.
+
+    Up to `concurrency` requests are in flight at once. Every request takes
+    one token from the requests-per-minute bucket and its estimated prompt
+    size from the tokens-per-minute bucket. 429 and 5xx errors are retried
+    with exponential backoff and jitter. Results come back in chunk order.
+    With a response cache, chunks seen before are answered from it.
+
+    With `batch_tokens`, chunks are packed into requests of up to that many
+    prompt tokens (and at most `max_batch_chunks` chunks), sharing one copy
+    of the instructions and asking for one delimited result per chunk.
+    Chunks whose result is missing or malformed in the batched response are
+    sent again on their own; if such a retry fails, only that chunk counts
+    as an error.
+
+    With a `prefilter` (a `relevance.RelevanceFilter`), chunks are scored
+    against the description locally first and only the likely matches are
+    sent; the rest get an empty result without an API call.
+    """
+
+    def __init__(self, model, concurrency=4, requests_per_minute=60, tokens_per_minute=1_000_000,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, cache=None, batch_tokens=0,
+                 max_batch_chunks=50, prefilter=None):
+        self.model = model
+        self.model_name = getattr(model, "model_name", type(model).__name__)
+        # Optional llm_cache.ResponseCache; unchanged chunks are answered without an API call
+        self.cache = cache
+        self.concurrency = concurrency
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_tokens = batch_tokens
+        self.max_batch_chunks = max_batch_chunks
+        self.prefilter = prefilter
+        self.metrics = {"requests": 0, "retries": 0, "failures": 0, "batches": 0, "batch_fallbacks": 0,
+                        "chunks_skipped": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    def generate(self, prompt):
+        """Call the model once, waiting for rate-limit budget and retrying transient errors"""
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(estimate_tokens(prompt))
+            self._count("requests")
+            try:
+                with span("llm_call", attempt=attempt):
+                    return response_text(self.model.generate_content(prompt))
+            except Exception as e:
+                metrics.inc("llm_errors", retryable=is_retryable(e))
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count("failures")
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                attempt += 1
+                self._count("retries")
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def generate_batch(self, chunks, parse_description):
+        """Extract from several chunks with one request; returns one result per chunk.
+
+        Chunks missing from the batched answer are retried one at a time; a
+        chunk whose retry fails gets the exception in place of its result, so
+        the other chunks of the batch still count.
+        """
+        if len(chunks) == 1:
+            return [self.generate(build_prompt(chunks[0], parse_description))]
+        self._count("batches")
+        metrics.inc("llm_batches")
+        found = parse_batch_response(self.generate(build_batch_prompt(chunks, parse_description)), len(chunks))
+        missing = [position for position in range(len(chunks)) if position not in found]
+        if missing:
+            self._count("batch_fallbacks", len(missing))
+            metrics.inc("llm_batch_fallbacks", len(missing))
+            for position in missing:
+                try:
+                    found[position] = self.generate(build_prompt(chunks[position], parse_description))
+                except Exception as e:
+                    found[position] = e
+        return [found[position] for position in range(len(chunks))]
+
+    def extract(self, chunks, parse_description, progress=None, schema=None):
+        """Extract from every chunk; returns `(results, errors)` in chunk order.
+
+        `results[i]` is the text for chunk i ("" if it failed or was skipped by
+        the prefilter) and `errors` maps failed chunk indexes to their
+        exception. With a `schema` (see `records.load_schema`), the model is
+        asked for JSON records and `results[i]` is the list of records
+        validated into the schema's types; a response that is not JSON counts
+        as an error and is not cached. `chunks` may be any iterable, but it is
+        read into a list first, since the prefilter, the cache lookups and
+        batch planning all need every chunk. `progress(done, total)` is called
+        on the calling thread as chunks finish, so it may touch UI elements
+        that are not thread-safe.
+        """
+        chunks = list(chunks)
+        empty = [] if schema is not None else ""
+        results = [empty] * len(chunks)
+        errors = {}
+        keys = {}
+        pending = []
+        done = 0
+        if self.prefilter is not None and len(chunks) > 1:
+            selected = self.prefilter.select(chunks, parse_description, schema)
+            self._count("chunks_skipped", len(chunks) - len(selected))
+            done = len(chunks) - len(selected)
+        else:
+            selected = range(len(chunks))
+        if schema is not None:
+            parse_description = schema_description(parse_description, schema)
+        template = BATCH_EXTRACTION_PROMPT if self.batch_tokens else EXTRACTION_PROMPT
+        for i in selected:
+            if self.cache is not None:
+                keys[i] = response_key(self.model_name, template, parse_description, chunks[i])
+                cached = self.cache.get(keys[i])
+                if cached is not None:
+                    try:
+                        results[i] = cached if schema is None else parse_records(cached, schema)
+                    except SchemaError:
+                        pending.append(i)
+                        continue
+                    done += 1
+                    continue
+            pending.append(i)
+        if progress and done:
+            progress(done, len(chunks))
+        if self.batch_tokens:
+            overhead = estimate_tokens(BATCH_EXTRACTION_PROMPT) + estimate_tokens(parse_description)
+            batches = plan_batches([(i, estimate_tokens(chunks[i])) for i in pending], self.batch_tokens,
+                                   self.max_batch_chunks, overhead)
+        else:
+            batches = [[i] for i in pending]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self.generate_batch, [chunks[i] for i in batch], parse_description): batch
+                       for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    answers = future.result()
+                except Exception as e:
+                    for index in batch:
+                        errors[index] = e
+                    answers = []
+                for index, result in zip(batch, answers):
+                    if isinstance(result, Exception):
+                        errors[index] = result
+                        continue
+                    try:
+                        results[index] = result if schema is None else parse_records(result, schema)
+                    except SchemaError as e:
+                        errors[index] = e
+                        continue
+                    if self.cache is not None:
+                        self.cache.put(keys[index], result)
+                done += len(batch)
+                if progress:
+                    progress(done, len(chunks))
+        return results, errors
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+class StubRateLimitError(Exception):
+    code = 429
+
+class StubModel:
+    """Offline stand-in for `genai.GenerativeModel` for tests and benchmarks.
+
+    Each call sleeps `latency` seconds and returns `respond(prompt)` (by default
+    the first line of the chunk, or of each chunk in a batched prompt; an
+    empty JSON array when records of a schema are asked for). The first `fail_first` calls raise a 429-style
+    error so retry handling can be exercised.
+    """
+
+    def __init__(self, latency=0.0, respond=None, fail_first=0):
+        self.latency = latency
+        self.respond = respond or self._first_line
+        self.fail_first = fail_first
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _first_line(prompt):
+        records = SCHEMA_INSTRUCTIONS.split(":", 1)[0] in prompt
+        sections = _BATCH_SECTION_RE.findall(prompt)
+        if sections:
+            # Batched prompt: answer every section in the requested delimited format
+            return "\n".join(f"<<<RESULT {number}>>>\n{'[]' if records else chunk.split(chr(10), 1)[0]}\n"
+                             f"<<<END RESULT {number}>>>" for number, chunk in sections)
+        if records:
+            return "[]"
+        content = prompt.split("text content: ", 1)[-1]
+        content = content.rsplit(". Please follow these instructions carefully:", 1)[0]
+        return content.split("\n", 1)[0]
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if call <= self.fail_first:
+            raise StubRateLimitError("429 Resource has been exhausted")
+        return StubResponse(self.respond(prompt))
@@ -1,253 +1,391 @@
+import copy
 import os
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
-from webdriver_manager.chrome import ChromeDriverManager
+import sys
 import time
-import re
-from urllib.parse import urlparse, parse_qs, urlencode, urlunparse, urljoin
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from driver_pool import get_driver_pool
+from crawler import DEFAULT_HOST_DELAY, host_limiter, iter_crawl, normalize_url
+from readiness import wait_until_ready
+from browser_profile import prepare_navigation
+from auth_session import get_auth_session
+from http_fetch import get_fetcher
+from document import parse_html, soup_to_text
+from parse_pool import process_page
+from pagination import get_pagination_engine
+from page_cache import get_page_cache
+from chunker import iter_chunks
+from change_tracker import describe_changes, get_change_tracker, iter_stable_chunks
+from dedup import PageDeduplicator
+from sinks import PageFileSink
+from telemetry import configure_logging, logger, metrics, profile_run, span
 
 def get_user_input():
-    website_url = input("Enter the website URL to scrape: ")
+    website_url = input("Enter the website URL to scrape (separate several URLs with spaces): ")
     num_pages = int(input("Enter the number of pages to scrape: "))
     return website_url, num_pages
 
-def detect_pagination_pattern(url):
-    """Detect the pagination pattern from the URL"""
-    parsed = urlparse(url)
-    query_params = parse_qs(parsed.query)
-    
-    # Common pagination parameter names
-    pagination_params = ['page', 'p', 'pg', 'pageno', 'pagenumber', 'page_number']
-    
-    # Check if URL already has a pagination parameter
-    for param in pagination_params:
-        if param in query_params:
-            return param
-    
-    # If no pagination parameter found, return default
-    return 'page'
-
-def construct_pagination_url(url, page_num, pagination_param):
-    """Construct URL with proper pagination"""
-    parsed = urlparse(url)
-    query_params = parse_qs(parsed.query)
-    
-    # Remove existing pagination parameter if it exists
-    for param in ['page', 'p', 'pg', 'pageno', 'pagenumber', 'page_number']:
-        if param in query_params:
-            del query_params[param]
-    
-    # Add new pagination parameter
-    query_params[pagination_param] = [str(page_num)]
-    
-    # Reconstruct URL
-    new_query = urlencode(query_params, doseq=True)
-    return urlunparse((
-        parsed.scheme,
-        parsed.netloc,
-        parsed.path,
-        parsed.params,
-        new_query,
-        parsed.fragment
-    ))
-
-def find_next_page_link(driver, soup):
-    """Find the next page link in the current page"""
-    print("\nSearching for next page link...")
-    
-    # Common patterns for next page links
-    next_link_patterns = [
-        "//a[contains(@class, 'next')]",
-        "//a[contains(@class, 'pagination-next')]",
-        "//a[contains(@rel, 'next')]",
-        "//a[contains(text(), 'Next')]",
-        "//a[contains(text(), 'Next Page')]",
-        "//a[contains(@aria-label, 'Next')]",
-        "//a[contains(@title, 'Next')]",
-        "//a[contains(@class, 'pagination') and contains(text(), '»')]",
-        "//a[contains(@class, 'pagination') and contains(text(), '>')]",
-        "//a[contains(@class, 'pagination')]//following-sibling::a",
-        "//a[contains(@class, 'pagination')]//following::a[1]"
-    ]
-    
-    # Try to find next link using Selenium
-    for pattern in next_link_patterns:
-        try:
-            print(f"Trying XPath pattern: {pattern}")
-            next_element = driver.find_element(By.XPATH, pattern)
-            if next_element and next_element.is_displayed():
-                href = next_element.get_attribute('href')
-                print(f"Found next link with pattern {pattern}: {href}")
-                return href
-        except Exception as e:
-            print(f"Pattern {pattern} not found: {str(e)}")
-            continue
-    
-    # If Selenium fails, try BeautifulSoup
-    print("\nTrying BeautifulSoup selectors...")
-    
-    # Try different BeautifulSoup selectors
-    selectors = [
-        ('a', {'class_': lambda x: x and ('next' in x.lower() or 'pagination-next' in x.lower())}),
-        ('a', {'rel': 'next'}),
-        ('a', {'string': lambda x: x and 'Next' in x}),
-        ('a', {'class_': 'pagination-next'}),
-        ('a', {'class_': 'next'}),
-        ('a', {'aria-label': lambda x: x and 'Next' in x}),
-        ('a', {'title': lambda x: x and 'Next' in x})
-    ]
-    
-    for tag, attrs in selectors:
-        try:
-            print(f"Trying selector: {tag} with {attrs}")
-            next_link = soup.find(tag, attrs)
-            if next_link and next_link.get('href'):
-                href = next_link['href']
-                print(f"Found next link with selector {tag}: {href}")
-                return href
-        except Exception as e:
-            print(f"Selector {tag} not found: {str(e)}")
-            continue
-    
-    print("No next page link found")
-    return None
-
-def get_page_content(driver, url):
-    """Get page content with proper waiting and verification"""
+def get_page_content(driver, url, readiness=None, timeout=20):
+    """Get page content, returning as soon as the readiness strategy says the page has settled"""
     try:
-        print(f"\nNavigating to URL: {url}")
-        driver.get(url)
-        
-        # Wait for body to be present
-        print("Waiting for body element...")
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        logger.debug("Navigating to URL: %s", url)
+        started = time.monotonic()
+        prepare_navigation(driver, url)
+        with span("navigation"):
+            driver.get(url)
         
-        # Wait for page to be fully loaded
-        print("Waiting for page to be fully loaded...")
-        WebDriverWait(driver, 20).until(
-            lambda driver: driver.execute_script("return document.readyState") == "complete"
-        )
-        
-        # Additional wait for dynamic content
-        print("Waiting for dynamic content...")
-        time.sleep(5)
+        # Wait until the page is settled (or the timeout is reached)
+        time_to_ready = wait_until_ready(driver, readiness, timeout=timeout, url=url, started=started)
+        logger.debug("Page ready after %.2fs", time_to_ready)
         
         # Get current URL to verify we're on the correct page
         current_url = driver.current_url
-        print(f"Current URL after navigation: {current_url}")
-        
-        # Additional wait for any JavaScript content to load
-        print("Waiting for JavaScript content...")
-        time.sleep(2)
+        logger.debug("Current URL after navigation: %s", current_url)
         
         # Get page source
-        html_content = driver.page_source
-        print(f"Page content length: {len(html_content)} characters")
+        with span("page_source"):
+            html_content = driver.page_source
+        logger.debug("Page content length: %d characters", len(html_content))
         
         # Basic content verification
         if len(html_content) < 100:
-            print(f"Warning: Page content seems too short ({len(html_content)} characters)")
+            logger.warning("Page content seems too short (%d characters)", len(html_content))
             return None
             
         return html_content
     except Exception as e:
-        print(f"Error getting page content: {str(e)}")
+        logger.error("Error getting page content: %s", e)
         return None
 
-def scrape_multiple_pages(website_url, num_pages):
-    """Scrape multiple pages by following 'Next' links"""
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service)
-    all_pages_content = []
+def iter_pages(website_url, num_pages, pool=None, readiness=None, fetcher=None,
+               cache=None, refresh=False, incremental=False, tracker=None, prefetch=0, session=None,
+               dedup=False, deduplicator=None, commit_changes=True):
+    """Scrape multiple pages by following 'Next' links, yielding each page as soon as it is cleaned.
+
+    Each result is a dict with `page_number`, `url`, `content` (the cleaned
+    text), `tier` and `next_url` (the page's next link, or None). Only the
+    current page is held in memory, so crawls of any length run in flat
+    memory. In incremental mode each page's text is split into
+    content-defined chunks, `content` holds only the chunks that are new or
+    changed since the last scrape of that URL (an empty string if nothing
+    changed), `changes` holds the diff summary and `pending_changes` the
+    chunk fingerprints. The fingerprints become the baseline for the next
+    run once the consumer has finished with the page and asks for the next
+    one; with `commit_changes=False` the caller passes them to
+    `tracker.commit()` itself, after its own downstream work succeeds.
+
+    With `dedup`, lines the site repeats on every page (navigation, headers,
+    footers) are stripped from `content` (`boilerplate_lines` counts them),
+    and a page that is a near-duplicate of an earlier page of the crawl gets
+    an empty `content` and its URL under `duplicate_of`.
+
+    With `prefetch`, once the site is known to paginate through a query
+    parameter, up to that many predicted upcoming pages are fetched in
+    parallel while the current one is being consumed.
+
+    With an `AuthSession`, pages are fetched logged in: its cookies go with
+    HTTP requests, browsers get its cookies and local storage, and if the
+    login form shows up again the session logs in once more and the page is
+    retried.
+    """
+    pool = pool or get_driver_pool()
+    fetcher = fetcher or get_fetcher()
+    cache = cache or get_page_cache()
+    if incremental:
+        tracker = tracker or get_change_tracker()
+    if dedup:
+        deduplicator = deduplicator or PageDeduplicator()
+    previous_content = None
+    # A browser is only borrowed once a page actually needs JavaScript rendering
+    browser = {"pooled": None, "pages": 0}
     current_url = website_url
     pages_scraped = 0
+    engine = get_pagination_engine()
+    # normalized URL -> future of a prefetched page
+    prefetched = {}
+    executor = ThreadPoolExecutor(max_workers=prefetch) if prefetch else None
+    
+    def browser_fetch(url):
+        if browser["pooled"] is None:
+            browser["pooled"] = pool.acquire()
+        browser["pages"] += 1
+        if session is not None:
+            session.inject(browser["pooled"].driver)
+        return get_page_content(browser["pooled"].driver, url, readiness)
+    
+    def held_driver():
+        return browser["pooled"].driver if browser["pooled"] is not None else None
+    
+    def load(url, browser_fetch, held_driver=None):
+        if session is not None:
+            return load_authenticated_page(url, session, browser_fetch, fetcher, polite=True,
+                                           held_driver=held_driver)
+        return load_page(url, browser_fetch, fetcher, cache, refresh, polite=True)
     
     try:
-        print(f"\nStarting multi-page scraping for URL: {website_url}")
-        print(f"Number of pages to scrape: {num_pages}")
+        logger.info("Starting multi-page scraping for URL: %s", website_url)
+        logger.info("Number of pages to scrape: %d", num_pages)
         
         while pages_scraped < num_pages:
-            print(f"\nProcessing page {pages_scraped + 1} of {num_pages}")
-            print(f"Current URL: {current_url}")
+            logger.debug("Processing page %d of %d", pages_scraped + 1, num_pages)
+            logger.debug("Current URL: %s", current_url)
             
-            # Get page content
-            html_content = get_page_content(driver, current_url)
-            if not html_content:
-                print("Failed to get page content")
+            # Load the page from the cache, or over HTTP escalating to the browser if needed
+            try:
+                future = prefetched.pop(normalize_url(current_url), None)
+                if future is not None:
+                    page = future.result()
+                else:
+                    page = load(current_url, browser_fetch, held_driver)
+            except Exception as e:
+                logger.error("Error during scraping: %s", e)
                 break
-                
-            # Parse the content
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Process the content
-            body_content = extract_body_content(html_content)
-            cleaned_content = clean_body_content(body_content)
+            if not page:
+                logger.error("Failed to get page content")
+                break
+            tier = page["tier"]
+            logger.debug("Page served by the %s tier", tier)
+            cleaned_content = page["text"]
             
             # Verify content is different from previous page
-            if len(all_pages_content) > 0 and cleaned_content == all_pages_content[-1]:
-                print("Warning: Page content is identical to previous page")
+            if cleaned_content == previous_content:
+                logger.warning("Page content is identical to previous page")
                 break
+            previous_content = cleaned_content
+            
+            result = {"page_number": pages_scraped + 1, "url": current_url, "content": cleaned_content, "tier": tier}
+            if dedup:
+                # Strip site-wide boilerplate and skip pages that repeat an earlier one
+                with span("dedup"):
+                    content, duplicate_of, removed = deduplicator.process(current_url, cleaned_content)
+                result["content"] = content
+                result["boilerplate_lines"] = removed
+                if duplicate_of:
+                    result["duplicate_of"] = duplicate_of
+                    metrics.inc("duplicate_pages")
+                    logger.info("%s is a near-duplicate of %s", current_url, duplicate_of)
+            if incremental:
+                # Keep only the chunks that are new or changed since the last run
+                with span("chunk"):
+                    chunks = list(iter_stable_chunks(result["content"]))
+                with span("diff"):
+                    changes = tracker.diff(current_url, chunks)
+                logger.info("Changes on %s: %s", current_url, describe_changes(changes))
+                result["content"] = "\n".join(changes["emitted"])
+                result["changes"] = {
+                    "new": len(changes["new"]),
+                    "changed": len(changes["changed"]),
+                    "unchanged": changes["unchanged"],
+                    "removed": changes["removed"],
+                }
+                result["pending_changes"] = changes["pending"]
                 
-            # Add the cleaned content to our list
-            all_pages_content.append(cleaned_content)
             pages_scraped += 1
-            print(f"Successfully scraped page {pages_scraped}")
+            metrics.inc("pages", tier=tier)
+            logger.info("Scraped page %d: %s (%s tier)", pages_scraped, current_url, tier)
+            next_link = page["next_link"]
+            result["next_url"] = urljoin(current_url, next_link) if next_link else None
+            # Drop the raw HTML before handing the page to the consumer
+            del page
+            yield result
+            if incremental and commit_changes:
+                # The consumer came back for more, so it is done with this page's changes
+                tracker.commit(current_url, changes["pending"])
             
             # Find next page link
             if pages_scraped < num_pages:
-                next_url = find_next_page_link(driver, soup)
+                next_url = next_link
                 if not next_url:
-                    print("No next page link found")
+                    logger.info("No next page link found")
                     break
                     
                 # Make sure the next URL is absolute
                 next_url = urljoin(current_url, next_url)
-                print(f"Found next page URL: {next_url}")
+                logger.debug("Found next page URL: %s", next_url)
+                
+                if executor is not None:
+                    # Fetch the predicted upcoming pages in parallel once the prediction matches the real link
+                    predicted = engine.predict_urls(current_url, min(prefetch, num_pages - pages_scraped))
+                    if predicted and normalize_url(predicted[0]) == normalize_url(next_url):
+                        for url in predicted:
+                            key = normalize_url(url)
+                            if key not in prefetched:
+                                prefetched[key] = executor.submit(
+                                    load, url, _browser_fetcher(pool, copy.deepcopy(readiness), session))
                 
                 # Update current URL
                 current_url = next_url
-                
-                # Add delay between page requests
-                print("Waiting before next page request...")
-                time.sleep(3)
             else:
-                print("Reached desired number of pages")
+                logger.debug("Reached desired number of pages")
                 break
             
-    except Exception as e:
-        print(f"Error during scraping: {str(e)}")
     finally:
-        driver.quit()
-    
-    print(f"\nScraping complete. Retrieved {len(all_pages_content)} unique pages.")
-    return all_pages_content
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        # Hand the browser back to the pool; it is recycled once it has served enough pages
+        if browser["pooled"] is not None:
+            pool.release(browser["pooled"], pages=browser["pages"])
+        logger.info("Scraping complete. Retrieved %d unique pages.", pages_scraped)
+
+def scrape_multiple_pages(website_url, num_pages, **options):
+    """Scrape multiple pages by following 'Next' links and return the cleaned text of each.
+
+    Accepts the same options as `iter_pages`; use that directly to process
+    pages as they arrive instead of waiting for the whole crawl. Incremental
+    scrapes are refused: only the text comes back, so the changes could not
+    be committed after they have been processed.
+    """
+    if options.get("incremental"):
+        raise ValueError("scrape_multiple_pages does not support incremental=True; use iter_pages and commit "
+                         "each page's pending_changes once it has been processed")
+    return [page["content"] for page in iter_pages(website_url, num_pages, **options)]
+
+def load_page(url, browser_fetch, fetcher, cache, refresh=False, polite=False, headers=None):
+    """Return a processed page dict, served from the page cache when possible.
+
+    A cache hit skips fetching, parsing and cleaning entirely. On a miss the
+    page goes through the tiered fetcher, is processed once and stored. The
+    dict has `url`, `html`, `text`, `next_link`, `login_required` and `tier`
+    ("cache", "http" or "browser"); None is returned if nothing was fetched.
+    Pages fetched with request `headers` (such as session cookies) are
+    private to that session, so they bypass the cache, which is keyed by URL.
+    When revalidating a stale entry brings back the changed page, that
+    response is used rather than fetched a second time.
+    """
+    use_cache = headers is None
+    revalidated = None
+    if use_cache and not refresh:
+        entry, revalidated = cache.lookup(url, fetcher)
+        if entry is not None:
+            return dict(entry, url=url, tier="cache")
+    if polite and revalidated is None:
+        # Respect the per-domain delay before each request
+        host_limiter.wait(url)
+    response = fetcher.fetch_response(url, browser_fetch, headers, http_response=revalidated)
+    html_content = response["html"]
+    if not html_content:
+        return None
+    # Parse the page once and derive the text and next link from that tree; large pages are
+    # parsed in a worker process so other fetches carry on meanwhile
+    page = process_page(html_content, url)
+    if use_cache:
+        cache.put(url, html_content, page["text"], next_link=page["next_link"],
+                  login_required=page["login_required"], headers=response["headers"], tier=response["tier"])
+    return {
+        "url": url,
+        "html": html_content,
+        "text": page["text"],
+        "next_link": page["next_link"],
+        "login_required": page["login_required"],
+        "tier": response["tier"],
+    }
+
+def load_authenticated_page(url, session, browser_fetch, fetcher, polite=False, held_driver=None):
+    """Load a page logged in with `session`, logging in again once if the login form shows up.
+
+    `held_driver` returns the browser the caller already holds (or None); any
+    login happens on it, since with a small pool there may be no other.
+    """
+    held_driver = held_driver or (lambda: None)
+    session.ensure(held_driver())
+    for attempt in range(2):
+        version = session.version
+        page = load_page(url, browser_fetch, fetcher, None, polite=polite, headers=session.http_headers(url))
+        if not page or not page["login_required"]:
+            return page
+        if attempt == 0:
+            logger.info("Session for %s has expired; logging in again", session.name)
+            metrics.inc("session_expiries")
+            session.relogin(version, held_driver())
+    raise RuntimeError(f"Still asked to log in at {url} after logging in again")
+
+def _browser_fetcher(pool, readiness, session=None):
+    def browser_fetch(url):
+        # Borrow a browser from the driver pool instead of launching a new one
+        with pool.driver() as driver:
+            if session is not None:
+                session.inject(driver)
+            # Open the website URL
+            started = time.monotonic()
+            prepare_navigation(driver, url)
+            with span("navigation"):
+                driver.get(url)
+            # Wait until the page has settled, with a 10 second ceiling
+            wait_until_ready(driver, readiness, timeout=10, url=url, started=started)
+            # Get the page source (HTML content)
+            with span("page_source"):
+                return driver.page_source
+    return browser_fetch
+
+def scrape_page(website_url, pool=None, readiness=None, fetcher=None, cache=None, refresh=False):
+    """Fetch and clean a single page, using the page cache; returns the page dict from `load_page`"""
+    pool = pool or get_driver_pool()
+    fetcher = fetcher or get_fetcher()
+    cache = cache or get_page_cache()
+    page = load_page(website_url, _browser_fetcher(pool, readiness), fetcher, cache, refresh)
+    if page:
+        metrics.inc("pages", tier=page["tier"])
+        logger.info("%s served by the %s tier", website_url, page["tier"])
+    return page
+
+def fetch_page(website_url, pool=None, readiness=None, fetcher=None):
+    """Fetch a page through the tiered fetcher; returns (html_content, tier)"""
+    pool = pool or get_driver_pool()
+    fetcher = fetcher or get_fetcher()
+    html_content, tier = fetcher.fetch(website_url, _browser_fetcher(pool, readiness))
+    logger.info("%s served by the %s tier", website_url, tier)
+    return html_content, tier
 
 # Function to scrape the raw HTML content of a website
-def scrape_website(website_url):
-    # Use ChromeDriverManager to automatically handle driver installation
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service)
-    try:
-        # Open the website URL
-        driver.get(website_url)
-        # Wait until the page body is fully loaded
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        # Additional wait time to allow the website to load completely
-        time.sleep(2)
-        # Get the page source (HTML content)
-        html_content = driver.page_source
-        return html_content
-    finally:
-        # Ensure the browser is closed after scraping
-        driver.quit()
+def scrape_website(website_url, pool=None, readiness=None, fetcher=None):
+    html_content, _ = fetch_page(website_url, pool, readiness, fetcher)
+    return html_content
+
+def crawl_websites(urls, workers=4, per_host_concurrency=1, per_host_delay=DEFAULT_HOST_DELAY,
+                   pool=None, max_pages=None, readiness=None, fetcher=None, cache=None, refresh=False,
+                   dedup=False, deduplicator=None):
+    """Scrape many URLs in parallel and yield one result dict per page as it completes.
+
+    Pages go through the tiered fetcher; when one needs the browser, the
+    worker borrows it from `pool` (the process-wide pool by default), so
+    the crawl never runs more browsers than the pool allows and workers
+    beyond that wait for one. Results carry the cleaned page text under
+    `content`. With `dedup`, boilerplate is stripped and near-duplicate
+    pages are emptied as in `iter_pages`.
+    """
+    pool = pool or get_driver_pool()
+    fetcher = fetcher or get_fetcher()
+    cache = cache or get_page_cache()
+
+    def browser_fetch(url):
+        with pool.driver() as driver:
+            # Readiness strategies keep per-page state, so each worker needs its own copy
+            return get_page_content(driver, url, copy.deepcopy(readiness))
+
+    def fetch(url):
+        page = load_page(url, browser_fetch, fetcher, cache, refresh)
+        if not page:
+            raise RuntimeError("Failed to get page content")
+        metrics.inc("pages", tier=page["tier"])
+        logger.info("%s served by the %s tier", url, page["tier"])
+        return page["text"]
+
+    if dedup:
+        deduplicator = deduplicator or PageDeduplicator()
+    for result in iter_crawl(urls, fetch, workers=workers, per_host_concurrency=per_host_concurrency,
+                             per_host_delay=per_host_delay, max_pages=max_pages):
+        if dedup and result["content"]:
+            with span("dedup"):
+                content, duplicate_of, removed = deduplicator.process(result["url"], result["content"])
+            result.update(content=content, boilerplate_lines=removed)
+            if duplicate_of:
+                result["duplicate_of"] = duplicate_of
+                metrics.inc("duplicate_pages")
+        yield result
 
 # Function to extract the body content from the HTML
 def extract_body_content(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
+    soup = parse_html(html_content)
     # Extract the <body> tag content
     body_content = soup.body
     if body_content:
@@ -256,92 +394,82 @@ def extract_body_content(html_content):
 
 # Function to clean the body content by removing scripts, styles, and extra whitespace
 def clean_body_content(body_content):
-    soup = BeautifulSoup(body_content, "html.parser")
-    # Remove all <script> and <style> tags
-    for script_or_style in soup(["script", "style"]):
-        script_or_style.extract()
-    # Extract and clean the text content
-    cleaned_content = soup.get_text(separator="\n")
-    # Remove empty lines and strip extra spaces
-    cleaned_content = "\n".join(line.strip() for line in cleaned_content.splitlines() if line.strip())
-    return cleaned_content
+    # Remove <script> and <style> tags, extract the text and drop empty lines
+    with span("clean"):
+        return soup_to_text(parse_html(body_content))
 
 # Function to split large DOM content into smaller chunks
 def split_dom_content(dom_content, max_length=5000):
-    # Split the content into chunks of specified maximum length
-    return [dom_content[i : i + max_length] for i in range(0, len(dom_content), max_length)]
+    # Pack whole lines into chunks of at most max_length characters (counting the newline
+    # that joins them), splitting only lines that are themselves too long
+    with span("chunk"):
+        return list(iter_chunks(dom_content, max_tokens=max_length, count_tokens=lambda text: len(text) + 1))
 
 # Function to detect if a login form is present on the page
 def detect_login_required(html_content):
-    soup = BeautifulSoup(html_content, "html.parser")
+    soup = parse_html(html_content)
     # Check for the presence of an <input> tag with type="password"
     return bool(soup.find("input", {"type": "password"}))
 
 # Function to log in to a website and scrape content after authentication
-def login_and_scrape(website_url, username, password):
-    # Use ChromeDriverManager to automatically handle driver installation
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service)
-    try:
-        # Open the website URL
-        driver.get(website_url)
-        # Wait until the login form (password field) is present
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//input[@type='password']")))
-        
-        # Locate the username field (try multiple selectors for flexibility)
-        try:
-            user_field = driver.find_element(By.XPATH, "//input[@name='username'] | //input[@id='username']")
-        except Exception:
-            # Fallback to a generic text input field
-            user_field = driver.find_element(By.XPATH, "//input[@type='text']")
-        
-        # Locate the password field
-        password_field = driver.find_element(By.XPATH, "//input[@type='password']")
-        
-        # Enter the username and password
-        user_field.send_keys(username)
-        password_field.send_keys(password)
-        
-        # Locate and click the submit button (try multiple selectors for flexibility)
-        submit_btn = driver.find_element(By.XPATH, "//button[@type='submit'] | //input[@type='submit']")
-        submit_btn.click()
-        
-        # Wait until the login form disappears (indicating successful login)
-        WebDriverWait(driver, 10).until_not(EC.presence_of_element_located((By.XPATH, "//input[@type='password']")))
-        time.sleep(5)  # Additional delay after login for page content to load
-        # Wait until the page body is fully loaded after login
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        
-        # Get the page source (HTML content) after login
-        html_content = driver.page_source
-        return html_content
-    finally:
-        # Ensure the browser is closed after scraping
-        driver.quit()
+def login_and_scrape(website_url, username, password, pool=None, readiness=None):
+    """Return the HTML of a page behind a login.
+
+    The login happens once per site and username; later calls (and
+    multi-page scrapes given the same session) reuse the saved session and
+    only log in again once it has expired.
+    """
+    session = get_auth_session(website_url, username, password, pool, readiness)
+    page = load_authenticated_page(website_url, session, _browser_fetcher(session.pool, readiness, session),
+                                   get_fetcher())
+    return page["html"] if page else None
 
 def main():
+    if len(sys.argv) > 1:
+        # Any arguments select the headless batch mode (see batch.py)
+        from batch import main as batch_main
+        batch_main()
+        return
+    configure_logging()
     website_url, num_pages = get_user_input()
+    urls = website_url.replace(",", " ").split()
     
-    if num_pages > 1:
-        # Scrape multiple pages
-        all_pages_content = scrape_multiple_pages(website_url, num_pages)
-        
-        # Save the content to separate files
-        for i, content in enumerate(all_pages_content, 1):
-            filename = f"scraped_page_{i}.txt"
+    # SCRAPER_PROFILE=cprofile|pyinstrument profiles the run; SCRAPER_PROFILE_OUTPUT saves the report
+    with profile_run(output=os.environ.get("SCRAPER_PROFILE_OUTPUT")):
+        run_scrape(urls, website_url, num_pages)
+    
+    # SCRAPER_METRICS_FILE saves stage timings and counters (.json, or Prometheus text otherwise)
+    metrics_file = os.environ.get("SCRAPER_METRICS_FILE")
+    if metrics_file:
+        metrics.export(metrics_file)
+        logger.info("Metrics saved to %s", metrics_file)
+
+def run_scrape(urls, website_url, num_pages):
+    if len(urls) > 1:
+        # Crawl several URLs in parallel
+        for i, result in enumerate(crawl_websites(urls), 1):
+            if result["error"]:
+                logger.error("Failed to scrape %s: %s", result["url"], result["error"])
+                continue
+            filename = f"scraped_url_{i}.txt"
             with open(filename, "w", encoding="utf-8") as f:
-                f.write(content)
-            print(f"Content from page {i} saved to {filename}")
+                f.write(result["content"])
+            logger.info("Content from %s saved to %s", result["url"], filename)
+    elif num_pages > 1:
+        # Scrape multiple pages, saving each one to its own file as soon as it arrives
+        with PageFileSink("scraped_page_{page_number}.txt") as sink:
+            for page in iter_pages(website_url, num_pages):
+                filename = sink.write(page)
+                logger.info("Content from page %d saved to %s", page["page_number"], filename)
     else:
         # Scrape single page
-        html_content = scrape_website(website_url)
-        body_content = extract_body_content(html_content)
-        cleaned_content = clean_body_content(body_content)
+        page = scrape_page(website_url)
+        cleaned_content = page["text"] if page else ""
         
         # Save the content to a file
         with open("scraped_content.txt", "w", encoding="utf-8") as f:
             f.write(cleaned_content)
-        print("Content saved to scraped_content.txt")
+        logger.info("Content saved to scraped_content.txt")
 
 if __name__ == "__main__":
     main()
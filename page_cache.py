@@ -0,0 +1,454 @@
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from crawler import normalize_url
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process locking, so only one process should use an mmap cache there
+    fcntl = None
+
+# Where the page cache lives unless a path is given
+DEFAULT_CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR", ".scraper_cache")
+
+def url_key(url):
+    """Cache key for a URL: the SHA-256 of its normalized form"""
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+def _encode(record):
+    return zlib.compress(json.dumps(record).encode("utf-8"))
+
+def _decode(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+class SqliteStore:
+    """Page store backed by a single SQLite file.
+
+    Page bodies are stored once per content hash, so several URLs serving
+    the same HTML share a blob. The total size of the blobs is kept in the
+    database, updated in the same transaction as the blobs, so processes
+    sharing the file agree on it.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                meta TEXT NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash);
+            CREATE TABLE IF NOT EXISTS totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                size INTEGER NOT NULL
+            );
+        """)
+        # Kept up to date by put and delete so eviction does not sum every blob after each removal
+        with self._db:
+            self._db.execute("INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(size), 0) FROM blobs")
+
+    def get(self, key):
+        row = self._db.execute(
+            "SELECT p.meta, b.data FROM pages p JOIN blobs b USING (content_hash) WHERE p.key = ?",
+            (key,)).fetchone()
+        if row is None:
+            return None
+        entry = json.loads(row[0])
+        entry.update(_decode(row[1]))
+        return entry
+
+    def _content_hash(self, key):
+        row = self._db.execute("SELECT content_hash FROM pages WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, meta, body, now):
+        data = _encode(body)
+        content_hash = hashlib.sha256(data).hexdigest()
+        with self._db:
+            # Writing first takes the write lock, so the old hash read next cannot change under us
+            added = self._db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                                     (content_hash, data, len(data))).rowcount * len(data)
+            old_hash = self._content_hash(key)
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                             (key, content_hash, json.dumps(meta), now))
+            dropped = self._drop_orphan(old_hash) if old_hash != content_hash else 0
+            self._grow(added - dropped)
+
+    def update_meta(self, key, meta):
+        with self._db:
+            self._db.execute("UPDATE pages SET meta = ? WHERE key = ?", (json.dumps(meta), key))
+
+    def touch(self, key, now):
+        with self._db:
+            self._db.execute("UPDATE pages SET last_access = ? WHERE key = ?", (now, key))
+
+    def delete(self, key):
+        with self._db:
+            row = self._db.execute("DELETE FROM pages WHERE key = ? RETURNING content_hash", (key,)).fetchone()
+            self._grow(-self._drop_orphan(row[0] if row else None))
+
+    def _grow(self, amount):
+        if amount:
+            self._db.execute("UPDATE totals SET size = size + ?", (amount,))
+
+    def _drop_orphan(self, content_hash):
+        """Delete the blob if no page uses it any more; returns the bytes freed"""
+        if content_hash is None:
+            return 0
+        row = self._db.execute(
+            "DELETE FROM blobs WHERE content_hash = ? AND NOT EXISTS "
+            "(SELECT 1 FROM pages WHERE content_hash = ?) RETURNING size",
+            (content_hash, content_hash)).fetchone()
+        return row[0] if row else 0
+
+    def total_size(self):
+        return self._db.execute("SELECT size FROM totals").fetchone()[0]
+
+    def keys_by_last_access(self):
+        return [row[0] for row in self._db.execute("SELECT key FROM pages ORDER BY last_access")]
+
+    def close(self):
+        self._db.close()
+
+class MmapStore:
+    """Page store backed by an append-only data file read through mmap.
+
+    A small JSON index maps keys to (offset, length) in the data file.
+    Deleted or replaced records leave dead space that is reclaimed by
+    rewriting the file once it exceeds half of the data file.
+
+    Processes can share the files (such as the app's job workers): changes
+    are made under an exclusive lock on a lock file and reads under a
+    shared one, and a process reloads the index, and reopens the data file
+    after a compaction, whenever another process has changed them. Access
+    times only reach the index every `touch_batch` hits or `touch_interval`
+    seconds, instead of the whole index being rewritten on every hit.
+    """
+
+    def __init__(self, path, touch_batch=100, touch_interval=30.0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.data_path = path
+        self.index_path = path + ".index.json"
+        self.touch_batch = touch_batch
+        self.touch_interval = touch_interval
+        self._lock_file = open(path + ".lock", "a+b")
+        self._index = {}
+        self._index_stamp = None
+        self._size = 0
+        # key -> access time not yet written to the index
+        self._touched = {}
+        self._last_flush = time.monotonic()
+        self._data = open(path, "a+b")
+        self._map = None
+        with self._locked():
+            self._refresh()
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Pick up changes other processes made to the index and data file; call with the lock held"""
+        try:
+            stat = os.stat(self.index_path)
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._index_stamp:
+            index = {}
+            if stamp is not None:
+                with open(self.index_path, encoding="utf-8") as f:
+                    index = json.load(f)
+            for key, now in self._touched.items():
+                if key in index:
+                    index[key]["last_access"] = max(index[key]["last_access"], now)
+            self._index = index
+            self._index_stamp = stamp
+            self._size = sum(record["length"] for record in index.values())
+        if os.stat(self.data_path).st_ino != os.fstat(self._data.fileno()).st_ino:
+            # Compacted by another process: the offsets in the index are for the new file
+            self._reopen()
+
+    def _reopen(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._data.close()
+        self._data = open(self.data_path, "a+b")
+
+    def _view(self):
+        size = os.fstat(self._data.fileno()).st_size
+        if size == 0:
+            return None
+        if self._map is None or len(self._map) != size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _save_index(self):
+        """Write the index, with any pending access times; call with the exclusive lock held"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        stat = os.stat(self.index_path)
+        self._index_stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._touched = {}
+        self._last_flush = time.monotonic()
+
+    def get(self, key):
+        with self._locked():
+            self._refresh()
+            record = self._index.get(key)
+            if record is None:
+                return None
+            data = self._view()[record["offset"]:record["offset"] + record["length"]]
+            entry = dict(record["meta"])
+        entry.update(_decode(data))
+        return entry
+
+    def put(self, key, meta, body, now):
+        data = _encode(body)
+        with self._locked(exclusive=True):
+            self._refresh()
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(data)
+            self._data.flush()
+            old = self._index.get(key)
+            if old is not None:
+                self._size -= old["length"]
+            self._index[key] = {"offset": offset, "length": len(data), "meta": meta, "last_access": now}
+            self._size += len(data)
+            self._maybe_compact()
+            self._save_index()
+
+    def update_meta(self, key, meta):
+        with self._locked(exclusive=True):
+            self._refresh()
+            if key in self._index:
+                self._index[key]["meta"] = meta
+                self._save_index()
+
+    def touch(self, key, now):
+        record = self._index.get(key)
+        if record is None:
+            return
+        record["last_access"] = now
+        self._touched[key] = now
+        if len(self._touched) >= self.touch_batch or time.monotonic() - self._last_flush >= self.touch_interval:
+            self.flush()
+
+    def flush(self):
+        """Write pending access times to the index"""
+        if not self._touched:
+            return
+        with self._locked(exclusive=True):
+            self._refresh()
+            self._save_index()
+
+    def delete(self, key):
+        with self._locked(exclusive=True):
+            self._refresh()
+            record = self._index.pop(key, None)
+            if record is not None:
+                self._size -= record["length"]
+                self._maybe_compact()
+                self._save_index()
+
+    def _maybe_compact(self):
+        size = os.fstat(self._data.fileno()).st_size
+        # Everything in the file that the (fresh) index does not point to is dead
+        if size == 0 or (size - self._size) * 2 < size:
+            return
+        view = self._view()
+        tmp_path = self.data_path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            for record in self._index.values():
+                chunk = view[record["offset"]:record["offset"] + record["length"]]
+                record["offset"] = out.tell()
+                out.write(chunk)
+        os.replace(tmp_path, self.data_path)
+        self._reopen()
+
+    def total_size(self):
+        return self._size
+
+    def keys_by_last_access(self):
+        return sorted(self._index, key=lambda key: self._index[key]["last_access"])
+
+    def close(self):
+        self.flush()
+        if self._map is not None:
+            self._map.close()
+        self._data.close()
+        self._lock_file.close()
+
+class PageCache:
+    """Persistent cache of fetched pages and their cleaned text.
+
+    Entries are keyed by normalized URL and hold the raw HTML, cleaned text,
+    next-page link, login flag, fetch time, ETag and Last-Modified. Entries
+    older than `ttl` seconds are stale: they are revalidated with a
+    conditional GET when the server gave validators, and treated as misses
+    otherwise. The store is kept under `max_bytes` by evicting the least
+    recently used entries.
+    """
+
+    def __init__(self, path=None, backend="sqlite", ttl=3600, max_bytes=200 * 1024 * 1024):
+        if backend == "sqlite":
+            self.store = SqliteStore(path or os.path.join(DEFAULT_CACHE_DIR, "pages.sqlite"))
+        elif backend == "mmap":
+            self.store = MmapStore(path or os.path.join(DEFAULT_CACHE_DIR, "pages.dat"))
+        else:
+            raise ValueError(f"Unknown page cache backend: {backend}")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.metrics = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def get(self, url, fetcher=None):
+        """Return a fresh cache entry for the URL, or None.
+
+        Stale entries with an ETag or Last-Modified are revalidated through
+        `fetcher.fetch_http`; a 304 response makes the entry fresh again.
+        """
+        return self.lookup(url, fetcher)[0]
+
+    def lookup(self, url, fetcher=None):
+        """Like `get`, but returns `(entry, response)`.
+
+        `response` is the `fetch_http` result when revalidating a stale entry
+        got the changed page back (a 200), so the caller can use it instead
+        of fetching the page again; otherwise it is None.
+        """
+        key = url_key(url)
+        with self._lock:
+            entry = self.store.get(key)
+        now = time.time()
+        if entry is None:
+            self._count("misses")
+            return None, None
+        if now - entry["fetched_at"] > self.ttl:
+            self._count("stale")
+            response = self._revalidate(url, entry, fetcher) if fetcher is not None else None
+            if response is None or response["status"] != 304:
+                self._count("misses")
+                return None, response if response is not None and response["status"] == 200 else None
+            entry["fetched_at"] = time.time()
+            self._count("revalidated")
+            with self._lock:
+                self.store.update_meta(key, self._meta(entry))
+        with self._lock:
+            self.store.touch(key, now)
+        self._count("hits")
+        return entry, None
+
+    def _revalidate(self, url, entry, fetcher):
+        """Conditional GET for a stale entry; returns the response, or None if it could not be made"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return None
+        try:
+            return fetcher.fetch_http(url, headers=headers)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _meta(entry):
+        return {name: entry.get(name) for name in
+                ("url", "fetched_at", "etag", "last_modified", "next_link", "login_required", "tier")}
+
+    def put(self, url, html, text, next_link=None, login_required=False, headers=None, tier=None):
+        """Store a page; `headers` are the HTTP response headers if there were any"""
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        now = time.time()
+        meta = self._meta({
+            "url": url,
+            "fetched_at": now,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "next_link": next_link,
+            "login_required": login_required,
+            "tier": tier,
+        })
+        with self._lock:
+            self.store.put(url_key(url), meta, {"html": html, "text": text}, now)
+            self._evict()
+
+    def _evict(self):
+        if self.store.total_size() <= self.max_bytes:
+            return
+        for key in self.store.keys_by_last_access():
+            self.store.delete(key)
+            self.metrics["evictions"] += 1
+            if self.store.total_size() <= self.max_bytes:
+                break
+
+    def invalidate(self, url):
+        with self._lock:
+            self.store.delete(url_key(url))
+
+    def _count(self, name):
+        with self._lock:
+            self.metrics[name] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self.metrics)
+            snapshot["bytes"] = self.store.total_size()
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+    def close(self):
+        with self._lock:
+            self.store.close()
+
+# Shared cache used by the scraping functions when none is passed in
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_page_cache():
+    """Return the process-wide page cache, creating it on first use.
+
+    SCRAPER_CACHE_BACKEND ("sqlite" or "mmap"), SCRAPER_CACHE_TTL (seconds)
+    and SCRAPER_CACHE_MAX_MB configure it.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PageCache(
+                backend=os.environ.get("SCRAPER_CACHE_BACKEND", "sqlite"),
+                ttl=float(os.environ.get("SCRAPER_CACHE_TTL", 3600)),
+                max_bytes=int(float(os.environ.get("SCRAPER_CACHE_MAX_MB", 200)) * 1024 * 1024),
+            )
+        return _default_cache
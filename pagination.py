@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse, urljoin
+from crawler import get_host
+from page_cache import DEFAULT_CACHE_DIR
+
+# Common pagination parameter names
+PAGINATION_PARAMS = ['page', 'p', 'pg', 'pageno', 'pagenumber', 'page_number']
+
+def detect_pagination_pattern(url):
+    """Detect the pagination pattern from the URL"""
+    parsed = urlparse(url)
+    query_params = parse_qs(parsed.query)
+
+    # Check if URL already has a pagination parameter
+    for param in PAGINATION_PARAMS:
+        if param in query_params:
+            return param
+
+    # If no pagination parameter found, return default
+    return 'page'
+
+def construct_pagination_url(url, page_num, pagination_param):
+    """Construct URL with proper pagination"""
+    parsed = urlparse(url)
+    query_params = parse_qs(parsed.query)
+
+    # Remove existing pagination parameter if it exists
+    for param in PAGINATION_PARAMS:
+        if param in query_params:
+            del query_params[param]
+
+    # Add new pagination parameter
+    query_params[pagination_param] = [str(page_num)]
+
+    # Reconstruct URL
+    new_query = urlencode(query_params, doseq=True)
+    return urlunparse((
+        parsed.scheme,
+        parsed.netloc,
+        parsed.path,
+        parsed.params,
+        new_query,
+        parsed.fragment
+    ))
+
+def _classes(tag):
+    value = tag.get("class") or []
+    return " ".join(value).lower() if isinstance(value, list) else value.lower()
+
+def _rel(tag):
+    value = tag.get("rel") or []
+    return [part.lower() for part in value] if isinstance(value, list) else value.lower().split()
+
+# Candidate "next page" rules in priority order; each tests a single <a> or <link> tag
+NEXT_LINK_RULES = [
+    ("rel_next", lambda tag, text: "next" in _rel(tag)),
+    ("class_pagination_next", lambda tag, text: "pagination-next" in _classes(tag)),
+    ("class_next", lambda tag, text: tag.name == "a" and "next" in _classes(tag)),
+    ("aria_label_next", lambda tag, text: "Next" in (tag.get("aria-label") or "")),
+    ("title_next", lambda tag, text: "Next" in (tag.get("title") or "")),
+    ("text_next", lambda tag, text: "Next" in text),
+    ("pagination_arrow", lambda tag, text: "pagination" in _classes(tag) and any(arrow in text for arrow in ("»", "›", ">"))),
+]
+
+def find_next_candidates(soup):
+    """Evaluate every next-link rule in a single pass over the page's links.
+
+    Returns a dict mapping rule name to the first matching href.
+    """
+    matches = {}
+    for tag in soup.find_all(["a", "link"], href=True):
+        href = tag["href"].strip()
+        if not href or href.lower().startswith("javascript:"):
+            continue
+        text = tag.get_text() if tag.name == "a" else ""
+        for name, rule in NEXT_LINK_RULES:
+            if name not in matches and rule(tag, text):
+                matches[name] = href
+        if len(matches) == len(NEXT_LINK_RULES):
+            break
+    return matches
+
+def first_candidate(matches):
+    """The href matched by the highest-priority rule, or None"""
+    for name, _ in NEXT_LINK_RULES:
+        if name in matches:
+            return matches[name]
+    return None
+
+def find_next_link(soup):
+    """Find the href of a 'next page' link in a parsed page"""
+    return first_candidate(find_next_candidates(soup))
+
+def _page_number(url, param):
+    values = parse_qs(urlparse(url).query).get(param)
+    try:
+        return int(values[0]) if values else 1
+    except ValueError:
+        return None
+
+class PaginationEngine:
+    """Finds next-page links and learns, per domain, how a site paginates.
+
+    The rule that found the next link last time is tried first. When the next
+    link only bumps a pagination query parameter, the parameter is remembered
+    so upcoming page URLs can be predicted with `construct_pagination_url`
+    and prefetched. What was learned is persisted to a small JSON file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "pagination_rules.json")
+        self._lock = threading.Lock()
+        # host -> {"rule": name, "param": name or None}
+        self.site_rules = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.site_rules = json.load(f)
+            except (OSError, ValueError):
+                self.site_rules = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.site_rules, f)
+        os.replace(tmp_path, self.path)
+
+    def find_next(self, soup, url):
+        """Return the absolute next-page URL for a parsed page, or None"""
+        return self.choose_next(find_next_candidates(soup), url)
+
+    def choose_next(self, matches, url):
+        """Return the absolute next-page URL from the candidates found on the page at `url`"""
+        host = get_host(url)
+        learned = self.site_rules.get(host, {})
+        rule = learned.get("rule")
+        if rule not in matches:
+            rule = next((name for name, _ in NEXT_LINK_RULES if name in matches), None)
+        if rule is None:
+            return None
+        next_url = urljoin(url, matches[rule])
+        param = self._detect_param(url, next_url)
+        if learned.get("rule") != rule or learned.get("param") != param:
+            with self._lock:
+                self.site_rules[host] = {"rule": rule, "param": param}
+                self._save()
+        return next_url
+
+    @staticmethod
+    def _detect_param(url, next_url):
+        """The query parameter that the next link increments, if that is all it changes"""
+        current, following = urlparse(url), urlparse(next_url)
+        if (current.netloc, current.path) != (following.netloc, following.path):
+            return None
+        for param in PAGINATION_PARAMS:
+            now, then = _page_number(url, param), _page_number(next_url, param)
+            if now is not None and then is not None and then == now + 1:
+                return param
+        return None
+
+    def predict_urls(self, url, count):
+        """Predict the next `count` page URLs after `url` from the learned parameter"""
+        param = self.site_rules.get(get_host(url), {}).get("param")
+        if not param or count <= 0:
+            return []
+        current = _page_number(url, param)
+        if current is None:
+            return []
+        return [construct_pagination_url(url, current + i, param) for i in range(1, count + 1)]
+
+# Shared engine so rules learned on one scrape help the next
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+def get_pagination_engine():
+    """Return the process-wide pagination engine, creating it on first use"""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = PaginationEngine()
+        return _default_engine
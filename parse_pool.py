@@ -0,0 +1,172 @@
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from document import analyze_document, process_document
+from pagination import first_candidate, get_pagination_engine
+from telemetry import configure_logging, logger, metrics, span
+
+# Pages smaller than this are parsed inline; handing them to a worker costs more than it saves
+DEFAULT_MIN_BYTES = 256 * 1024
+# Pages at least this large reach the worker through shared memory instead of the pipe
+DEFAULT_SHARED_MEMORY_BYTES = 2 * 1024 * 1024
+
+def _init_worker():
+    configure_logging(os.environ.get("SCRAPER_LOG_LEVEL", "WARNING"))
+
+def _analyze(payload):
+    """Worker process body: parse and clean one page given as UTF-8 bytes or a (shared memory name, size) pair"""
+    if isinstance(payload, tuple):
+        name, size = payload
+        block = shared_memory.SharedMemory(name=name)
+        view = block.buf[:size]
+        try:
+            # Decode straight from the shared buffer without an intermediate bytes copy
+            html_content = str(view, "utf-8", "surrogatepass")
+        finally:
+            view.release()
+            block.close()
+    else:
+        html_content = payload.decode("utf-8", "surrogatepass")
+    # Stage timings are sent back so the parent's metrics still show parse and clean
+    metrics.reset()
+    page = analyze_document(html_content)
+    del page["soup"]
+    page["stage_seconds"] = {stage: summary["sum"] for stage, summary in metrics.stage_summary().items()}
+    return page
+
+class ParsePool:
+    """Parses and cleans large pages in a pool of worker processes.
+
+    Parsing a multi-megabyte page holds the GIL for seconds, stalling every
+    fetch thread in the process. Handing the HTML to a worker process lets
+    fetching carry on and spreads parsing across cores. The calling thread
+    waits for its own page, but other threads keep running. The HTML is sent
+    as UTF-8 bytes, and large pages go through a shared memory block instead
+    of being pickled through the pipe. Only the plain results (text, login
+    check and next-link candidates) come back. Pages under `min_bytes` are
+    parsed inline.
+    """
+
+    def __init__(self, workers=None, min_bytes=DEFAULT_MIN_BYTES, shared_memory_bytes=DEFAULT_SHARED_MEMORY_BYTES):
+        # Leave a core for the browsers and the fetch loop
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.min_bytes = min_bytes
+        self.shared_memory_bytes = shared_memory_bytes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the parent's threads or open connections
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_init_worker)
+            return self._executor
+
+    def submit(self, html_content):
+        """Start parsing a page in a worker; returns a future of the `analyze_document` dict without the soup"""
+        data = html_content.encode("utf-8", "surrogatepass")
+        executor = self._get_executor()
+        if len(data) < self.shared_memory_bytes:
+            metrics.inc("parse_offloaded", transport="bytes")
+            return executor.submit(_analyze, data)
+        size = len(data)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            block.buf[:size] = data
+            del data
+            future = executor.submit(_analyze, (block.name, size))
+        except BaseException:
+            block.close()
+            block.unlink()
+            raise
+        metrics.inc("parse_offloaded", transport="shared_memory")
+
+        def release(_):
+            block.close()
+            block.unlink()
+        future.add_done_callback(release)
+        return future
+
+    def analyze(self, html_content):
+        """Parse and clean a page, in a worker process when it is large.
+
+        Returns the `analyze_document` dict without the soup. If the worker
+        pool has broken (a worker was killed), it is replaced and the page is
+        parsed inline.
+        """
+        if len(html_content) < self.min_bytes:
+            page = analyze_document(html_content)
+            del page["soup"]
+            return page
+        try:
+            with span("parse_offload"):
+                page = self.submit(html_content).result()
+        except BrokenProcessPool:
+            logger.warning("Parse worker pool broke; parsing inline and restarting it")
+            with self._lock:
+                broken, self._executor = self._executor, None
+            if broken is not None:
+                broken.shutdown(wait=False)
+            page = analyze_document(html_content)
+            del page["soup"]
+            return page
+        for stage, seconds in page.pop("stage_seconds").items():
+            metrics.observe("stage_seconds", seconds, stage=stage)
+        return page
+
+    def close(self, wait=False):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+def process_page(html_content, url=None, parse_pool=None):
+    """Like `document.process_document` (without the soup), parsing in the shared parse pool when there is one"""
+    parse_pool = parse_pool or get_parse_pool()
+    if parse_pool is None:
+        page = process_document(html_content, url)
+        del page["soup"]
+        return page
+    page = parse_pool.analyze(html_content)
+    candidates = page.pop("next_candidates")
+    page["next_link"] = get_pagination_engine().choose_next(candidates, url) if url else first_candidate(candidates)
+    return page
+
+# Parse pool shared by every scrape in the process
+_default_parse_pool = None
+_default_parse_pool_lock = threading.Lock()
+
+def get_parse_pool():
+    """Return the process-wide parse pool, or None when offloading is disabled.
+
+    SCRAPER_PARSE_WORKERS sets the number of worker processes (default: one
+    fewer than the CPU count; 0 parses everything inline), and
+    SCRAPER_PARSE_OFFLOAD_BYTES the smallest page sent to them (default 256 KB).
+    Workers are started on the first large page.
+    """
+    global _default_parse_pool
+    with _default_parse_pool_lock:
+        if _default_parse_pool is None:
+            workers = os.environ.get("SCRAPER_PARSE_WORKERS")
+            if workers is not None and int(workers) <= 0:
+                return None
+            _default_parse_pool = ParsePool(
+                workers=int(workers) if workers else None,
+                min_bytes=int(os.environ.get("SCRAPER_PARSE_OFFLOAD_BYTES", DEFAULT_MIN_BYTES)),
+            )
+        return _default_parse_pool
+
+def _close_default_parse_pool():
+    if _default_parse_pool is not None:
+        _default_parse_pool.close(wait=True)
+
+# A finalizer rather than atexit: multiprocessing children (such as job workers) skip atexit
+# handlers but wait for their own children on exit, so idle parse workers must be stopped first
+# (and before the executor's own queue finalizers, hence the high priority)
+multiprocessing.util.Finalize(None, _close_default_parse_pool, exitpriority=100)
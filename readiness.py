@@ -0,0 +1,188 @@
+import time
+from collections import deque
+from selenium.webdriver.common.by import By
+from telemetry import span
+
+# How often readiness conditions are re-checked in the browser
+POLL_INTERVAL = 0.1
+
+# Recent time-to-ready measurements, newest last
+readiness_log = deque(maxlen=1000)
+
+_DOCUMENT_COMPLETE_JS = "return document.readyState === 'complete'"
+
+# Wraps fetch and XMLHttpRequest so the page counts its own in-flight requests
+_NETWORK_PROBE_JS = """
+if (!window.__scraperNetworkProbe) {
+    window.__scraperNetworkProbe = true;
+    window.__scraperPending = 0;
+    var origFetch = window.fetch;
+    if (origFetch) {
+        window.fetch = function() {
+            window.__scraperPending++;
+            return origFetch.apply(this, arguments).finally(function() { window.__scraperPending--; });
+        };
+    }
+    var origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        window.__scraperPending++;
+        this.addEventListener('loadend', function() { window.__scraperPending--; });
+        return origSend.apply(this, arguments);
+    };
+}
+return [window.__scraperPending, performance.getEntriesByType('resource').length];
+"""
+
+# Records the time of the last DOM mutation
+_MUTATION_PROBE_JS = """
+if (!window.__scraperMutationProbe) {
+    window.__scraperMutationProbe = true;
+    window.__scraperLastMutation = performance.now();
+    new MutationObserver(function() { window.__scraperLastMutation = performance.now(); })
+        .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return performance.now() - window.__scraperLastMutation;
+"""
+
+class ReadinessStrategy:
+    """Base class for page readiness conditions"""
+
+    name = "base"
+
+    def reset(self):
+        """Forget state from a previous page"""
+
+    def is_ready(self, driver):
+        raise NotImplementedError
+
+class DocumentReady(ReadinessStrategy):
+    """Ready once document.readyState is 'complete'"""
+
+    name = "document_ready"
+
+    def is_ready(self, driver):
+        return driver.execute_script(_DOCUMENT_COMPLETE_JS)
+
+class NetworkIdle(ReadinessStrategy):
+    """Ready once no fetch/XHR is in flight and no new resources have loaded for `idle_time` seconds"""
+
+    name = "network_idle"
+
+    def __init__(self, idle_time=0.5):
+        self.idle_time = idle_time
+        self.reset()
+
+    def reset(self):
+        self._last_count = None
+        self._idle_since = None
+
+    def is_ready(self, driver):
+        pending, resource_count = driver.execute_script(_NETWORK_PROBE_JS)
+        now = time.monotonic()
+        if pending or resource_count != self._last_count:
+            self._last_count = resource_count
+            self._idle_since = now
+            return False
+        return now - self._idle_since >= self.idle_time
+
+class DomQuiescence(ReadinessStrategy):
+    """Ready once the DOM has not changed for `quiet_time` seconds"""
+
+    name = "dom_quiescence"
+
+    def __init__(self, quiet_time=0.5):
+        self.quiet_time = quiet_time
+
+    def is_ready(self, driver):
+        quiet_ms = driver.execute_script(_MUTATION_PROBE_JS)
+        return quiet_ms >= self.quiet_time * 1000
+
+class WaitForSelector(ReadinessStrategy):
+    """Ready once an element matching the CSS selector is present"""
+
+    name = "wait_for_selector"
+
+    def __init__(self, selector):
+        self.selector = selector
+
+    def is_ready(self, driver):
+        return bool(driver.find_elements(By.CSS_SELECTOR, self.selector))
+
+class AllOf(ReadinessStrategy):
+    """Ready once every wrapped strategy is ready"""
+
+    def __init__(self, *strategies):
+        self.strategies = strategies
+        self.name = "+".join(strategy.name for strategy in strategies)
+
+    def reset(self):
+        for strategy in self.strategies:
+            strategy.reset()
+
+    def is_ready(self, driver):
+        # Evaluate every strategy so stateful ones keep tracking between polls
+        return all([strategy.is_ready(driver) for strategy in self.strategies])
+
+def default_strategy():
+    return AllOf(DocumentReady(), DomQuiescence())
+
+# Strategy names offered in the UI
+STRATEGIES = ["dom_quiescence", "network_idle", "wait_for_selector", "document_ready"]
+
+def build_strategy(name, selector=None, quiet_time=0.5):
+    """Build a readiness strategy from its name"""
+    if name == "dom_quiescence":
+        return AllOf(DocumentReady(), DomQuiescence(quiet_time))
+    if name == "network_idle":
+        return AllOf(DocumentReady(), NetworkIdle(quiet_time))
+    if name == "wait_for_selector":
+        if not selector:
+            raise ValueError("A CSS selector is required for the wait_for_selector strategy")
+        return WaitForSelector(selector)
+    if name == "document_ready":
+        return DocumentReady()
+    raise ValueError(f"Unknown readiness strategy: {name}")
+
+def wait_until_ready(driver, strategy=None, timeout=20, url=None, started=None):
+    """Poll the readiness strategy until it passes or `timeout` seconds elapse.
+
+    Returns the time-to-ready in seconds, measured from `started` (defaults to
+    now) and records it in `readiness_log`. Hitting the timeout is not an
+    error; the page is used as-is and the entry is marked `timed_out`.
+    """
+    strategy = strategy or default_strategy()
+    strategy.reset()
+    started = time.monotonic() if started is None else started
+    deadline = started + timeout
+    timed_out = True
+    with span("readiness", strategy=strategy.name):
+        while time.monotonic() < deadline:
+            try:
+                if strategy.is_ready(driver):
+                    timed_out = False
+                    break
+            except Exception:
+                # The page may be mid-navigation; try again on the next poll
+                pass
+            time.sleep(POLL_INTERVAL)
+    elapsed = time.monotonic() - started
+    readiness_log.append({
+        "url": url,
+        "strategy": strategy.name,
+        "seconds": elapsed,
+        "timed_out": timed_out,
+    })
+    return elapsed
+
+def readiness_summary():
+    """Summarize recorded time-to-ready values per strategy"""
+    summary = {}
+    for entry in readiness_log:
+        stats = summary.setdefault(entry["strategy"], {"pages": 0, "timeouts": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["pages"] += 1
+        stats["timeouts"] += entry["timed_out"]
+        stats["total_seconds"] += entry["seconds"]
+        stats["max_seconds"] = max(stats["max_seconds"], entry["seconds"])
+    for stats in summary.values():
+        stats["mean_seconds"] = stats["total_seconds"] / stats["pages"]
+    return summary
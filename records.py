@@ -0,0 +1,144 @@
+import json
+import math
+import re
+from telemetry import logger, metrics
+
+_NUMBER_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?|-?\.\d+")
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TYPES = {"string", "number", "integer", "boolean", "object", "array", "null"}
+
+# Appended to the extraction description when a schema is given
+SCHEMA_INSTRUCTIONS = (
+    "Answer with a JSON array of records, each matching this JSON schema: {schema}. "
+    "Use [] if nothing matches. Output only the JSON."
+)
+
+class SchemaError(ValueError):
+    """The schema itself is unusable, or a response does not fit it"""
+
+def load_schema(schema):
+    """Parse and check a JSON schema (a dict or JSON text) describing one extracted record.
+
+    An array schema is reduced to its `items`. Only the types, `properties`,
+    `required`, `items`, `enum` and `additionalProperties` keywords are
+    enforced; others are kept in the prompt but not checked.
+    """
+    if isinstance(schema, str):
+        try:
+            schema = json.loads(schema)
+        except ValueError as e:
+            raise SchemaError(f"Schema is not valid JSON: {e}")
+    if not isinstance(schema, dict):
+        raise SchemaError("Schema must be a JSON object")
+    if schema.get("type") == "array":
+        schema = schema.get("items") or {}
+    _check(schema, "$")
+    return schema
+
+def _types(schema):
+    types = schema.get("type")
+    if types is None:
+        return set()
+    return set(types) if isinstance(types, list) else {types}
+
+def _check(schema, path):
+    if not isinstance(schema, dict):
+        raise SchemaError(f"{path}: schema must be an object")
+    unknown = _types(schema) - _TYPES
+    if unknown:
+        raise SchemaError(f"{path}: unknown type {sorted(unknown)[0]!r}")
+    for name, subschema in (schema.get("properties") or {}).items():
+        _check(subschema, f"{path}.{name}")
+    if "items" in schema:
+        _check(schema["items"], f"{path}[]")
+
+def schema_description(parse_description, schema):
+    """The extraction description with instructions to answer in records of the schema"""
+    return f"{parse_description}. " + SCHEMA_INSTRUCTIONS.format(schema=json.dumps(schema, separators=(",", ":")))
+
+def _parse_number(value, path):
+    if isinstance(value, bool):
+        raise SchemaError(f"{path}: expected a number, got {value!r}")
+    number = None
+    if isinstance(value, (int, float)):
+        number = value
+    elif isinstance(value, str):
+        # "$1,299.00" or "12 kg" still carry the number the schema asks for
+        match = _NUMBER_RE.search(value)
+        if match:
+            number = float(match.group().replace(",", ""))
+    if number is None:
+        raise SchemaError(f"{path}: expected a number, got {value!r}")
+    # "1e400" parses to infinity, and NaN or infinity are not JSON
+    if isinstance(number, float) and not math.isfinite(number):
+        raise SchemaError(f"{path}: {value!r} is not a finite number")
+    return number
+
+def coerce(value, schema, path="$"):
+    """Return `value` converted to the types of `schema`, or raise SchemaError"""
+    types = _types(schema)
+    if value is None:
+        if not types or "null" in types:
+            return None
+        raise SchemaError(f"{path}: missing value")
+    if "enum" in schema and value not in schema["enum"]:
+        raise SchemaError(f"{path}: {value!r} is not one of {schema['enum']}")
+    if not types:
+        return value
+    if "object" in types and isinstance(value, dict):
+        properties = schema.get("properties") or {}
+        for name in schema.get("required", ()):
+            if value.get(name) is None:
+                raise SchemaError(f"{path}: missing required {name!r}")
+        # Optional fields the model left out come back as None, so every record has the same keys
+        record = {name: None if value.get(name) is None else coerce(value[name], subschema, f"{path}.{name}")
+                  for name, subschema in properties.items()}
+        if schema.get("additionalProperties", True) is not False:
+            record.update((name, item) for name, item in value.items() if name not in properties)
+        return record
+    if "array" in types and isinstance(value, list):
+        items = schema.get("items") or {}
+        return [coerce(item, items, f"{path}[{i}]") for i, item in enumerate(value)]
+    if "integer" in types:
+        number = _parse_number(value, path)
+        if number == int(number):
+            return int(number)
+        raise SchemaError(f"{path}: expected an integer, got {value!r}")
+    if "number" in types:
+        return _parse_number(value, path)
+    if "boolean" in types:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "yes", "false", "no"):
+            return value.strip().lower() in ("true", "yes")
+        raise SchemaError(f"{path}: expected a boolean, got {value!r}")
+    if "string" in types and not isinstance(value, (dict, list)):
+        return str(value)
+    raise SchemaError(f"{path}: expected {' or '.join(sorted(types))}, got {type(value).__name__}")
+
+def parse_records(text, schema):
+    """Decode a model response into records typed by `schema`.
+
+    The response may be a JSON array or a single object, optionally in a
+    Markdown code fence; an empty response means no records. Records that
+    do not fit the schema are dropped and counted; a response that is not
+    JSON raises SchemaError.
+    """
+    text = _FENCE_RE.sub("", text.strip()).strip()
+    if not text or text in ("''", '""'):
+        return []
+    start = min((i for i in (text.find("["), text.find("{")) if i >= 0), default=-1)
+    if start < 0:
+        raise SchemaError(f"Response is not JSON: {text[:80]!r}")
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError as e:
+        raise SchemaError(f"Response is not valid JSON: {e}")
+    records = []
+    for i, item in enumerate(value if isinstance(value, list) else [value]):
+        try:
+            records.append(coerce(item, schema, f"$[{i}]"))
+        except SchemaError as e:
+            metrics.inc("invalid_records")
+            logger.debug("Dropped record: %s", e)
+    return records
@@ -0,0 +1,152 @@
+import math
+import re
+from collections import Counter
+from telemetry import metrics, span
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CAMEL_RE = re.compile(r"([a-z0-9])([A-Z])")
+_DIGIT_RE = re.compile(r"\d")
+
+# Values that look like what a query word asks for; each match counts as a "<kind>" token in the chunk,
+# so "prices" also matches "$24.99" and "emails" matches an address
+VALUE_PATTERNS = {
+    "<money>": re.compile(r"[$€£¥]\s?\d|\d\s?(?:€|(?:usd|eur|gbp)\b)", re.I),
+    "<email>": re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+"),
+    "<phone>": re.compile(r"\+?\(?\d{2,4}\)?[\s.-]\d{3,4}[\s.-]\d{3,4}\b"),
+    "<url>": re.compile(r"https?://|www\."),
+    "<percent>": re.compile(r"\d\s?%"),
+    "<date>": re.compile(r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b|"
+                         r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d{1,2}\b", re.I),
+}
+VALUE_TERMS = {
+    "price": "<money>", "cost": "<money>", "amount": "<money>", "fee": "<money>", "salary": "<money>",
+    "email": "<email>", "mail": "<email>",
+    "phone": "<phone>", "telephone": "<phone>",
+    "url": "<url>", "link": "<url>",
+    "discount": "<percent>", "percent": "<percent>", "percentage": "<percent>",
+    "date": "<date>", "deadline": "<date>",
+}
+
+# Words that say how to extract rather than what, plus common English ones
+STOPWORDS = frozenset(
+    "a an and any are as at be by each every for from get give in into is it its list me my of on or "
+    "please return show that the their them these this those to all with extract find information data "
+    "details detail info text content page website site".split()
+)
+
+def _stem(word):
+    # Just enough to match plurals ("prices" and "price", "categories" and "category")
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    """Lowercase, stemmed word tokens of the text, without stopwords"""
+    return [_stem(word) for word in _TOKEN_RE.findall(text.lower()) if word not in STOPWORDS]
+
+def tokenize_chunk(text):
+    """The chunk's word tokens plus one "<kind>" token per value matching `VALUE_PATTERNS`"""
+    tokens = tokenize(text)
+    for kind, pattern in VALUE_PATTERNS.items():
+        tokens.extend(kind for _ in pattern.finditer(text))
+    return tokens
+
+def _schema_words(schema):
+    """Property names, titles, descriptions and enum values of a JSON schema, recursively"""
+    if not isinstance(schema, dict):
+        return
+    for key in ("title", "description"):
+        if isinstance(schema.get(key), str):
+            yield schema[key]
+    for value in schema.get("enum", ()):
+        if isinstance(value, str):
+            yield value
+    for name, subschema in (schema.get("properties") or {}).items():
+        # "unitPrice" and "unit_price" both become "unit price"
+        yield _CAMEL_RE.sub(r"\1 \2", name).replace("_", " ")
+        yield from _schema_words(subschema)
+    yield from _schema_words(schema.get("items"))
+
+def query_terms(description, schema=None):
+    """The distinct search terms of an extraction description and optional JSON schema"""
+    words = [description or ""]
+    if schema:
+        words.extend(_schema_words(schema))
+    terms = [term for text in words for term in tokenize(text)]
+    terms.extend(VALUE_TERMS[term] for term in list(terms) if term in VALUE_TERMS)
+    return list(dict.fromkeys(terms))
+
+def _needs_digits(schema):
+    """Whether every record of the schema has a required numeric field"""
+    if not isinstance(schema, dict):
+        return False
+    if schema.get("type") == "array":
+        return _needs_digits(schema.get("items"))
+    properties = schema.get("properties") or {}
+    for name in schema.get("required", ()):
+        types = (properties.get(name) or {}).get("type")
+        types = set(types) if isinstance(types, list) else {types}
+        if types <= {"number", "integer"}:
+            return True
+    return False
+
+def bm25_scores(documents, terms, k1=1.5, b=0.75):
+    """Okapi BM25 score of each tokenized document for the query terms, with the documents as the corpus"""
+    if not documents:
+        return []
+    terms = set(terms)
+    average_length = sum(len(document) for document in documents) / len(documents) or 1
+    counts = [Counter(token for token in document if token in terms) for document in documents]
+    document_frequency = Counter(term for count in counts for term in count)
+    idf = {term: math.log(1 + (len(documents) - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+    scores = []
+    for document, count in zip(documents, counts):
+        norm = k1 * (1 - b + b * len(document) / average_length)
+        scores.append(sum(idf[term] * tf * (k1 + 1) / (tf + norm) for term, tf in count.items()))
+    return scores
+
+class RelevanceFilter:
+    """Picks the chunks worth sending to Gemini by scoring them locally against the description.
+
+    Chunks are ranked with BM25 against the terms of the extraction
+    description (and the property names, titles and descriptions of a JSON
+    schema, if one is given), using the chunks themselves as the corpus, so
+    words found everywhere on the page count for little. A chunk is kept when
+    its score is at least `min_score_ratio` of the best chunk's, up to
+    `max_chunks` (best first). Query words such as "price", "email" or
+    "date" also match values that look like one (see `VALUE_PATTERNS`).
+    When the schema requires a number in every record, chunks without a
+    single digit cannot produce one and are dropped. When nothing matches at
+    all the description has no usable keywords, and every chunk is kept. At
+    least `min_chunks` chunks are always kept.
+    """
+
+    def __init__(self, min_score_ratio=0.2, max_chunks=None, min_chunks=1):
+        self.min_score_ratio = min_score_ratio
+        self.max_chunks = max_chunks
+        self.min_chunks = min_chunks
+
+    def scores(self, chunks, description, schema=None):
+        scores = bm25_scores([tokenize_chunk(chunk) for chunk in chunks], query_terms(description, schema))
+        if _needs_digits(schema):
+            scores = [score if _DIGIT_RE.search(chunk) else 0.0 for score, chunk in zip(scores, chunks)]
+        return scores
+
+    def select(self, chunks, description, schema=None):
+        """Indexes of the chunks to extract from, in chunk order"""
+        chunks = list(chunks)
+        with span("prefilter"):
+            scores = self.scores(chunks, description, schema)
+        best = max(scores, default=0.0)
+        if best <= 0:
+            return list(range(len(chunks)))
+        ranked = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+        kept = [i for i in ranked if scores[i] > 0 and scores[i] >= best * self.min_score_ratio]
+        if self.max_chunks:
+            kept = kept[:self.max_chunks]
+        if len(kept) < self.min_chunks:
+            kept = ranked[:self.min_chunks]
+        metrics.inc("chunks_prefiltered", len(chunks) - len(kept))
+        return sorted(kept)
@@ -0,0 +1,96 @@
+import json
+import os
+import re
+
+class Sink:
+    """Base class for writers that receive page results one at a time"""
+
+    def write(self, page):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JsonlSink(Sink):
+    """Append each page result as one JSON line"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, page):
+        self._file.write(json.dumps(page, ensure_ascii=False) + "\n")
+        self._file.flush()
+        return self.path
+
+    def close(self):
+        self._file.close()
+
+class PageFileSink(Sink):
+    """Write each page's text to its own file named from `pattern` (formatted with the page dict)"""
+
+    def __init__(self, pattern="scraped_page_{page_number}.txt"):
+        self.pattern = pattern
+
+    def write(self, page):
+        filename = self.pattern.format(**page)
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(page["content"])
+        return filename
+
+class RotatingFileSink(Sink):
+    """Append page texts to numbered files, starting a new file once one exceeds `max_bytes`.
+
+    Pages are separated by a header line with the page number and URL.
+    Numbering carries on after files already in the directory, so an
+    earlier run's output is never overwritten.
+    """
+
+    def __init__(self, directory, prefix="scraped_pages", max_bytes=10 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        name_re = re.compile(re.escape(prefix) + r"_(\d+)\.txt")
+        numbers = [int(match.group(1)) for match in map(name_re.fullmatch, os.listdir(directory)) if match]
+        self.file_number = max(numbers, default=0)
+        self._file = None
+        self._written = 0
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        self.file_number += 1
+        path = os.path.join(self.directory, f"{self.prefix}_{self.file_number:05d}.txt")
+        self._file = open(path, "w", encoding="utf-8")
+        self._written = 0
+
+    def write(self, page):
+        if self._file is None or self._written >= self.max_bytes:
+            self._rotate()
+        header = f"=== Page {page.get('page_number', '')}: {page.get('url', '')} ===\n"
+        data = header + page["content"] + "\n\n"
+        self._file.write(data)
+        self._file.flush()
+        self._written += len(data.encode("utf-8"))
+        return self._file.name
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def stream_to_sinks(pages, *sinks):
+    """Write every page to each sink as it arrives and pass it through unchanged"""
+    for page in pages:
+        for sink in sinks:
+            sink.write(page)
+        yield page
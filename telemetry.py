@@ -0,0 +1,247 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("scraper")
+
+def configure_logging(level=None):
+    """Send scraper log records to stderr at `level` (default: SCRAPER_LOG_LEVEL or INFO).
+
+    Per-page progress is logged at DEBUG, so INFO keeps hot loops quiet and
+    WARNING leaves only problems.
+    """
+    level = level or os.environ.get("SCRAPER_LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = getattr(logging, level.upper(), logging.INFO)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+# Upper bounds (seconds) of the stage-duration histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """Bucketed counts for export plus a window of recent samples for percentiles"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=2048):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": self.max,
+        }
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+class Metrics:
+    """Thread-safe registry of counters, histograms and recent timing spans.
+
+    `span(stage)` times a block of the pipeline: the duration goes into the
+    `stage_seconds` histogram labelled with the stage, failures are counted
+    in `stage_errors`, and the span itself is kept in `spans` together with
+    the enclosing span on the same thread.
+    """
+
+    def __init__(self, max_spans=5000):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {}
+        self.histograms = {}
+        self.spans = deque(maxlen=max_spans)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(stage)
+        started = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.observe("stage_seconds", duration, stage=stage)
+            if error:
+                self.inc("stage_errors", stage=stage)
+            self.spans.append({
+                "stage": stage,
+                "parent": parent,
+                "start": started,
+                "duration": duration,
+                "thread": threading.current_thread().name,
+                "error": error,
+                "labels": {key: str(value) for key, value in labels.items()},
+            })
+
+    def stage_summary(self):
+        """Per-stage count, mean, p50, p95 and max duration in seconds"""
+        with self._lock:
+            return {dict(labels)["stage"]: histogram.summary()
+                    for (name, labels), histogram in self.histograms.items()
+                    if name == "stage_seconds"}
+
+    def snapshot(self):
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self.counters.items()]
+            histograms = [dict(histogram.summary(), name=name, labels=dict(labels))
+                          for (name, labels), histogram in self.histograms.items()]
+            spans = list(self.spans)
+        return {"counters": counters, "histograms": histograms, "spans": spans}
+
+    def to_json(self, include_spans=False):
+        snapshot = self.snapshot()
+        if not include_spans:
+            del snapshot["spans"]
+        return json.dumps(snapshot, indent=2)
+
+    def to_prometheus(self, prefix="scraper"):
+        """Render counters and histograms in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            typed = set()
+            for (name, labels), value in counters:
+                metric = f"{prefix}_{name}_total"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in histograms:
+                metric = f"{prefix}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write the metrics to `path`: JSON for a .json file, Prometheus text otherwise"""
+        data = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+
+# Process-wide registry the pipeline reports into
+metrics = Metrics()
+span = metrics.span
+
+@contextmanager
+def profile_run(profiler=None, output=None):
+    """Profile the enclosed block with cProfile or pyinstrument.
+
+    `profiler` defaults to SCRAPER_PROFILE ("cprofile" or "pyinstrument");
+    without one this does nothing. The report is written to `output` (a
+    .prof file for cProfile, HTML for pyinstrument) or logged.
+    """
+    profiler = (profiler or os.environ.get("SCRAPER_PROFILE", "")).lower()
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed; profiling with cProfile instead")
+            profiler = "cprofile"
+        else:
+            instrument = Profiler()
+            instrument.start()
+            try:
+                yield instrument
+            finally:
+                instrument.stop()
+                if output:
+                    with open(output, "w", encoding="utf-8") as f:
+                        f.write(instrument.output_html())
+                else:
+                    logger.info(instrument.output_text())
+            return
+    if profiler != "cprofile":
+        yield None
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if output:
+            profile.dump_stats(output)
+        else:
+            report = io.StringIO()
+            pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(30)
+            logger.info(report.getvalue())
@@ -0,0 +1,63 @@
+import contextlib
+from cryptography.fernet import Fernet
+import auth_session
+from auth_session import AuthSession, SessionStore
+
+class FakeDriver:
+    def get_cookies(self):
+        return [{"name": "sid", "value": "abc"}]
+
+    def execute_script(self, script, *args):
+        return {}
+
+class OneBrowserPool:
+    """A pool of one browser that fails instead of blocking when it is already lent out"""
+
+    def __init__(self):
+        self.lent = False
+        self.borrows = 0
+        self.session = None
+
+    @contextlib.contextmanager
+    def driver(self):
+        assert not self.lent, "borrowed a second browser from a pool of one"
+        # Waiting for a browser with the session lock held is what deadlocked
+        assert not self.session._lock.locked(), "borrowed a browser while holding the session lock"
+        self.lent = True
+        self.borrows += 1
+        try:
+            yield FakeDriver()
+        finally:
+            self.lent = False
+
+def make_session(tmp_path, monkeypatch):
+    logins = []
+    monkeypatch.setattr(auth_session, "perform_login", lambda driver, *args: logins.append(driver))
+    pool = OneBrowserPool()
+    session = AuthSession("http://shop.test/login", "alice", "secret", pool=pool,
+                          store=SessionStore(str(tmp_path / "sessions.enc"), key=Fernet.generate_key()))
+    pool.session = session
+    return session, pool, logins
+
+def test_relogin_uses_the_browser_the_caller_holds(tmp_path, monkeypatch):
+    session, pool, logins = make_session(tmp_path, monkeypatch)
+    held = FakeDriver()
+    session.ensure(held)
+    version = session.version
+    session.relogin(version, held)
+    assert logins == [held, held] and pool.borrows == 0
+    assert held.injected_session == (session.name, session.version)
+
+def test_login_without_a_browser_borrows_one_outside_the_lock(tmp_path, monkeypatch):
+    session, pool, logins = make_session(tmp_path, monkeypatch)
+    session.ensure()
+    session.relogin(session.version)
+    assert len(logins) == 2 and pool.borrows == 2
+
+def test_stale_relogin_reuses_the_newer_session(tmp_path, monkeypatch):
+    session, pool, logins = make_session(tmp_path, monkeypatch)
+    session.ensure()
+    seen = session.version
+    session.relogin(seen)
+    session.relogin(seen)
+    assert len(logins) == 2 and pool.borrows == 2
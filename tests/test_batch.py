@@ -0,0 +1,82 @@
+import json
+import pytest
+from batch import Checkpoint
+
+def record(task, page_number):
+    return {"task": task, "url": f"http://{task}.test/", "page_number": page_number, "content": f"page {page_number}"}
+
+def read_output(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_progress_survives_a_restart(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    checkpoint = Checkpoint(output)
+    checkpoint.write_page("a", record("a", 1), "http://a.test/?page=2")
+    checkpoint.write_page("b", record("b", 1), None)
+    checkpoint.finish("b")
+    checkpoint.close()
+    resumed = Checkpoint(output)
+    assert resumed.progress("a") == {"pages": 1, "next_url": "http://a.test/?page=2", "done": False}
+    assert resumed.progress("b")["done"] and resumed.progress("c")["pages"] == 0
+    resumed.write_page("a", record("a", 2), None)
+    resumed.close()
+    assert [(page["task"], page["page_number"]) for page in read_output(output)] == [("a", 1), ("b", 1), ("a", 2)]
+
+def test_page_written_but_not_journaled_is_dropped(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    checkpoint = Checkpoint(output)
+    checkpoint.write_page("a", record("a", 1), "http://a.test/?page=2")
+    checkpoint.close()
+    # Killed after the page reached the output but before its journal entry
+    with open(output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record("a", 2)) + "\n" + '{"task": "a", "pa')
+    resumed = Checkpoint(output)
+    assert resumed.progress("a")["pages"] == 1
+    resumed.write_page("a", record("a", 2), None)
+    resumed.close()
+    assert [page["page_number"] for page in read_output(output)] == [1, 2]
+
+def test_torn_journal_entry_is_cut_off(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    checkpoint = Checkpoint(output)
+    checkpoint.write_page("a", record("a", 1), "http://a.test/?page=2")
+    checkpoint.close()
+    with open(checkpoint.state_path, "ab") as f:
+        f.write(b'{"event": "done", "ta')
+    resumed = Checkpoint(output)
+    assert not resumed.progress("a")["done"]
+    resumed.finish("a")
+    resumed.close()
+    # The torn line was truncated, so the new entry is readable
+    final = Checkpoint(output)
+    assert final.progress("a")["done"]
+    final.close()
+
+def test_restart_discards_previous_progress(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    checkpoint = Checkpoint(output)
+    checkpoint.write_page("a", record("a", 1), None)
+    checkpoint.finish("a")
+    checkpoint.close()
+    restarted = Checkpoint(output, restart=True)
+    assert restarted.progress("a") == {"pages": 0, "next_url": None, "done": False}
+    restarted.close()
+    assert read_output(output) == []
+
+def test_output_without_a_journal_is_not_overwritten(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"earlier": "run"}\n', encoding="utf-8")
+    with pytest.raises(FileExistsError):
+        Checkpoint(str(output))
+    assert output.read_text(encoding="utf-8") == '{"earlier": "run"}\n'
+    Checkpoint(str(output), restart=True).close()
+    assert read_output(str(output)) == []
+
+def test_empty_output_without_a_journal_is_used(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.touch()
+    checkpoint = Checkpoint(str(output))
+    checkpoint.write_page("a", record("a", 1), None)
+    checkpoint.close()
+    assert [page["page_number"] for page in read_output(str(output))] == [1]
@@ -0,0 +1,41 @@
+import pytest
+from change_tracker import ChangeTracker
+
+URL = "http://shop.test/catalog"
+CHUNKS = [
+    "Laptop model 101 with a fast processor and a bright screen costs $499",
+    " ".join(f"Phone model {i} with a long lasting battery and two cameras costs ${i}" for i in range(200, 230)),
+]
+
+def test_first_diff_reports_every_chunk_as_new(tmp_path):
+    tracker = ChangeTracker(str(tmp_path / "changes.sqlite"))
+    changes = tracker.diff(URL, CHUNKS)
+    assert changes["new"] == CHUNKS and changes["emitted"] == CHUNKS
+    assert changes["statuses"] == ["new", "new"] and len(changes["pending"]) == 2
+
+def test_diff_stores_nothing_until_commit(tmp_path):
+    tracker = ChangeTracker(str(tmp_path / "changes.sqlite"))
+    tracker.diff(URL, CHUNKS)
+    # Extraction failed, so the next run must see the same changes
+    assert tracker.diff(URL, CHUNKS)["emitted"] == CHUNKS
+
+def test_committed_fingerprints_are_the_next_baseline(tmp_path):
+    path = str(tmp_path / "changes.sqlite")
+    tracker = ChangeTracker(path)
+    tracker.commit(URL, tracker.diff(URL, CHUNKS)["pending"])
+    edited = [CHUNKS[0], CHUNKS[1].replace("$229", "$239"), "Tablet model 303 costs $199"]
+    changes = ChangeTracker(path).diff(URL, edited)
+    assert changes["statuses"] == ["unchanged", "changed", "new"]
+    assert changes["emitted"] == edited[1:] and changes["removed"] == 0
+
+def test_commit_replaces_the_previous_fingerprints(tmp_path):
+    tracker = ChangeTracker(str(tmp_path / "changes.sqlite"))
+    tracker.commit(URL, tracker.diff(URL, CHUNKS)["pending"])
+    tracker.commit(URL, tracker.diff(URL, CHUNKS[:1])["pending"])
+    changes = tracker.diff(URL, CHUNKS)
+    assert changes["statuses"] == ["unchanged", "new"]
+
+def test_list_wrapper_refuses_incremental_scrapes():
+    from main import scrape_multiple_pages
+    with pytest.raises(ValueError, match="iter_pages"):
+        scrape_multiple_pages(URL, 2, incremental=True)
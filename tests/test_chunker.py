@@ -0,0 +1,50 @@
+from chunker import html_blocks, iter_chunks
+from llm_dispatch import estimate_tokens
+from main import split_dom_content
+
+def test_lines_are_packed_whole_up_to_the_budget():
+    chunks = split_dom_content("alpha\nbravo\ncharlie\ndelta", max_length=14)
+    assert chunks == ["alpha\nbravo", "charlie\ndelta"]
+
+def test_long_line_is_split_at_word_boundaries():
+    chunks = split_dom_content("word " * 10, max_length=12)
+    assert all(len(chunk) < 12 for chunk in chunks) and " ".join(chunks).split() == ["word"] * 10
+
+def test_word_longer_than_the_budget_is_cut():
+    chunks = split_dom_content("a " * 10 + "x" * 20000, max_length=6000)
+    assert [len(chunk) for chunk in chunks] == [19, 5999, 5999, 5999, 2003]
+    assert "".join(chunks[1:]) == "x" * 20000
+
+def test_every_token_chunk_fits_the_budget():
+    text = "intro line\n" + "https://example.test/" + "q" * 30000 + " tail.\nlast line"
+    chunks = list(iter_chunks(text, max_tokens=1250))
+    assert max(estimate_tokens(chunk) for chunk in chunks) <= 1250
+    assert "".join(chunks).count("q") == 30000
+
+def test_overlap_repeats_trailing_lines():
+    chunks = list(iter_chunks("one\ntwo\nthree\nfour", max_tokens=2, overlap_tokens=1,
+                              count_tokens=lambda text: 1))
+    assert chunks == ["one\ntwo", "two\nthree", "three\nfour"]
+
+RECORDS = "".join(f"<li><h3>Laptop model {i}</h3><p>${i}99</p><p>Fast processor, bright screen.</p></li>"
+                  for i in range(30))
+
+def test_records_are_kept_whole_across_chunks():
+    blocks = html_blocks(f"<html><body><script>var x;</script><ul>{RECORDS}</ul></body></html>", max_tokens=40)
+    assert len(blocks) == 30 and blocks[0] == "Laptop model 0\n$099\nFast processor, bright screen."
+    for chunk in iter_chunks(blocks, max_tokens=40):
+        # Every record starts and ends in the same chunk
+        assert chunk.count("Laptop model") == chunk.count("bright screen.")
+
+def test_loose_and_inline_text_is_grouped_between_blocks():
+    blocks = html_blocks("<body>Intro <b>bold</b><div>Block one</div>tail<!-- note --></body>")
+    assert blocks == ["Intro\nbold", "Block one", "tail"]
+
+def test_scrape_job_returns_blocks_for_extraction(monkeypatch):
+    import main
+    from jobs import run_scrape_job
+    page = {"tier": "http", "login_required": False, "text": "unused",
+            "html": f"<html><body><ul>{RECORDS}</ul></body></html>"}
+    monkeypatch.setattr(main, "scrape_page", lambda url, **options: page)
+    result = run_scrape_job({"url": "http://shop.test/", "chunk_tokens": 40}, {}, lambda *args: None)
+    assert len(result["blocks"]) == 30
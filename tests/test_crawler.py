@@ -0,0 +1,76 @@
+import time
+import pytest
+from crawler import Frontier, crawl, normalize_url
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Shop.Test:80/list?b=2&a=1#reviews", "http://shop.test/list?a=1&b=2"),
+    ("https://shop.test:443", "https://shop.test/"),
+    ("  https://shop.test:8443/?q=  ", "https://shop.test:8443/?q="),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+def test_frontier_skips_urls_it_has_seen():
+    frontier = Frontier(per_host_delay=0)
+    assert frontier.push("http://a.test/?x=1&y=2")
+    assert not frontier.push("HTTP://A.TEST:80/?y=2&x=1#top")
+    assert len(frontier) == 1
+
+def test_busy_host_does_not_block_other_hosts():
+    frontier = Frontier(per_host_concurrency=1, per_host_delay=0)
+    frontier.push("http://a.test/1", priority=0)
+    frontier.push("http://a.test/2", priority=0)
+    frontier.push("http://b.test/1", priority=5)
+    assert frontier.pop()[0] == "http://a.test/1"
+    # a.test is at its limit, so the worse-priority b.test page goes next
+    assert frontier.pop()[0] == "http://b.test/1"
+    frontier.task_done("http://a.test/1")
+    assert frontier.pop()[0] == "http://a.test/2"
+
+def test_host_concurrency_override():
+    frontier = Frontier(per_host_concurrency=1, per_host_delay=0,
+                        host_overrides={"a.test": {"concurrency": 2}})
+    for path in ("1", "2", "3"):
+        frontier.push("http://a.test/" + path)
+    frontier.push("http://b.test/1", priority=5)
+    assert [frontier.pop()[0] for _ in range(3)] == ["http://a.test/1", "http://a.test/2", "http://b.test/1"]
+
+def test_requests_to_one_host_are_spaced_by_its_delay():
+    frontier = Frontier(per_host_concurrency=2, per_host_delay=0.2,
+                        host_overrides={"fast.test": {"delay": 0}})
+    for url in ("http://slow.test/1", "http://slow.test/2", "http://fast.test/1", "http://fast.test/2"):
+        frontier.push(url)
+    started = time.monotonic()
+    order = [frontier.pop()[0] for _ in range(4)]
+    assert order[-1] == "http://slow.test/2" and time.monotonic() - started >= 0.19
+    assert order.index("http://fast.test/2") < 3
+
+def test_drained_frontier_returns_none():
+    frontier = Frontier(per_host_delay=0)
+    frontier.push("http://a.test/")
+    url, _, _ = frontier.pop()
+    frontier.task_done(url)
+    assert frontier.pop() is None
+
+def test_crawl_follows_links_once_and_reports_errors():
+    site = {"http://a.test/": ["http://a.test/next", "http://b.test/"],
+            "http://a.test/next": ["http://a.test/"],
+            "http://b.test/": []}
+
+    def fetch(url):
+        if url not in site:
+            raise ValueError("not found")
+        return f"page {url}", site[url] + ["http://c.test/missing"]
+
+    results = {result["url"]: result for result in crawl(["http://a.test/"], fetch, workers=3, per_host_delay=0)}
+    assert set(results) == {"http://a.test/", "http://a.test/next", "http://b.test/", "http://c.test/missing"}
+    assert results["http://c.test/missing"]["error"] == "not found"
+    assert results["http://a.test/next"]["depth"] == 1 and results["http://a.test/"]["depth"] == 0
+
+def test_crawl_stops_at_max_pages():
+    def fetch(url):
+        number = int(url.rsplit("/", 1)[1])
+        return url, [f"http://a.test/{number + 1}"]
+
+    results = crawl(["http://a.test/0"], fetch, workers=2, per_host_delay=0, max_pages=3)
+    assert sorted(result["url"] for result in results) == ["http://a.test/0", "http://a.test/1", "http://a.test/2"]
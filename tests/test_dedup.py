@@ -0,0 +1,95 @@
+from dedup import BoilerplateFilter, PageDeduplicator
+
+CHROME = "Home page\nToday's deals\nHelp center\nCopyright Example Store"
+
+def page(*products):
+    return "\n".join([CHROME, *products])
+
+def test_repeat_scrapes_of_one_page_learn_nothing(tmp_path):
+    path = str(tmp_path / "boilerplate.json")
+    boilerplate = BoilerplateFilter(path)
+    text = page("Laptop model 101", "$499")
+    # Three crawls of the same single-page site, as three "Scrape pages" clicks or batch tasks would do
+    for _ in range(3):
+        content, duplicate_of, removed = PageDeduplicator(boilerplate).process("http://shop.test/", text)
+        assert content == text and duplicate_of is None and removed == 0
+    assert not boilerplate.learned
+    assert BoilerplateFilter(path).strip("http://shop.test/", text) == (text, 0)
+
+def test_revisited_page_does_not_count_twice(tmp_path):
+    deduplicator = PageDeduplicator(BoilerplateFilter(str(tmp_path / "boilerplate.json")))
+    first = page("Laptop model 101", "$499")
+    deduplicator.process("http://shop.test/?page=1", first)
+    deduplicator.process("http://shop.test/?page=2", page("Phone model 202", "$299"))
+    content, duplicate_of, _ = deduplicator.process("http://shop.test/?page=1", first)
+    assert duplicate_of == "http://shop.test/?page=1" and content == ""
+    assert not deduplicator.boilerplate.learned
+
+def catalog_page(number):
+    return page(*(f"Laptop model {number}{i} with {i} GB of memory\n${number}{i}9" for i in range(20)))
+
+def test_near_duplicates_do_not_count_toward_boilerplate(tmp_path):
+    deduplicator = PageDeduplicator(BoilerplateFilter(str(tmp_path / "boilerplate.json")))
+    for number in range(1, 6):
+        deduplicator.process(f"http://shop.test/?page={number}", catalog_page(number))
+    learned = dict(deduplicator.boilerplate.learned)
+    # The same products under another URL with a trivially different counter line
+    content, duplicate_of, _ = deduplicator.process("http://shop.test/?page=2&ref=mail",
+                                                    catalog_page(2) + "\nViewed 3 times")
+    assert duplicate_of == "http://shop.test/?page=2" and content == ""
+    assert deduplicator.boilerplate.learned == learned
+
+def test_pages_sharing_a_large_menu_are_not_duplicates(tmp_path):
+    deduplicator = PageDeduplicator(BoilerplateFilter(str(tmp_path / "boilerplate.json")))
+    menu = [f"Menu link {i}" for i in range(400)]
+    for number in range(1, 6):
+        products = [f"Phone model {number}{i} costs ${number}{i}9" for i in range(10)]
+        content, duplicate_of, _ = deduplicator.process(f"http://shop.test/?page={number}",
+                                                        "\n".join(menu + products))
+        assert duplicate_of is None
+        assert all(product in content for product in products)
+
+def test_site_chrome_is_learned_from_distinct_pages(tmp_path):
+    deduplicator = PageDeduplicator(BoilerplateFilter(str(tmp_path / "boilerplate.json")))
+    for number in range(1, 6):
+        content, duplicate_of, removed = deduplicator.process(
+            f"http://shop.test/?page={number}", page(f"Laptop model {number}", f"${number}99"))
+    assert duplicate_of is None
+    assert content == "Laptop model 5\n$599" and removed == 4
+    # Too few pages to save for later crawls
+    assert not deduplicator.boilerplate.learned
+
+def test_chrome_learned_on_a_larger_crawl_is_saved(tmp_path):
+    deduplicator = PageDeduplicator(BoilerplateFilter(str(tmp_path / "boilerplate.json")))
+    for number in range(1, 11):
+        deduplicator.process(f"http://shop.test/?page={number}", page(f"Laptop model {number}"))
+    learned = BoilerplateFilter(deduplicator.boilerplate.path)
+    assert learned.strip("http://shop.test/?page=99", page("Tablet model 9")) == ("Tablet model 9", 4)
+    other = page("Laptop model 1")
+    assert learned.strip("http://other.test/", other) == (other, 0)
+
+def test_repeated_values_and_short_labels_are_not_learned(tmp_path):
+    deduplicator = PageDeduplicator(BoilerplateFilter(str(tmp_path / "boilerplate.json")))
+    names = "ABCDEFGHIJKL"
+    for number in range(12):
+        text = page("Shop", f"Widget {names[number]}", "$9.99", f"Widget {names[number]}{names[number]}",
+                    "$14.99", "Footer")
+        content, _, removed = deduplicator.process(f"http://shop.test/item/{number}", text)
+        if number == 3:
+            # Four pages are too few to learn anything from
+            assert removed == 0
+    assert content == "Shop\nWidget L\n$9.99\nWidget LL\n$14.99\nFooter" and removed == 4
+    assert BoilerplateFilter(deduplicator.boilerplate.path).strip("http://shop.test/", "$9.99\nShop") == (
+        "$9.99\nShop", 0)
+
+def test_lines_repeated_within_a_page_are_not_boilerplate(tmp_path):
+    deduplicator = PageDeduplicator(BoilerplateFilter(str(tmp_path / "boilerplate.json")))
+    for number in range(1, 6):
+        items = [f"Phone model {number}{i}\n${number}{i}9\nAdd to cart" for i in range(3)]
+        content, _, _ = deduplicator.process(f"http://shop.test/?page={number}", page(*items))
+    assert content.count("Add to cart") == 3 and "Copyright Example Store" not in content
+
+def test_unreadable_boilerplate_file_is_ignored(tmp_path):
+    path = tmp_path / "boilerplate.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert BoilerplateFilter(str(path)).learned == {}
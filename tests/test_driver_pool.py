@@ -0,0 +1,79 @@
+from browser_profile import prepare_navigation
+from driver_pool import DriverPool
+
+class FakeDriver:
+    def __init__(self):
+        self.commands = []
+        self.current_url = "about:blank"
+        self.quit_called = False
+
+    def execute_cdp_cmd(self, command, params):
+        # Chrome rejects anything but a concrete origin
+        if command == "Storage.clearDataForOrigin" and not params["origin"].startswith("http"):
+            raise RuntimeError("Invalid origin")
+        self.commands.append((command, params))
+
+    def execute_script(self, script, *args):
+        self.commands.append(("script", script))
+        return 1
+
+    def delete_all_cookies(self):
+        self.commands.append(("delete_all_cookies", None))
+
+    def get(self, url):
+        self.commands.append(("get", url))
+        self.current_url = url
+
+    def quit(self):
+        self.quit_called = True
+
+class WebDriverOnly(FakeDriver):
+    def execute_cdp_cmd(self, command, params):
+        raise RuntimeError("not a Chromium driver")
+
+class StorageFails(FakeDriver):
+    def execute_cdp_cmd(self, command, params):
+        if command == "Storage.clearDataForOrigin" and "b.test" in params["origin"]:
+            raise RuntimeError("Target closed")
+        super().execute_cdp_cmd(command, params)
+
+def borrow_and_return(factory, *urls, landed_on=None):
+    pool = DriverPool(size=1, driver_factory=factory)
+    pooled = pool.acquire()
+    driver = pooled.driver
+    driver.injected_session = ("shop.test|alice", 1)
+    for url in urls:
+        prepare_navigation(driver, url)
+        driver.get(url)
+    if landed_on:
+        # Redirected somewhere that was never navigated to directly
+        driver.current_url = landed_on
+    driver.commands.clear()
+    pool.release(pooled)
+    return pool, driver
+
+def cleared_origins(driver):
+    return [params["origin"] for command, params in driver.commands if command == "Storage.clearDataForOrigin"]
+
+def test_returned_browser_is_wiped_for_every_site_it_visited():
+    pool, driver = borrow_and_return(FakeDriver, "https://a.test/shop?page=2", "http://B.test:8080/login",
+                                     landed_on="https://c.test/welcome")
+    assert ("Network.clearBrowserCookies", {}) in driver.commands
+    assert cleared_origins(driver) == ["http://b.test:8080", "https://a.test", "https://c.test"]
+    assert driver.commands[-1] == ("get", "about:blank") and driver.injected_session is None
+    assert pool.stats()["idle_drivers"] == 1
+    # The next borrower starts with an empty record
+    assert driver.visited_origins == set()
+
+def test_browser_whose_storage_cannot_be_cleared_is_retired():
+    pool, driver = borrow_and_return(StorageFails, "https://a.test/", "https://b.test/")
+    assert driver.quit_called and pool.stats()["idle_drivers"] == 0
+
+def test_non_chromium_browser_falls_back_to_webdriver_cleanup():
+    pool, driver = borrow_and_return(WebDriverOnly, "https://a.test/")
+    assert ("delete_all_cookies", None) in driver.commands
+    assert driver.commands[-1] == ("get", "about:blank") and pool.stats()["idle_drivers"] == 1
+
+def test_non_chromium_browser_that_visited_other_sites_is_retired():
+    pool, driver = borrow_and_return(WebDriverOnly, "https://a.test/", "https://b.test/")
+    assert driver.quit_called and pool.stats()["idle_drivers"] == 0
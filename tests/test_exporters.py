@@ -0,0 +1,174 @@
+import os
+import re
+import struct
+import threading
+import zlib
+import pytest
+from exporters import StreamingPdfWriter, TrueTypeFont, export, export_cached, write_pdf
+
+def test_concurrent_exports_to_one_path_do_not_collide(tmp_path):
+    path = str(tmp_path / "results.csv")
+    errors = []
+
+    def run(number):
+        try:
+            export([f"row {number}\n" * 2000], "csv", path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors and os.listdir(tmp_path) == ["results.csv"]
+    with open(path, encoding="utf-8") as f:
+        rows = f.read().splitlines()
+    assert len(rows) == 2000 and len(set(rows)) == 1
+
+def test_failed_export_leaves_no_files(tmp_path):
+    def results():
+        yield "first row"
+        raise RuntimeError("extraction failed")
+
+    with pytest.raises(RuntimeError):
+        export(results(), "text", str(tmp_path / "results.txt"))
+    assert os.listdir(tmp_path) == []
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        export(["row"], "xml", str(tmp_path / "results.xml"))
+    assert os.listdir(tmp_path) == []
+
+def test_cached_export_is_reused(tmp_path):
+    path = export_cached("a\nb", "pdf", directory=str(tmp_path))
+    with open(path, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+    assert export_cached("a\nb", "pdf", directory=str(tmp_path)) == path
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+def make_font(path, chars, cmap_format):
+    """Write a minimal TrueType font mapping each character to its own glyph (glyph 0 is .notdef)"""
+    codes = sorted(ord(char) for char in chars)
+    glyphs = {code: number for number, code in enumerate(codes, 1)}
+    head = bytearray(54)
+    struct.pack_into(">H", head, 18, 1000)
+    struct.pack_into(">hhhh", head, 36, 0, -200, 1000, 800)
+    hhea = bytearray(36)
+    struct.pack_into(">hh", hhea, 4, 800, -200)
+    struct.pack_into(">H", hhea, 34, len(codes) + 1)
+    hmtx = b"".join(struct.pack(">Hh", 500 + 10 * glyph, 0) for glyph in range(len(codes) + 1))
+    if cmap_format == 12:
+        groups = b"".join(struct.pack(">III", code, code, glyphs[code]) for code in codes)
+        subtable = struct.pack(">HHIII", 12, 0, 16 + len(groups), 0, len(codes)) + groups
+        encoding = (3, 10)
+    else:
+        # One segment per character, alternating idDelta and glyphIdArray lookups, then the 0xFFFF end segment
+        ends = codes + [0xFFFF]
+        segments = len(ends)
+        deltas, range_offsets, glyph_array = [], [], []
+        for i, code in enumerate(codes):
+            if i % 2:
+                deltas.append(0)
+                range_offsets.append(2 * (segments - i) + 2 * len(glyph_array))
+                glyph_array.append(glyphs[code])
+            else:
+                deltas.append((glyphs[code] - code) % 0x10000)
+                range_offsets.append(0)
+        deltas.append(1)
+        range_offsets.append(0)
+        body = (struct.pack(f">{segments}H", *ends) + b"\0\0" + struct.pack(f">{segments}H", *ends)
+                + struct.pack(f">{segments}H", *deltas) + struct.pack(f">{segments}H", *range_offsets)
+                + struct.pack(f">{len(glyph_array)}H", *glyph_array))
+        subtable = struct.pack(">HHHHHHH", 4, 14 + len(body), 0, 2 * segments, 0, 0, 0) + body
+        encoding = (3, 1)
+    cmap = struct.pack(">HHHHI", 0, 1, *encoding, 12) + subtable
+    tables = {"cmap": cmap, "head": bytes(head), "hhea": bytes(hhea), "hmtx": hmtx}
+    offset = 12 + 16 * len(tables)
+    directory, data = b"", b""
+    for tag, table in tables.items():
+        directory += struct.pack(">4sIII", tag.encode("latin-1"), 0, offset + len(data), len(table))
+        data += table + b"\0" * (-len(table) % 4)
+    with open(path, "wb") as f:
+        f.write(struct.pack(">IHHHH", 0x00010000, len(tables), 0, 0, 0) + directory + data)
+    return glyphs
+
+def read_pdf_lines(data):
+    """Text of each line drawn in a PDF from `StreamingPdfWriter`, read back through its xref and ToUnicode map"""
+    xref_at = int(data.rsplit(b"startxref\n", 1)[1].split()[0])
+    header, *entries = data[xref_at:].split(b"trailer")[0].splitlines()[1:]
+    objects = {}
+    for object_id, entry in enumerate(entries[1:], 1):
+        offset = int(entry.split()[0])
+        assert data[offset:].startswith(f"{object_id} 0 obj\n".encode())
+        body = data[offset:data.index(b"\nendobj\n", offset)]
+        if b"\nstream\n" in body:
+            dictionary, stream = body.split(b"\nstream\n", 1)
+            stream = stream[:int(re.search(rb"/Length (\d+)", dictionary).group(1))]
+            objects[object_id] = (dictionary, zlib.decompress(stream) if b"/FlateDecode" in dictionary else stream)
+        else:
+            objects[object_id] = (body, None)
+    assert int(header.split()[1]) == len(objects) + 1
+    to_unicode = next((re.search(rb"/ToUnicode (\d+)", body) for body, _ in objects.values()
+                       if b"/ToUnicode" in body), None)
+    chars = {}
+    if to_unicode:
+        cmap = objects[int(to_unicode.group(1))][1].decode("latin-1")
+        chars = {glyph: bytes.fromhex(text).decode("utf-16-be")
+                 for glyph, text in re.findall(r"<([0-9a-f]{4})> <([0-9a-f]+)>", cmap)}
+
+    def decode(hex_text):
+        if not to_unicode:
+            return bytes.fromhex(hex_text).decode("cp1252")
+        return "".join(chars.get(hex_text[i:i + 4], "\ufffd") for i in range(0, len(hex_text), 4))
+
+    kids = re.search(rb"/Type /Pages /Kids \[([^\]]*)\]", b"".join(body for body, _ in objects.values())).group(1)
+    lines = []
+    for page_id in map(int, re.findall(rb"(\d+) 0 R", kids)):
+        content_id = int(re.search(rb"/Contents (\d+)", objects[page_id][0]).group(1))
+        lines.extend(decode(hex_text.decode("latin-1"))
+                     for hex_text in re.findall(rb"<([0-9a-f]*)> Tj", objects[content_id][1]))
+    return lines
+
+UNICODE_LINES = ["Café au lait costs €3", "Ελληνικά and русский", "日本語のテキスト", "Smile \U0001F600 \U0001F680!"]
+
+@pytest.mark.parametrize("cmap_format", [4, 12])
+def test_pdf_round_trips_unicode_text(tmp_path, cmap_format):
+    chars = {char for line in UNICODE_LINES for char in line}
+    if cmap_format == 4:
+        # Format 4 only covers the Basic Multilingual Plane
+        chars = {char for char in chars if ord(char) <= 0xFFFF}
+    font_path = str(tmp_path / f"font{cmap_format}.ttf")
+    glyphs = make_font(font_path, chars, cmap_format)
+    assert TrueTypeFont(font_path).cmap == glyphs
+    lines = UNICODE_LINES if cmap_format == 12 else UNICODE_LINES[:3]
+    with open(tmp_path / "out.pdf", "wb") as f:
+        assert write_pdf(lines, f, font_path=font_path) == 1
+    assert read_pdf_lines((tmp_path / "out.pdf").read_bytes()) == lines
+
+def test_characters_missing_from_the_font_are_not_mapped(tmp_path):
+    font_path = str(tmp_path / "latin.ttf")
+    make_font(font_path, set("Price: 5"), 4)
+    with open(tmp_path / "out.pdf", "wb") as f:
+        write_pdf(["Price: 5€"], f, font_path=font_path)
+    assert read_pdf_lines((tmp_path / "out.pdf").read_bytes()) == ["Price: 5\ufffd"]
+
+def test_long_unicode_text_wraps_across_pages(tmp_path):
+    words = [f"naïve{number}" for number in range(3000)]
+    font_path = str(tmp_path / "font.ttf")
+    make_font(font_path, set(" ".join(words)), 12)
+    with open(tmp_path / "out.pdf", "wb") as f:
+        pages = write_pdf([" ".join(words)], f, font_path=font_path)
+    lines = read_pdf_lines((tmp_path / "out.pdf").read_bytes())
+    assert pages > 1 and len(lines) > pages
+    # Lines break at spaces, and the spaces at the breaks are dropped
+    assert " ".join(lines).split() == words
+
+def test_pdf_without_a_font_uses_helvetica(tmp_path):
+    with open(tmp_path / "out.pdf", "wb") as f:
+        writer = StreamingPdfWriter(f)
+        for line in ("Café costs €3", "Ελληνικά"):
+            writer.add_line(line)
+        writer.close()
+    # Helvetica only covers Windows-1252
+    assert read_pdf_lines((tmp_path / "out.pdf").read_bytes()) == ["Café costs €3", "????????"]
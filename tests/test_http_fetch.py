@@ -0,0 +1,67 @@
+import pytest
+from http_fetch import TieredFetcher, needs_js_rendering
+
+ARTICLE = "<html><body>" + "".join(f"<p>Laptop model {i} costs ${i}</p>" for i in range(20)) + "</body></html>"
+
+@pytest.mark.parametrize("html, expected", [
+    (ARTICLE, False),
+    ("", True),
+    ("<html><head><title>Shop</title></head></html>", True),
+    ("<html><body><p>Loading...</p></body></html>", True),
+    ("<html><body><div id='root'></div><script>render()</script>" + "<p>menu entry</p>" * 30 + "</body></html>", True),
+    ("<html><body><noscript>Please enable JavaScript</noscript>" + "<p>menu entry</p>" * 30 + "</body></html>", True),
+    ("<html><body><form><input type='password' name='pw'></form></body></html>", False),
+    ("<html><body><script>" + "var x = 1;" * 100 + "</script><p>Hi</p></body></html>", True),
+])
+def test_needs_js_rendering(html, expected):
+    assert needs_js_rendering(html) is expected
+
+class Responses:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def __call__(self, url, headers=None):
+        self.urls.append(url)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+def ok(html):
+    return {"status": 200, "url": "", "html": html, "headers": {"ETag": '"v1"'}}
+
+def browser(url):
+    return f"<rendered {url}>"
+
+def fetcher_with(monkeypatch, *responses):
+    fetcher = TieredFetcher()
+    http = Responses(*responses)
+    monkeypatch.setattr(fetcher, "fetch_http", http)
+    return fetcher, http
+
+def test_static_page_is_served_over_http(monkeypatch):
+    fetcher, _ = fetcher_with(monkeypatch, ok(ARTICLE))
+    response = fetcher.fetch_response("http://a.test/", lambda url: pytest.fail("used the browser"))
+    assert response == {"html": ARTICLE, "tier": "http", "headers": {"ETag": '"v1"'}}
+    assert fetcher.metrics == {"http": 1, "browser": 0, "escalations": 0}
+
+def test_client_rendered_domain_goes_straight_to_the_browser_after_the_first_page(monkeypatch):
+    fetcher, http = fetcher_with(monkeypatch, ok("<html><body><div id='app'></div></body></html>"))
+    assert fetcher.fetch("http://spa.test/1", browser) == ("<rendered http://spa.test/1>", "browser")
+    assert fetcher.fetch("http://spa.test/2", browser) == ("<rendered http://spa.test/2>", "browser")
+    assert http.urls == ["http://spa.test/1"] and fetcher.js_domains == {"spa.test": True}
+    assert fetcher.metrics == {"http": 0, "browser": 2, "escalations": 1}
+
+@pytest.mark.parametrize("failure", [ConnectionError("refused"), {"status": 403, "url": "", "html": "", "headers": {}}])
+def test_failed_http_request_falls_back_without_marking_the_domain(monkeypatch, failure):
+    fetcher, _ = fetcher_with(monkeypatch, failure, ok(ARTICLE))
+    assert fetcher.fetch("http://a.test/1", browser)[1] == "browser"
+    # One failure does not send the rest of the site to the browser
+    assert fetcher.fetch("http://a.test/2", browser)[1] == "http"
+    assert "a.test" in fetcher.js_domains and not fetcher.js_domains["a.test"]
+
+def test_response_in_hand_is_not_fetched_again(monkeypatch):
+    fetcher, http = fetcher_with(monkeypatch)
+    response = fetcher.fetch_response("http://a.test/", browser, http_response=ok(ARTICLE))
+    assert response["tier"] == "http" and http.urls == []
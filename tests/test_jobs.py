@@ -0,0 +1,54 @@
+import main
+import driver_pool
+from jobs import JOB_HANDLERS, run_crawl_job, run_multi_page_job
+
+def no_progress(*args):
+    pass
+
+def test_crawl_job_borrows_from_the_process_wide_pool(monkeypatch):
+    shared = object()
+    calls = []
+    monkeypatch.setattr(driver_pool, "get_driver_pool", lambda: shared)
+
+    def crawl_websites(urls, **options):
+        calls.append(options)
+        for url in urls:
+            yield {"url": url, "content": f"text of {url}", "error": None}
+
+    monkeypatch.setattr(main, "crawl_websites", crawl_websites)
+    result = run_crawl_job({"urls": ["http://a.test/", "http://b.test/"], "workers": 8, "per_host_delay": 0},
+                           {}, no_progress)
+    assert calls[0]["pool"] is shared and calls[0]["workers"] == 8
+    assert [page["content"] for page in result["pages"]] == ["text of http://a.test/", "text of http://b.test/"]
+    assert result["pages"][0]["duplicate_of"] is None
+
+def pages(url, num_pages, **options):
+    assert options["commit_changes"] is False
+    for number in range(1, num_pages + 1):
+        yield {"page_number": number, "url": f"{url}?page={number}", "tier": "http",
+               "content": f"Laptop model {number}\nPhone model {number}", "pending_changes": [[number]]}
+
+def test_multi_page_job_leaves_changes_to_the_extract_job(monkeypatch):
+    monkeypatch.setattr(main, "iter_pages", pages)
+    result = run_multi_page_job({"url": "http://shop.test/", "num_pages": 2}, {}, no_progress)
+    assert [page["page_number"] for page in result["pages"]] == [1, 2]
+    assert result["pending_changes"] == [{"url": "http://shop.test/?page=1", "fingerprints": [[1]]},
+                                         {"url": "http://shop.test/?page=2", "fingerprints": [[2]]}]
+
+def test_multi_page_job_extracts_and_commits_each_page(tmp_path, monkeypatch):
+    import change_tracker
+    import llm_cache
+    committed = []
+    cache = llm_cache.ResponseCache(str(tmp_path / "responses.sqlite"))
+    monkeypatch.setattr(llm_cache, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(main, "iter_pages", pages)
+    monkeypatch.setattr(change_tracker, "get_change_tracker", lambda: type(
+        "Tracker", (), {"commit": lambda self, url, fingerprints: committed.append(url)})())
+    result = run_multi_page_job({"url": "http://shop.test/", "num_pages": 2, "description": "laptops",
+                                 "model": "stub"}, {}, no_progress)
+    assert [page["extracted"] for page in result["pages"]] == ["Laptop model 1", "Laptop model 2"]
+    assert committed == ["http://shop.test/?page=1", "http://shop.test/?page=2"]
+    assert result["pending_changes"] == []
+
+def test_every_app_flow_has_a_job_handler():
+    assert {"scrape", "multi_page", "crawl", "login", "extract"} <= set(JOB_HANDLERS)
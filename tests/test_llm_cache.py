@@ -0,0 +1,70 @@
+import llm_cache
+from llm_cache import ResponseCache, response_key
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+def make_cache(tmp_path, monkeypatch, **options):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache, "time", clock)
+    return ResponseCache(str(tmp_path / "llm.sqlite"), **options), clock
+
+def test_key_covers_every_part_and_how_they_are_split():
+    key = response_key("gemini", "template", "prices", "chunk")
+    assert key == response_key("gemini", "template", "prices", "chunk")
+    assert key != response_key("gemini", "template", "price", "schunk")
+    assert key != response_key("gemini-2", "template", "prices", "chunk")
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, ttl=60)
+    cache.put("a", "alpha")
+    clock.now += 60
+    assert cache.get("a") == "alpha"
+    clock.now += 1
+    assert cache.get("a") is None
+    # The expired entry is removed, not just skipped
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_reading_an_entry_does_not_extend_its_ttl(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, ttl=60)
+    cache.put("a", "alpha")
+    clock.now += 50
+    cache.get("a")
+    clock.now += 20
+    assert cache.get("a") is None
+
+def test_least_recently_used_entries_are_evicted_beyond_max_entries(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, key.upper())
+        clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.put("c", "C")
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["A", None, "C"]
+    assert cache.metrics["evictions"] == 1 and cache.stats()["entries"] == 2
+
+def test_replacing_an_entry_does_not_evict(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch, max_entries=2)
+    cache.put("a", "old")
+    cache.put("b", "B")
+    cache.put("a", "new")
+    assert cache.get("a") == "new" and cache.metrics["evictions"] == 0
+
+def test_entries_survive_reopening(tmp_path):
+    ResponseCache(str(tmp_path / "llm.sqlite")).put("a", "alpha")
+    assert ResponseCache(str(tmp_path / "llm.sqlite")).get("a") == "alpha"
+
+def test_process_wide_cache_reads_its_limits_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "DEFAULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_cache, "_default_cache", None)
+    monkeypatch.setenv("SCRAPER_LLM_CACHE_TTL", "30")
+    monkeypatch.setenv("SCRAPER_LLM_CACHE_MAX_ENTRIES", "5")
+    cache = llm_cache.get_response_cache()
+    assert (cache.ttl, cache.max_entries) == (30.0, 5) and llm_cache.get_response_cache() is cache
+    assert (tmp_path / "llm.sqlite").exists()
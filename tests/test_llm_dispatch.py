@@ -0,0 +1,136 @@
+import time
+import pytest
+import llm_dispatch
+from llm_dispatch import ExtractionDispatcher, StubModel, _BATCH_SECTION_RE, parse_batch_response
+from llm_cache import ResponseCache
+
+CHUNKS = ["alpha one", "bravo two", "charlie three"]
+
+def test_parse_batch_response_keeps_well_formed_sections():
+    text = "<<<RESULT 1>>>\nalpha\n<<<END RESULT 1>>>\n<<<RESULT 3>>>\n''\n<<<END RESULT 3>>>"
+    assert parse_batch_response(text, 3) == {0: "alpha", 2: ""}
+
+def test_parse_batch_response_drops_repeated_and_out_of_range_sections():
+    text = ("<<<RESULT 1>>>a<<<END RESULT 1>>><<<RESULT 1>>>b<<<END RESULT 1>>>"
+            "<<<RESULT 2>>>c<<<END RESULT 2>>><<<RESULT 9>>>d<<<END RESULT 9>>>")
+    assert parse_batch_response(text, 2) == {1: "c"}
+    assert parse_batch_response(None, 2) == {}
+
+def respond(prompt):
+    sections = _BATCH_SECTION_RE.findall(prompt)
+    if sections:
+        # Leave out the last two sections, so they are retried on their own
+        return "\n".join(f"<<<RESULT {number}>>>\n{chunk.upper()}\n<<<END RESULT {number}>>>"
+                         for number, chunk in sections[:1])
+    if "charlie" in prompt:
+        raise ValueError("blocked")
+    return "BRAVO TWO"
+
+def make_dispatcher(cache=None):
+    return ExtractionDispatcher(StubModel(respond=respond), requests_per_minute=1_000_000,
+                                batch_tokens=10_000, cache=cache, max_retries=0)
+
+def test_missing_sections_are_retried_one_at_a_time():
+    dispatcher = make_dispatcher()
+    results, errors = dispatcher.extract(CHUNKS[:2], "words")
+    assert results == ["ALPHA ONE", "BRAVO TWO"] and not errors
+    assert dispatcher.metrics["batch_fallbacks"] == 1
+
+def test_failed_fallback_only_fails_its_own_chunk(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    results, errors = make_dispatcher(cache).extract(CHUNKS, "words")
+    assert results == ["ALPHA ONE", "BRAVO TWO", ""]
+    assert list(errors) == [2] and str(errors[2]) == "blocked"
+    # The good results were cached, so only the failed chunk is asked for again
+    dispatcher = make_dispatcher(cache)
+    dispatcher.extract(CHUNKS, "words")
+    assert dispatcher.metrics["requests"] == 1
+
+def test_single_chunk_failure_is_reported_per_chunk():
+    results, errors = make_dispatcher().extract(CHUNKS[2:], "words")
+    assert results == [""] and isinstance(errors[0], ValueError)
+
+@pytest.mark.parametrize("batch_tokens", [0, 10_000])
+def test_results_come_back_in_chunk_order(batch_tokens):
+    dispatcher = ExtractionDispatcher(StubModel(), requests_per_minute=1_000_000, batch_tokens=batch_tokens)
+    results, errors = dispatcher.extract(["one\nx", "two\ny", "three\nz"], "words")
+    assert results == ["one", "two", "three"] and not errors
+
+class TrackingModel(StubModel):
+    """Stub whose calls take longer for earlier chunks, recording how many run at once"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.active = 0
+        self.peak = 0
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            number = int(prompt.split("chunk ", 1)[1].split(".", 1)[0])
+            time.sleep(0.02 * (8 - number))
+            return super().generate_content(prompt)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def test_results_keep_chunk_order_when_calls_finish_out_of_order():
+    model = TrackingModel()
+    chunks = [f"chunk {number}." for number in range(8)]
+    done = []
+    dispatcher = ExtractionDispatcher(model, concurrency=3, requests_per_minute=1_000_000)
+    results, errors = dispatcher.extract(chunks, "words", progress=lambda count, total: done.append(count))
+    assert results == chunks and not errors
+    assert model.peak == 3
+    assert done == sorted(done) and done[-1] == 8
+
+def test_rate_limit_errors_are_retried_with_growing_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_dispatch.time, "sleep", delays.append)
+    monkeypatch.setattr(llm_dispatch.random, "uniform", lambda low, high: 1.0)
+    dispatcher = ExtractionDispatcher(StubModel(fail_first=3), requests_per_minute=1_000_000, base_delay=0.5,
+                                      max_delay=1.5)
+    results, errors = dispatcher.extract(["only chunk"], "words")
+    assert results == ["only chunk"] and not errors
+    assert delays == [0.5, 1.0, 1.5]
+    assert dispatcher.metrics["retries"] == 3 and dispatcher.metrics["requests"] == 4
+
+def test_retries_give_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(llm_dispatch.time, "sleep", lambda seconds: None)
+    dispatcher = ExtractionDispatcher(StubModel(fail_first=10), requests_per_minute=1_000_000, max_retries=2)
+    results, errors = dispatcher.extract(["only chunk"], "words")
+    assert results == [""] and isinstance(errors[0], llm_dispatch.StubRateLimitError)
+    assert dispatcher.metrics["requests"] == 3 and dispatcher.metrics["failures"] == 1
+
+def test_other_errors_are_not_retried():
+    def respond(prompt):
+        raise ValueError("API key not valid")
+
+    dispatcher = ExtractionDispatcher(StubModel(respond=respond), requests_per_minute=1_000_000)
+    _, errors = dispatcher.extract(["only chunk"], "words")
+    assert isinstance(errors[0], ValueError) and dispatcher.metrics["requests"] == 1
+
+@pytest.mark.parametrize("error, retryable", [
+    (llm_dispatch.StubRateLimitError("429"), True),
+    (type("ServiceUnavailable", (Exception,), {})("503"), True),
+    (ValueError("bad request"), False),
+])
+def test_is_retryable(error, retryable):
+    assert llm_dispatch.is_retryable(error) is retryable
+
+def test_token_bucket_paces_requests_beyond_its_burst():
+    bucket = llm_dispatch.TokenBucket(rate_per_minute=600, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two come from the burst, the other two wait a tenth of a second each
+    assert 0.15 <= time.monotonic() - started < 1.0
+
+def test_requests_per_minute_limit_paces_extraction():
+    dispatcher = ExtractionDispatcher(StubModel(), concurrency=4, requests_per_minute=600)
+    dispatcher.request_bucket = llm_dispatch.TokenBucket(600, capacity=1)
+    started = time.monotonic()
+    dispatcher.extract([f"chunk {number}" for number in range(4)], "words")
+    assert time.monotonic() - started >= 0.25
@@ -0,0 +1,110 @@
+import pytest
+from page_cache import PageCache, url_key as cache_key
+
+URL = "http://shop.test/catalog"
+
+class RevalidatingFetcher:
+    def __init__(self, status, html=""):
+        self.status = status
+        self.html = html
+        self.requests = []
+
+    def fetch_http(self, url, headers=None):
+        self.requests.append(headers)
+        return {"status": self.status, "url": url, "html": self.html, "headers": {"ETag": '"v2"'}}
+
+def stored_size(cache):
+    return sum(len(data) for (data,) in cache.store._db.execute("SELECT data FROM blobs"))
+
+@pytest.mark.parametrize("backend", ["sqlite", "mmap"])
+def test_total_size_follows_puts_replacements_and_deletes(tmp_path, backend):
+    cache = PageCache(str(tmp_path / "pages"), backend=backend)
+    cache.put(URL, "<p>one</p>", "one")
+    cache.put(URL + "?page=2", "<p>one</p>", "one")
+    cache.put(URL, "<p>two</p>" * 50, "two")
+    cache.invalidate(URL + "?page=2")
+    assert cache.stats()["bytes"] == cache.store.total_size() > 0
+    reopened = PageCache(str(tmp_path / "pages"), backend=backend)
+    assert reopened.store.total_size() == cache.store.total_size()
+
+def test_shared_blob_is_kept_until_its_last_page_goes(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    cache.put(URL, "<p>same</p>", "same")
+    cache.put(URL + "?page=2", "<p>same</p>", "same")
+    cache.invalidate(URL)
+    assert cache.get(URL + "?page=2")["text"] == "same"
+    assert cache.store.total_size() == stored_size(cache) > 0
+    cache.invalidate(URL + "?page=2")
+    assert cache.store.total_size() == stored_size(cache) == 0
+
+def test_eviction_drops_least_recently_used_pages(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"), max_bytes=1)
+    cache.put(URL, "<p>old</p>", "old")
+    cache.put(URL + "?page=2", "<p>new</p>", "new")
+    assert cache.get(URL) is None and cache.metrics["evictions"] == 2
+    assert cache.store.total_size() == stored_size(cache) == 0
+
+def test_stale_entry_is_revalidated_by_a_304(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"), ttl=-1)
+    cache.put(URL, "<p>one</p>", "one", headers={"ETag": '"v1"'})
+    fetcher = RevalidatingFetcher(304)
+    entry, response = cache.lookup(URL, fetcher)
+    assert entry["text"] == "one" and response is None
+    assert fetcher.requests == [{"If-None-Match": '"v1"'}]
+
+def test_changed_page_from_revalidation_is_handed_back(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"), ttl=-1)
+    cache.put(URL, "<p>one</p>", "one", headers={"ETag": '"v1"'})
+    entry, response = cache.lookup(URL, RevalidatingFetcher(200, "<p>two</p>"))
+    assert entry is None and response["html"] == "<p>two</p>"
+    assert cache.get(URL, RevalidatingFetcher(500)) is None
+
+def test_load_page_stores_the_revalidated_page_without_fetching_again(tmp_path, monkeypatch):
+    from http_fetch import TieredFetcher
+    from main import load_page
+    cache = PageCache(str(tmp_path / "pages.sqlite"), ttl=-1)
+    cache.put(URL, "<p>one</p>", "one", headers={"ETag": '"v1"'})
+    products = "".join(f"<p>Laptop model {i} costs ${i}</p>" for i in range(20))
+    revalidation = RevalidatingFetcher(200, f"<html><body>{products}</body></html>")
+    fetcher = TieredFetcher()
+    monkeypatch.setattr(fetcher, "fetch_http", revalidation.fetch_http)
+    page = load_page(URL, lambda url: pytest.fail("escalated to the browser"), fetcher, cache)
+    assert page["tier"] == "http" and "Laptop model 2" in page["text"]
+    assert len(revalidation.requests) == 1
+    assert cache.store.get(cache_key(URL))["etag"] == '"v2"'
+
+def test_sqlite_size_is_shared_between_processes(tmp_path):
+    first = PageCache(str(tmp_path / "pages.sqlite"))
+    second = PageCache(str(tmp_path / "pages.sqlite"))
+    first.put(URL, "<p>one</p>", "one")
+    second.put(URL + "?page=2", "<p>two</p>" * 20, "two")
+    second.invalidate(URL)
+    assert first.store.total_size() == second.store.total_size() == stored_size(first) > 0
+
+def test_mmap_store_follows_another_process_compacting(tmp_path):
+    path = str(tmp_path / "pages.dat")
+    first = PageCache(path, backend="mmap")
+    second = PageCache(path, backend="mmap")
+    first.put(URL, "<p>big</p>", "".join(str(i) for i in range(20000)))
+    first.put(URL + "?page=2", "<p>two</p>", "two")
+    assert second.get(URL + "?page=2")["text"] == "two"
+    # Removing the big page leaves the data file mostly dead, so it is rewritten
+    first.invalidate(URL)
+    second.put(URL + "?page=3", "<p>three</p>", "three")
+    assert second.get(URL + "?page=2")["text"] == "two"
+    assert first.get(URL + "?page=3")["text"] == "three"
+    reopened = PageCache(path, backend="mmap")
+    assert [reopened.get(URL + f"?page={n}")["text"] for n in (2, 3)] == ["two", "three"]
+    assert reopened.store.total_size() == first.store.total_size() == second.store.total_size()
+
+def test_mmap_hits_do_not_rewrite_the_index_each_time(tmp_path):
+    import os
+    cache = PageCache(str(tmp_path / "pages.dat"), backend="mmap")
+    cache.put(URL, "<p>one</p>", "one")
+    before = os.stat(cache.store.index_path).st_mtime_ns, os.stat(cache.store.index_path).st_ino
+    for _ in range(5):
+        assert cache.get(URL)["text"] == "one"
+    assert (os.stat(cache.store.index_path).st_mtime_ns, os.stat(cache.store.index_path).st_ino) == before
+    touched = cache.store._index[cache_key(URL)]["last_access"]
+    cache.close()
+    assert PageCache(str(tmp_path / "pages.dat"), backend="mmap").store._index[cache_key(URL)]["last_access"] == touched
@@ -0,0 +1,56 @@
+import json
+from bs4 import BeautifulSoup
+from pagination import PaginationEngine, find_next_candidates
+
+PAGE = """<html><head><link rel="next" href="/list?page=3"></head><body>
+<a class="pager" href="javascript:void(0)">Next</a>
+<a class="next" href="?page=3&sort=new">Next page</a>
+<a class="pagination" href="/list?page=9">»</a>
+</body></html>"""
+
+def engine(tmp_path):
+    return PaginationEngine(str(tmp_path / "rules.json"))
+
+def test_candidates_are_found_in_one_pass():
+    matches = find_next_candidates(BeautifulSoup(PAGE, "html.parser"))
+    assert matches == {"rel_next": "/list?page=3", "class_next": "?page=3&sort=new",
+                       "text_next": "?page=3&sort=new", "pagination_arrow": "/list?page=9"}
+
+def test_first_page_uses_the_highest_priority_rule_and_learns_it(tmp_path):
+    pages = engine(tmp_path)
+    matches = {"text_next": "/list?page=3", "rel_next": "/list?page=3"}
+    assert pages.choose_next(matches, "http://shop.test/list?page=2") == "http://shop.test/list?page=3"
+    assert pages.site_rules == {"shop.test": {"rule": "rel_next", "param": "page"}}
+    with open(tmp_path / "rules.json", encoding="utf-8") as f:
+        assert json.load(f) == pages.site_rules
+
+def test_learned_rule_is_preferred_on_the_next_visit(tmp_path):
+    engine(tmp_path).choose_next({"class_next": "/list?p=2"}, "http://shop.test/list")
+    # A new engine reads the rule back; rel_next would otherwise win
+    pages = engine(tmp_path)
+    next_url = pages.choose_next({"rel_next": "/ads", "class_next": "/list?p=3"}, "http://shop.test/list?p=2")
+    assert next_url == "http://shop.test/list?p=3"
+    assert pages.site_rules["shop.test"] == {"rule": "class_next", "param": "p"}
+
+def test_no_candidates_means_no_next_page(tmp_path):
+    pages = engine(tmp_path)
+    assert pages.choose_next({}, "http://shop.test/list") is None
+    assert pages.site_rules == {}
+
+def test_next_link_that_is_not_a_page_number_learns_no_parameter(tmp_path):
+    pages = engine(tmp_path)
+    pages.choose_next({"rel_next": "/list?cursor=abc"}, "http://shop.test/list")
+    assert pages.site_rules["shop.test"]["param"] is None
+    assert pages.predict_urls("http://shop.test/list?cursor=abc", 3) == []
+
+def test_predict_urls_continues_the_learned_parameter(tmp_path):
+    pages = engine(tmp_path)
+    pages.choose_next({"rel_next": "/list?page=3&sort=new"}, "http://shop.test/list?page=2&sort=new")
+    assert pages.predict_urls("http://shop.test/list?page=3&sort=new", 2) == [
+        "http://shop.test/list?sort=new&page=4", "http://shop.test/list?sort=new&page=5"]
+    assert pages.predict_urls("http://other.test/list?page=3", 2) == []
+    assert pages.predict_urls("http://shop.test/list?page=3", 0) == []
+
+def test_unreadable_rules_file_starts_empty(tmp_path):
+    (tmp_path / "rules.json").write_text("{not json", encoding="utf-8")
+    assert engine(tmp_path).site_rules == {}
@@ -0,0 +1,82 @@
+import time
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import pytest
+from document import analyze_document
+from parse_pool import ParsePool
+from telemetry import metrics
+
+PAGE = ("<html><body><h1>Café prêts — \U0001F600</h1>"
+        + "".join(f"<p>Laptop model {i} costs ${i}</p>" for i in range(200))
+        + "<a rel='next' href='?page=2'>Next</a></body></html>")
+
+def offloaded(transport):
+    return metrics.counters.get(("parse_offloaded", (("transport", transport),)), 0)
+
+def inline_result(html_content):
+    page = analyze_document(html_content)
+    del page["soup"]
+    return page
+
+@pytest.fixture(scope="module")
+def worker_pool():
+    pool = ParsePool(workers=1, min_bytes=0)
+    yield pool
+    pool.close(wait=True)
+
+def test_small_pages_are_parsed_without_starting_workers():
+    pool = ParsePool(workers=1, min_bytes=len(PAGE) + 1)
+    assert pool.analyze(PAGE) == inline_result(PAGE)
+    assert pool._executor is None
+
+def test_page_below_the_shared_memory_size_goes_through_the_pipe(worker_pool):
+    worker_pool.shared_memory_bytes = len(PAGE.encode("utf-8")) + 1
+    before = offloaded("bytes"), offloaded("shared_memory")
+    assert worker_pool.analyze(PAGE) == inline_result(PAGE)
+    assert (offloaded("bytes"), offloaded("shared_memory")) == (before[0] + 1, before[1])
+
+def test_large_page_goes_through_shared_memory_which_is_then_released(worker_pool, monkeypatch):
+    created = []
+
+    class RecordingSharedMemory(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self.name)
+
+    monkeypatch.setattr(shared_memory, "SharedMemory", RecordingSharedMemory)
+    worker_pool.shared_memory_bytes = 1
+    before = offloaded("shared_memory")
+    page = worker_pool.analyze(PAGE)
+    assert page == inline_result(PAGE) and page["next_candidates"] == {"rel_next": "?page=2", "text_next": "?page=2"}
+    assert offloaded("shared_memory") == before + 1 and len(created) == 1
+    # The block is unlinked by a done callback, which may run just after the result is handed back
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            shared_memory.SharedMemory(name=created[0]).close()
+        except FileNotFoundError:
+            break
+        time.sleep(0.01)
+    else:
+        pytest.fail("shared memory block was not unlinked")
+
+def test_worker_stage_timings_reach_the_parent(worker_pool):
+    worker_pool.shared_memory_bytes = 1
+    before = metrics.stage_summary().get("parse", {"count": 0})["count"]
+    worker_pool.analyze(PAGE)
+    assert metrics.stage_summary()["parse"]["count"] == before + 1
+
+class BrokenExecutor:
+    shut_down = False
+
+    def submit(self, fn, payload):
+        raise BrokenProcessPool("a worker was killed")
+
+    def shutdown(self, wait):
+        self.shut_down = True
+
+def test_broken_pool_is_replaced_and_the_page_parsed_inline():
+    pool = ParsePool(workers=1, min_bytes=0)
+    broken = pool._executor = BrokenExecutor()
+    assert pool.analyze(PAGE) == inline_result(PAGE)
+    assert broken.shut_down and pool._executor is None
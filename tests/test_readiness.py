@@ -0,0 +1,80 @@
+import pytest
+import readiness
+from readiness import AllOf, DocumentReady, DomQuiescence, NetworkIdle, build_strategy, wait_until_ready
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class ScriptedDriver:
+    """Answers each probe script with the next value from its list, repeating the last one"""
+
+    def __init__(self, **answers):
+        self.answers = answers
+        self.calls = 0
+
+    def execute_script(self, script):
+        self.calls += 1
+        if script == readiness._DOCUMENT_COMPLETE_JS:
+            key = "complete"
+        elif script == readiness._NETWORK_PROBE_JS:
+            key = "network"
+        else:
+            key = "quiet_ms"
+        values = self.answers[key]
+        return values.pop(0) if len(values) > 1 else values[0]
+
+    def find_elements(self, by, selector):
+        return ["element"] if selector in self.answers.get("present", ()) else []
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(readiness, "time", clock)
+    readiness.readiness_log.clear()
+    return clock
+
+def test_ready_as_soon_as_the_dom_is_quiet(clock):
+    driver = ScriptedDriver(complete=[True], quiet_ms=[0, 200, 600])
+    seconds = wait_until_ready(driver, AllOf(DocumentReady(), DomQuiescence(0.5)), url="http://a.test/")
+    assert seconds == pytest.approx(2 * readiness.POLL_INTERVAL)
+    assert readiness.readiness_log[-1] == {"url": "http://a.test/", "strategy": "document_ready+dom_quiescence",
+                                           "seconds": seconds, "timed_out": False}
+
+def test_network_idle_waits_for_requests_and_new_resources_to_stop(clock):
+    driver = ScriptedDriver(network=[(2, 10), (0, 12), (0, 12)])
+    strategy = NetworkIdle(idle_time=0.3)
+    wait_until_ready(driver, strategy)
+    # The resource count last changed on the second poll, so it is ready 0.3s after that
+    assert clock.now == pytest.approx(0.4)
+
+def test_timeout_is_recorded_not_raised(clock):
+    driver = ScriptedDriver(complete=[False])
+    assert wait_until_ready(driver, DocumentReady(), timeout=1) == pytest.approx(1.0, abs=readiness.POLL_INTERVAL)
+    assert readiness.readiness_log[-1]["timed_out"]
+    assert readiness.readiness_summary()["document_ready"]["timeouts"] == 1
+
+def test_errors_during_navigation_are_retried(clock):
+    class Navigating(ScriptedDriver):
+        def execute_script(self, script):
+            if self.calls < 2:
+                self.calls += 1
+                raise RuntimeError("JavaScript error: document unloaded")
+            return super().execute_script(script)
+
+    wait_until_ready(Navigating(complete=[True]), DocumentReady())
+    assert not readiness.readiness_log[-1]["timed_out"]
+
+def test_build_strategy():
+    assert build_strategy("network_idle").name == "document_ready+network_idle"
+    assert build_strategy("wait_for_selector", selector=".price").is_ready(ScriptedDriver(present=[".price"]))
+    with pytest.raises(ValueError):
+        build_strategy("wait_for_selector")
+    with pytest.raises(ValueError):
+        build_strategy("sleep")
@@ -0,0 +1,56 @@
+import pytest
+from records import SchemaError, coerce, load_schema, parse_records
+
+PRODUCT = {
+    "type": "object",
+    "properties": {"name": {"type": "string"}, "price": {"type": "number"}, "stock": {"type": "integer"},
+                   "sale": {"type": "boolean"}},
+    "required": ["name", "price"],
+    "additionalProperties": False,
+}
+
+def test_values_are_converted_to_the_schema_types():
+    record = coerce({"name": 42, "price": "$1,299.00", "stock": "12 units", "sale": "yes", "extra": 1}, PRODUCT)
+    assert record == {"name": "42", "price": 1299.0, "stock": 12, "sale": True}
+
+def test_optional_fields_come_back_as_none():
+    assert coerce({"name": "Laptop", "price": 5}, PRODUCT) == {"name": "Laptop", "price": 5, "stock": None,
+                                                             "sale": None}
+
+@pytest.mark.parametrize("value", [
+    {"price": 5},
+    {"name": "Laptop", "price": "call us"},
+    {"name": "Laptop", "price": True},
+    {"name": "Laptop", "price": 5, "stock": 2.5},
+    {"name": "Laptop", "price": 5, "sale": "maybe"},
+])
+def test_values_that_do_not_fit_raise(value):
+    with pytest.raises(SchemaError):
+        coerce(value, PRODUCT)
+
+@pytest.mark.parametrize("number", [float("inf"), float("-inf"), float("nan")])
+def test_non_finite_numbers_raise(number):
+    with pytest.raises(SchemaError):
+        coerce(number, {"type": "integer"})
+    with pytest.raises(SchemaError):
+        coerce(number, {"type": "number"})
+
+def test_overflowing_number_drops_only_its_record():
+    schema = {"type": "object", "properties": {"stock": {"type": "integer"}}}
+    assert parse_records('[{"stock": 1e400}, {"stock": 3}]', schema) == [{"stock": 3}]
+
+def test_enum_and_nested_arrays():
+    schema = load_schema({"type": "array", "items": {
+        "type": "object",
+        "properties": {"size": {"enum": ["S", "M"]}, "prices": {"type": "array", "items": {"type": "number"}}},
+    }})
+    assert coerce({"size": "S", "prices": ["$1", 2]}, schema) == {"size": "S", "prices": [1.0, 2]}
+    with pytest.raises(SchemaError):
+        coerce({"size": "XL"}, schema)
+
+def test_fenced_response_is_parsed_and_bad_json_raises():
+    assert parse_records('```json\n{"name": "Laptop", "price": "$5"}\n```', PRODUCT) == [
+        {"name": "Laptop", "price": 5.0, "stock": None, "sale": None}]
+    assert parse_records("''", PRODUCT) == []
+    with pytest.raises(SchemaError):
+        parse_records("no records here", PRODUCT)
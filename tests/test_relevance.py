@@ -0,0 +1,30 @@
+from relevance import RelevanceFilter, query_terms, tokenize
+
+CHUNKS = [
+    "About us: a family business since 1990, serving the community",
+    "Laptop model 12 costs $499 and ships free",
+    "Shipping and returns policy for all orders",
+    "Phone model 7 is now $299 with a case",
+]
+
+def test_query_terms_drop_stopwords_and_add_value_kinds():
+    assert tokenize("Please list the Prices of categories") == ["price", "category"]
+    assert query_terms("product prices") == ["product", "price", "<money>"]
+
+def test_select_keeps_matching_chunks_in_chunk_order():
+    # "prices" also matches the dollar amounts
+    assert RelevanceFilter().select(CHUNKS, "laptop and phone prices") == [1, 3]
+
+def test_select_keeps_everything_when_nothing_matches():
+    assert RelevanceFilter().select(CHUNKS, "opening hours") == [0, 1, 2, 3]
+
+def test_max_and_min_chunks():
+    assert RelevanceFilter(max_chunks=1).select(CHUNKS, "laptop prices") == [1]
+    assert RelevanceFilter(min_score_ratio=1.0, min_chunks=2).select(CHUNKS, "laptop prices") == [1, 3]
+
+def test_schema_fields_are_query_terms_and_numbers_are_required():
+    schema = {"type": "object", "properties": {"shippingPolicy": {"type": "string"}, "price": {"type": "number"}}}
+    assert RelevanceFilter().select(CHUNKS, "details", schema) == [1, 2, 3]
+    # A chunk without a single digit cannot give the required price
+    schema["required"] = ["price"]
+    assert RelevanceFilter().select(CHUNKS, "details", schema) == [1, 3]
@@ -0,0 +1,39 @@
+import json
+from sinks import JsonlSink, RotatingFileSink, stream_to_sinks
+
+def page(number, content):
+    return {"page_number": number, "url": f"http://shop.test/?page={number}", "content": content}
+
+def test_rotating_sink_starts_a_new_file_once_one_is_full(tmp_path):
+    with RotatingFileSink(str(tmp_path), max_bytes=200) as sink:
+        paths = [sink.write(page(number, "x" * 60)) for number in range(1, 5)]
+    # Each file takes pages until it reaches max_bytes, so the second page still fits in the first file
+    assert [path.rsplit("/", 1)[1] for path in paths] == ["scraped_pages_00001.txt", "scraped_pages_00001.txt",
+                                                          "scraped_pages_00002.txt", "scraped_pages_00002.txt"]
+    first = (tmp_path / "scraped_pages_00001.txt").read_text(encoding="utf-8")
+    assert first.startswith("=== Page 1: http://shop.test/?page=1 ===\n" + "x" * 60 + "\n\n")
+    assert "=== Page 2:" in first and "=== Page 3:" not in first
+
+def test_rotation_counts_encoded_bytes(tmp_path):
+    with RotatingFileSink(str(tmp_path), max_bytes=100) as sink:
+        paths = {sink.write(page(number, "é" * 40)) for number in range(1, 3)}
+    assert len(paths) == 2
+
+def test_rotating_sink_does_not_overwrite_an_earlier_run(tmp_path):
+    with RotatingFileSink(str(tmp_path)) as sink:
+        sink.write(page(1, "first run"))
+    (tmp_path / "notes.txt").write_text("unrelated", encoding="utf-8")
+    with RotatingFileSink(str(tmp_path)) as sink:
+        assert sink.write(page(1, "second run")).endswith("scraped_pages_00002.txt")
+    assert "first run" in (tmp_path / "scraped_pages_00001.txt").read_text(encoding="utf-8")
+
+def test_stream_to_sinks_writes_each_page_as_it_passes(tmp_path):
+    path = str(tmp_path / "out" / "pages.jsonl")
+    with JsonlSink(path) as sink:
+        stream = stream_to_sinks(iter([page(1, "ümlaut"), page(2, "b")]), sink)
+        assert next(stream)["page_number"] == 1
+        with open(path, encoding="utf-8") as f:
+            assert [json.loads(line)["content"] for line in f] == ["ümlaut"]
+        list(stream)
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
@@ -0,0 +1,60 @@
+import json
+import pytest
+from telemetry import Histogram, Metrics
+
+def test_histogram_buckets_and_percentiles():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.bucket_counts == [2, 1]
+    summary = histogram.summary()
+    assert summary["count"] == 4 and summary["sum"] == pytest.approx(2.65) and summary["max"] == 2.0
+    assert summary["p50"] == 0.5 and summary["p95"] == 2.0
+
+def test_histogram_percentiles_use_only_the_recent_window():
+    histogram = Histogram(window=3)
+    for value in (9.0, 1.0, 1.0, 1.0):
+        histogram.observe(value)
+    assert histogram.quantile(0.95) == 1.0 and histogram.max == 9.0
+    assert Histogram().summary()["p50"] == 0.0
+
+def test_spans_record_durations_nesting_and_errors():
+    metrics = Metrics()
+    with metrics.span("fetch", url="http://a.test/"):
+        with metrics.span("parse"):
+            pass
+    with pytest.raises(ValueError):
+        with metrics.span("parse"):
+            raise ValueError("bad html")
+    assert metrics.stage_summary()["parse"]["count"] == 2
+    spans = {(span["stage"], span["parent"], span["error"]) for span in metrics.spans}
+    assert spans == {("fetch", None, None), ("parse", "fetch", None), ("parse", None, "ValueError")}
+    assert metrics.counters == {("stage_errors", (("stage", "parse"),)): 1}
+
+def test_prometheus_output():
+    metrics = Metrics()
+    metrics.inc("pages", tier="http")
+    metrics.inc("pages", 2, tier="browser")
+    metrics.observe("stage_seconds", 0.003, stage="parse")
+    metrics.observe("stage_seconds", 20.0, stage="parse")
+    lines = metrics.to_prometheus().splitlines()
+    assert lines[:3] == ["# TYPE scraper_pages_total counter",
+                         'scraper_pages_total{tier="browser"} 2',
+                         'scraper_pages_total{tier="http"} 1']
+    assert "# TYPE scraper_stage_seconds histogram" in lines
+    # Buckets are cumulative and end with +Inf
+    assert 'scraper_stage_seconds_bucket{stage="parse",le="0.001"} 0' in lines
+    assert 'scraper_stage_seconds_bucket{stage="parse",le="0.005"} 1' in lines
+    assert 'scraper_stage_seconds_bucket{stage="parse",le="30.0"} 2' in lines
+    assert 'scraper_stage_seconds_bucket{stage="parse",le="+Inf"} 2' in lines
+    assert 'scraper_stage_seconds_count{stage="parse"} 2' in lines
+    assert lines.count("# TYPE scraper_stage_seconds histogram") == 1
+
+def test_export_picks_the_format_from_the_file_name(tmp_path):
+    metrics = Metrics()
+    metrics.inc("pages")
+    metrics.export(str(tmp_path / "metrics.json"))
+    metrics.export(str(tmp_path / "metrics.prom"))
+    with open(tmp_path / "metrics.json", encoding="utf-8") as f:
+        assert json.load(f)["counters"] == [{"name": "pages", "labels": {}, "value": 1}]
+    assert (tmp_path / "metrics.prom").read_text(encoding="utf-8").endswith("scraper_pages_total 1\n")
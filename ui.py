@@ -1,17 +1,15 @@
 import streamlit as st
 import pathlib
-import google.generativeai as genai
+import time
 import pandas as pd
-from io import BytesIO
-from fpdf import FPDF
-from main import (
-    scrape_website,
-    extract_body_content,
-    clean_body_content,
-    split_dom_content,
-    detect_login_required,
-    login_and_scrape,
-)
+from page_cache import get_page_cache
+from llm_cache import get_response_cache
+from records import SchemaError, load_schema
+from readiness import STRATEGIES, build_strategy, readiness_summary
+from telemetry import configure_logging, metrics
+from crawler import get_host
+from jobs import ACTIVE_STATUSES, DONE, get_job_queue
+from exporters import FORMATS as EXPORT_FORMATS, export_cached
 
 # Function to load and apply custom CSS for styling the Streamlit app
 def load_css(file_path):
@@ -21,11 +19,49 @@ def load_css(file_path):
     except FileNotFoundError:
         st.warning("CSS file not found.")
 
+# Scraper progress goes to the server log; set SCRAPER_LOG_LEVEL=DEBUG for per-page detail
+configure_logging()
+
 # Load custom CSS if the file exists
 css_path = pathlib.Path("assets/style.css")
 if css_path.exists():
     load_css(css_path)
 
+# One job queue (and so one bounded set of worker processes) for the whole server
+@st.cache_resource
+def load_job_queue():
+    return get_job_queue()
+
+def job_active(kind):
+    """Whether this session's latest job of a kind is still queued or running"""
+    job_id = st.session_state.jobs.get(kind)
+    if job_id is None:
+        return False
+    job = load_job_queue().get(job_id)
+    return job is not None and job["status"] in ACTIVE_STATUSES
+
+def show_job(job_queue, kind, label):
+    """Show the progress or outcome of this session's latest job of a kind; returns the job once done"""
+    job_id = st.session_state.jobs.get(kind)
+    job = job_queue.get(job_id) if job_id else None
+    if job is None:
+        return None
+    if job["status"] in ACTIVE_STATUSES:
+        st.info(label)
+        st.progress(job["progress"], text=job["message"] or "")
+        return None
+    if job["status"] != DONE:
+        st.error(f"{kind.capitalize()} job {job['status']}: {job['error'] or ''}")
+        return None
+    return job
+
+def apply_once(job):
+    """True the first time a finished job is seen, so its result is only applied once"""
+    if job["id"] in st.session_state.applied_jobs:
+        return False
+    st.session_state.applied_jobs.add(job["id"])
+    return True
+
 # Main function to define the Streamlit app's behavior
 def main():
     # App title and description
@@ -37,16 +73,60 @@ def main():
         st.session_state.site_requires_login = False
     if "url_to_scrape" not in st.session_state:
         st.session_state.url_to_scrape = ""
-    if "scraping_in_progress" not in st.session_state:
-        st.session_state.scraping_in_progress = False
+    # Latest job ID per kind, and the finished jobs whose results have been applied
+    if "jobs" not in st.session_state:
+        st.session_state.jobs = {}
+    if "applied_jobs" not in st.session_state:
+        st.session_state.applied_jobs = set()
+    job_queue = load_job_queue()
     
     # Input fields for API key, website URL, and data extraction description
     api_key = st.text_input("Enter your Google Gemini API key:", type="password")
     st.session_state.url_to_scrape = st.text_input("Enter the website URL to scrape:", value=st.session_state.url_to_scrape)
     parse_description = st.text_input("Describe the type of data to extract:")
+    with st.expander("Structured output"):
+        schema_text = st.text_area(
+            "JSON schema of one extracted record (optional)",
+            placeholder='{"type": "object", "properties": {"name": {"type": "string"}, "price": {"type": "number"}}, '
+                        '"required": ["name", "price"]}')
+        prefilter_mode = st.checkbox("Only send chunks that match the description (scored locally with BM25)",
+                                     value=True)
+    extraction_schema = None
+    if schema_text.strip():
+        try:
+            extraction_schema = load_schema(schema_text)
+        except SchemaError as e:
+            st.error(f"Invalid schema: {e}")
+    refresh_cache = st.checkbox("Ignore cached pages (always re-fetch)")
+    incremental_mode = st.checkbox("Incremental mode (only keep content that is new or changed since the last scrape)")
+    dedup_mode = st.checkbox("Skip near-duplicate pages and repeated boilerplate (multi-page and batch crawls)",
+                             value=True)
 
-    # Scrape button logic
-    if st.button("Scrape", disabled=st.session_state.scraping_in_progress):
+    # Page readiness settings
+    with st.sidebar.expander("Page readiness"):
+        readiness_name = st.selectbox("Wait strategy", STRATEGIES)
+        readiness_selector = st.text_input("CSS selector to wait for") if readiness_name == "wait_for_selector" else None
+        quiet_time = st.number_input("Quiet period (seconds)", min_value=0.1, value=0.5)
+    try:
+        # Checked here; the jobs build their own copy of the strategy
+        build_strategy(readiness_name, readiness_selector, quiet_time)
+        readiness_params = {"readiness": readiness_name, "readiness_selector": readiness_selector,
+                            "quiet_time": quiet_time}
+    except ValueError:
+        readiness_params = {}
+
+    # Gemini request limits
+    with st.sidebar.expander("Gemini limits"):
+        llm_concurrency = st.slider("Parallel requests", 1, 16, 4)
+        llm_rpm = st.number_input("Requests per minute", min_value=1, value=60)
+        llm_tpm = st.number_input("Tokens per minute", min_value=1000, value=1_000_000, step=1000)
+        chunk_tokens = st.number_input("Chunk size (tokens)", min_value=100, value=1250, step=50)
+        chunk_overlap = st.number_input("Chunk overlap (tokens)", min_value=0, value=0, step=10)
+        batch_tokens = st.number_input("Tokens per request (0 sends one chunk per request)", min_value=0,
+                                       value=30_000, step=1000)
+
+    # Scrape button logic: the scrape runs as a background job so the app stays responsive
+    if st.button("Scrape", disabled=job_active("scrape")):
         # Validate API key and URL inputs
         if not api_key:
             st.error("Please enter a valid API key.")
@@ -54,50 +134,118 @@ def main():
         if not st.session_state.url_to_scrape.strip():
             st.error("Please enter a valid URL.")
             st.stop()
+        # Served from the page cache when possible, skipping the browser and cleaning
+        st.session_state.jobs["scrape"] = job_queue.submit("scrape", dict(
+            readiness_params, url=st.session_state.url_to_scrape, refresh=refresh_cache,
+            incremental=incremental_mode, chunk_tokens=chunk_tokens))
 
-        try:
-            # Set scraping in progress
-            st.session_state.scraping_in_progress = True
-            
-            # Create a progress container
-            progress_container = st.empty()
-            status_container = st.empty()
-            
-            # Scrape the website
-            progress_container.info("Initializing scraping process...")
-            status_container.text("Preparing to scrape...")
-            
-            # Single page scraping
-            progress_container.info("Scraping page...")
-            status_container.text("Retrieving page content...")
-            
-            raw_html = scrape_website(st.session_state.url_to_scrape)
-            if not raw_html:
-                progress_container.error("Failed to retrieve website content.")
+    scrape_job = show_job(job_queue, "scrape", "Scraping page...")
+    if scrape_job is not None:
+        result = scrape_job["result"]
+        st.caption(f"Page served by the {result['tier']} tier")
+        # Check if the website requires login
+        if result["login_required"]:
+            st.warning("Login required. Please provide credentials in the sidebar.")
+            if apply_once(scrape_job):
+                st.session_state.site_requires_login = True
+        else:
+            if "changes" in result:
+                st.info(f"Changes since the last scrape: {result['changes']}")
+            if apply_once(scrape_job):
+                st.session_state.dom_content = result["text"]
+                # Chunked by DOM block when extracting, so records are not split
+                st.session_state.dom_blocks = result.get("blocks")
+                st.session_state.pending_changes = ([{"url": result["url"], "fingerprints": result["pending_changes"]}]
+                                                    if "pending_changes" in result else [])
+            st.text_area("Cleaned Results", result["text"], height=300)
+
+    # Multi-page scrape that renders (and optionally extracts) each page as it arrives
+    with st.expander("Multi-page scrape"):
+        num_pages = st.number_input("Number of pages to follow", min_value=2, value=5)
+        prefetch_pages = st.number_input("Pages to prefetch ahead", min_value=0, max_value=8, value=2,
+                                         help="Used once the site is known to paginate with a page number in the URL")
+        extract_while_scraping = st.checkbox("Extract insights from each page as it arrives")
+        if st.button("Scrape pages", disabled=job_active("multi_page")):
+            if not st.session_state.url_to_scrape.strip():
+                st.error("Please enter a valid URL.")
+                st.stop()
+            if extract_while_scraping and not api_key:
+                st.error("Please enter a valid API key.")
                 st.stop()
+            if extract_while_scraping and schema_text.strip() and extraction_schema is None:
+                st.stop()
+            params = dict(readiness_params, url=st.session_state.url_to_scrape, num_pages=num_pages,
+                          refresh=refresh_cache, incremental=incremental_mode, prefetch=prefetch_pages,
+                          dedup=dedup_mode)
+            secrets = {}
+            if extract_while_scraping:
+                params.update(description=parse_description, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap,
+                              batch_tokens=batch_tokens, schema=extraction_schema, prefilter=prefilter_mode,
+                              concurrency=llm_concurrency, requests_per_minute=llm_rpm, tokens_per_minute=llm_tpm)
+                secrets["api_key"] = api_key
+            # Scrape logged in if we have logged in to this site before
+            logged_in_url = st.session_state.get("logged_in_url")
+            if logged_in_url and get_host(logged_in_url) == get_host(st.session_state.url_to_scrape):
+                params.update(login_url=logged_in_url, username=st.session_state.login_username)
+                secrets["password"] = st.session_state.login_password
+            st.session_state.jobs["multi_page"] = job_queue.submit("multi_page", params, secrets=secrets)
 
-            # Check if the website requires login
-            if detect_login_required(raw_html):
-                progress_container.warning("Login required. Please provide credentials in the sidebar.")
-                st.session_state.site_requires_login = True
-            else:
-                # Extract and clean the body content
-                status_container.text("Processing page content...")
-                body_content = extract_body_content(raw_html)
-                cleaned_content = clean_body_content(body_content)
-                st.session_state.dom_content = cleaned_content
-                progress_container.success("Scraping complete!")
-                status_container.empty()
-                st.text_area("Cleaned Results", cleaned_content, height=300)
-            
-        except Exception as e:
-            st.error(f"An error occurred during scraping: {str(e)}")
-        finally:
-            # Reset scraping status
-            st.session_state.scraping_in_progress = False
-            # Clear progress indicators
-            progress_container.empty()
-            status_container.empty()
+        multi_page_job = show_job(job_queue, "multi_page", "Scraping pages...")
+        if multi_page_job is not None:
+            result = multi_page_job["result"]
+            for page in result["pages"]:
+                with st.expander(f"Page {page['page_number']}: {page['url']} ({page['tier']} tier)"):
+                    if "duplicate_of" in page:
+                        st.caption(f"Near-duplicate of {page['duplicate_of']}; skipped")
+                    elif page.get("boilerplate_lines"):
+                        st.caption(f"{page['boilerplate_lines']} boilerplate lines removed")
+                    if "changes" in page:
+                        st.caption(f"{page['changes']['new']} new, {page['changes']['changed']} changed, "
+                                   f"{page['changes']['unchanged']} unchanged chunks")
+                    st.text(page["content"][:2000])
+                    for chunk_number, error in page.get("errors", {}).items():
+                        st.error(f"Error processing chunk {chunk_number}: {error}")
+                    if "extracted" in page:
+                        st.text_area("Extracted Data", page["extracted"], height=150,
+                                     key=f"extracted_page_{page['page_number']}")
+            if apply_once(multi_page_job):
+                if "description" in multi_page_job["params"]:
+                    st.session_state.extracted_text = "\n\n".join(page["extracted"] for page in result["pages"])
+                else:
+                    st.session_state.dom_content = "\n\n".join(page["content"] for page in result["pages"])
+                    st.session_state.dom_blocks = None
+                    st.session_state.pending_changes = result["pending_changes"]
+            st.success(f"Multi-page scrape complete: {len(result['pages'])} pages.")
+
+    # Batch crawl of many URLs in parallel
+    with st.expander("Batch crawl"):
+        batch_urls = st.text_area("Website URLs (one per line)")
+        batch_workers = st.slider("Parallel browsers", 1, 8, 4)
+        batch_delay = st.number_input("Seconds between requests to the same domain", min_value=0.0, value=3.0)
+        if st.button("Crawl", disabled=job_active("crawl")):
+            urls = [url.strip() for url in batch_urls.splitlines() if url.strip()]
+            if not urls:
+                st.error("Please enter at least one URL.")
+                st.stop()
+            st.session_state.jobs["crawl"] = job_queue.submit("crawl", dict(
+                readiness_params, urls=urls, workers=batch_workers, per_host_delay=batch_delay,
+                refresh=refresh_cache, dedup=dedup_mode))
+
+        crawl_job = show_job(job_queue, "crawl", "Crawling...")
+        if crawl_job is not None:
+            pages = []
+            for result in crawl_job["result"]["pages"]:
+                if result["error"]:
+                    st.caption(f"Failed: {result['url']} ({result['error']})")
+                elif result["duplicate_of"]:
+                    st.caption(f"Skipped {result['url']} (near-duplicate of {result['duplicate_of']})")
+                else:
+                    pages.append(result["content"])
+            if apply_once(crawl_job):
+                st.session_state.dom_content = "\n\n".join(pages)
+                st.session_state.dom_blocks = None
+                st.session_state.pending_changes = []
+            st.success(f"Crawled {len(pages)} of {len(crawl_job['result']['pages'])} URLs.")
 
     # Sidebar for login credentials if the website requires login
     if st.session_state.site_requires_login:
@@ -111,43 +259,30 @@ def main():
             st.session_state.login_password = st.text_input("Website Password", type="password", value=st.session_state.login_password)
 
             # Login and scrape button logic
-            if st.button("Login and Scrape", disabled=st.session_state.scraping_in_progress):
+            if st.button("Login and Scrape", disabled=job_active("login")):
                 if st.session_state.login_username and st.session_state.login_password:
-                    try:
-                        st.session_state.scraping_in_progress = True
-                        progress_container = st.empty()
-                        status_container = st.empty()
-                        
-                        progress_container.info("Logging in and re-scraping...")
-                        status_container.text("Attempting login...")
-                        
-                        raw_html = login_and_scrape(st.session_state.url_to_scrape,
-                                                    st.session_state.login_username,
-                                                    st.session_state.login_password)
-                        if not raw_html:
-                            progress_container.error("Login or scraping failed.")
-                            st.stop()
-                            
-                        status_container.text("Processing content...")
-                        body_content = extract_body_content(raw_html)
-                        cleaned_content = clean_body_content(body_content)
-                        st.session_state.dom_content = cleaned_content
-                        st.session_state.site_requires_login = False
-                        
-                        progress_container.success("Scraping complete!")
-                        status_container.empty()
-                        st.text_area("Cleaned Results", cleaned_content, height=300)
-                    except Exception as e:
-                        st.error(f"An error occurred during login and scraping: {str(e)}")
-                    finally:
-                        st.session_state.scraping_in_progress = False
-                        progress_container.empty()
-                        status_container.empty()
+                    # The password goes to the worker but is never stored with the job
+                    st.session_state.jobs["login"] = job_queue.submit("login", dict(
+                        readiness_params, url=st.session_state.url_to_scrape,
+                        username=st.session_state.login_username, chunk_tokens=chunk_tokens),
+                        secrets={"password": st.session_state.login_password})
                 else:
                     st.error("Please enter both username and password.")
 
-    # Extract insights using Google Gemini AI
-    if st.button("Extract Insights", disabled=st.session_state.scraping_in_progress):
+    login_job = show_job(job_queue, "login", "Logging in and re-scraping...")
+    if login_job is not None:
+        result = login_job["result"]
+        if apply_once(login_job):
+            st.session_state.dom_content = result["text"]
+            st.session_state.dom_blocks = result["blocks"]
+            st.session_state.pending_changes = []
+            st.session_state.site_requires_login = False
+            # Later multi-page scrapes of this site reuse the logged-in session
+            st.session_state.logged_in_url = result["url"]
+        st.text_area("Cleaned Results", result["text"], height=300)
+
+    # Extract insights using Google Gemini AI, as a background job
+    if st.button("Extract Insights", disabled=job_active("extract")):
         # Validate API key and ensure content is scraped
         if not api_key:
             st.error("Please enter a valid API key.")
@@ -155,89 +290,76 @@ def main():
         if "dom_content" not in st.session_state:
             st.error("Please scrape a website first.")
             st.stop()
+        if schema_text.strip() and extraction_schema is None:
+            st.stop()
+        # The API key goes to the worker but is never stored with the job
+        st.session_state.jobs["extract"] = job_queue.submit("extract", {
+            "content": st.session_state.get("dom_blocks") or st.session_state.dom_content,
+            "description": parse_description,
+            "chunk_tokens": chunk_tokens,
+            "chunk_overlap": chunk_overlap,
+            "batch_tokens": batch_tokens,
+            "schema": extraction_schema,
+            "prefilter": prefilter_mode,
+            "concurrency": llm_concurrency,
+            "requests_per_minute": llm_rpm,
+            "tokens_per_minute": llm_tpm,
+            "commit_changes": st.session_state.get("pending_changes", []),
+        }, secrets={"api_key": api_key})
 
-        try:
-            st.session_state.scraping_in_progress = True
-            progress_container = st.empty()
-            status_container = st.empty()
-            
-            progress_container.info("Extracting insights using Gemini AI...")
-            status_container.text("Initializing AI model...")
-            
-            # Configure the Gemini AI API
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-1.5-pro")
-
-            # Split the DOM content into chunks and process each chunk
-            dom_chunks = split_dom_content(st.session_state.dom_content)
-            extracted_results = []
-            
-            # Create a progress bar
-            progress_bar = st.progress(0)
-            total_chunks = len(dom_chunks)
-            
-            for i, chunk in enumerate(dom_chunks, start=1):
-                try:
-                    status_container.text(f"Processing chunk {i} of {total_chunks}...")
-                    progress_bar.progress(i / total_chunks)
-                    
-                    # Define the AI prompt for extracting specific information
-                    prompt = (
-                        "You are tasked with extracting specific information from the following text content: {dom_content}. "
-                        "Please follow these instructions carefully: \n\n"
-                        "1. **Extract Information:** Only extract the information that directly matches the provided description: {parse_description}. "
-                        "2. **No Extra Content:** Do not include any additional text, comments, or explanations in your response. "
-                        "3. **Empty Response:** If no information matches the description, return an empty string (''). "
-                        "4. **Direct Data Only:** Your output should contain only the data that is explicitly requested, with no other text."
-                    )
-                    prompt = prompt.format(dom_content=chunk, parse_description=parse_description)
-                    response = model.generate_content(prompt)
-                    extracted_results.append(response.text if response.text else "")
-                except Exception as e:
-                    st.error(f"Error processing chunk {i}: {str(e)}")
-
-            # Combine extracted results and display them
-            extracted_text = "\n\n".join(extracted_results)
-            st.session_state.extracted_text = extracted_text
-            
-            progress_container.success("AI analysis complete!")
-            status_container.empty()
-            progress_bar.empty()
-            
-            st.text_area("Extracted Data", extracted_text, height=300)
-            
-        except Exception as e:
-            st.error(f"An error occurred during AI analysis: {str(e)}")
-        finally:
-            st.session_state.scraping_in_progress = False
-            progress_container.empty()
-            status_container.empty()
+    extract_job = show_job(job_queue, "extract", "Extracting insights using Gemini AI...")
+    if extract_job is not None:
+        result = extract_job["result"]
+        for chunk_number, error in result["errors"].items():
+            st.error(f"Error processing chunk {chunk_number}: {error}")
+        if result.get("skipped"):
+            st.caption(f"{result['skipped']} chunks skipped as unrelated to the description")
+        if apply_once(extract_job):
+            st.session_state.extracted_text = result["text"]
+        if "records" in result:
+            st.dataframe(pd.DataFrame(result["records"]))
+        else:
+            st.text_area("Extracted Data", result["text"], height=300)
+
+    # Browsers, fetches and Gemini calls all run in the job workers, which keep their own metrics
+    st.sidebar.caption("The panels below cover this app process only. Scrapes, crawls, logins and extractions run "
+                       "as background jobs in worker processes and are not counted.")
+    with st.sidebar.expander("Page cache"):
+        st.json(get_page_cache().stats())
+    with st.sidebar.expander("Gemini response cache"):
+        st.json(get_response_cache().stats())
+    with st.sidebar.expander("Time to ready"):
+        st.json(readiness_summary())
+    with st.sidebar.expander("Background jobs"):
+        st.json(job_queue.stats())
+        st.dataframe(pd.DataFrame(job_queue.list(limit=20)))
+    with st.sidebar.expander("Stage timings"):
+        stage_summary = metrics.stage_summary()
+        if stage_summary:
+            st.dataframe(pd.DataFrame(stage_summary).T[["count", "mean", "p50", "p95", "max"]])
+        st.download_button("Metrics (JSON)", metrics.to_json(), "scraper_metrics.json", "application/json")
+        st.download_button("Metrics (Prometheus)", metrics.to_prometheus(), "scraper_metrics.prom", "text/plain")
 
     # Provide options to download the extracted data in different formats
     if "extracted_text" in st.session_state:
-        file_format = st.radio("Choose download format:", ["CSV (Tabular Format)", "Text", "PDF"])
-        if file_format == "CSV (Tabular Format)":
-            # Convert extracted text to CSV format
-            data = [line.split(",") for line in st.session_state.extracted_text.split("\n")]
-            df = pd.DataFrame(data)
-            csv_buffer = BytesIO()
-            df.to_csv(csv_buffer, index=False, header=False)
-            st.download_button("Download CSV", csv_buffer.getvalue(), "extracted_data.csv", "text/csv")
-        elif file_format == "Text":
-            # Provide extracted text as a plain text file
-            text_buffer = BytesIO(st.session_state.extracted_text.encode("utf-8"))
-            st.download_button("Download Text File", text_buffer.getvalue(), "extracted_data.txt", "text/plain")
-        elif file_format == "PDF":
-            # Generate a PDF file with the extracted text
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_auto_page_break(auto=True, margin=15)
-            pdf.set_font("Arial", size=12)
-            for line in st.session_state.extracted_text.split("\n"):
-                safe_text = line.encode("latin-1", "ignore").decode("latin-1")
-                pdf.multi_cell(0, 10, safe_text)
-            pdf_output = pdf.output(dest='S').encode('latin-1')
-            st.download_button("Download PDF", data=pdf_output, file_name="extracted_data.pdf", mime="application/pdf")
+        formats = {"CSV (Tabular Format)": "csv", "Text": "text", "JSON Lines": "jsonl", "Parquet": "parquet",
+                   "PDF": "pdf"}
+        file_format = st.radio("Choose download format:", list(formats))
+        export_format = formats[file_format]
+        extension, mime, _ = EXPORT_FORMATS[export_format]
+        try:
+            # Written to disk once per result and format, then streamed to the browser
+            export_path = export_cached(st.session_state.extracted_text, export_format)
+        except RuntimeError as e:
+            st.error(str(e))
+        else:
+            with open(export_path, "rb") as export_file:
+                st.download_button(f"Download {file_format}", export_file, f"extracted_data.{extension}", mime)
+
+    # Keep polling while this session has jobs in flight
+    if any(job_active(kind) for kind in st.session_state.jobs):
+        time.sleep(1)
+        st.rerun()
 
 # Run the main function when the script is executed
 if __name__ == "__main__":